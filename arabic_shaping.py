@@ -0,0 +1,42 @@
+import functools
+import logging
+import os
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+
+logger = logging.getLogger(__name__)
+
+# نفس العناوين وأسماء الفصول تتكرر لكل المستخدمين؛ تشكيلها مرة واحدة يكفي
+SHAPING_CACHE_SIZE = int(os.getenv("SHAPING_CACHE_SIZE", "4096"))
+
+
+@functools.lru_cache(maxsize=SHAPING_CACHE_SIZE)
+def _shape(text: str) -> str:
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def shape(text) -> str:
+    """تشكيل النص العربي وترتيبه للعرض (reshape + bidi) مع ذاكرة مؤقتة"""
+    return _shape(text if isinstance(text, str) else str(text))
+
+
+def shape_row(row) -> list:
+    return [shape(cell) for cell in row]
+
+
+def shape_table(rows) -> list:
+    """تشكيل جدول كامل دفعة واحدة (كل خلية تمر بالذاكرة المؤقتة)"""
+    return [shape_row(row) for row in rows]
+
+
+def shaping_stats() -> dict:
+    info = _shape.cache_info()
+    total = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": round(info.hits / total, 3) if total else 0.0,
+    }
@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+import qou_parsers
+
+# قياس أداء دوال التحليل على صفحات محفوظة (بدون أي اتصال بالشبكة)
+# python bench_parsers.py                      ← صفحات/ثانية والذاكرة لكل صفحة
+# python bench_parsers.py --compare            ← قبل/بعد (html.parser كامل مقابل التحليل المحدد)
+# python bench_parsers.py --baseline           ← مقارنة مع fixtures/bench_baseline.json
+# python bench_parsers.py --save-baseline      ← تحديث خط الأساس
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASELINE_PATH = os.path.join(FIXTURES_DIR, "bench_baseline.json")
+INBOX_URL = "https://portal.qou.edu/student/inbox.do"
+# تاريخ ثابت حتى لا تتغير نتيجة التقويم حسب يوم التشغيل
+CALENDAR_NOW = datetime(2026, 10, 18)
+# الحالات الأسرع من هذا (ms) لا تُقارن سرعتها لأن الضجيج أكبر من الفرق
+MIN_COMPARABLE_MS = 0.5
+
+# (اسم الحالة، ملف الصفحة، دالة التحليل)
+CASES = (
+    ("inbox", "inbox.html", lambda html: qou_parsers.parse_inbox_latest(html, INBOX_URL)),
+    ("message_body", "message.html", qou_parsers.parse_message_body),
+    ("term_courses", "term_summary.html", qou_parsers.parse_term_summary_courses),
+    ("term_stats", "term_summary.html", qou_parsers.parse_term_summary_stats),
+    ("discussions", "weekly_meetings.html", qou_parsers.parse_discussion_sessions),
+    ("lectures", "weekly_meetings.html", qou_parsers.parse_lectures_schedule),
+    ("exam_terms", "exam_schedule.html", qou_parsers.parse_exam_terms),
+    ("exam_schedule", "exam_schedule.html", qou_parsers.parse_exam_schedule),
+    ("balance", "balance.html", qou_parsers.parse_balance_rows),
+    ("plan_stats", "major_sheet.html", qou_parsers.parse_study_plan_stats),
+    ("plan_courses", "major_sheet.html", qou_parsers.parse_study_plan_courses),
+    ("calendar_active", "calendar.html", qou_parsers.parse_active_calendar_events),
+    ("calendar_term", "calendar.html", lambda html: qou_parsers.parse_semester_calendar(html, CALENDAR_NOW)),
+    ("student_branch", "student_info.html", qou_parsers.parse_student_branch),
+    ("course_names", "course_services.html", qou_parsers.parse_registered_course_names),
+    ("delay_status", "delay_app.html", qou_parsers.delay_applications_open),
+)
+
+# قبل: الشجرة كاملة بـ html.parser | بعد: المحلل الأسرع + الجزء المطلوب فقط
+MODES = (
+    ("before", "html.parser", False),
+    ("after", qou_parsers.HTML_PARSER, True),
+)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def records_digest(result) -> str:
+    """بصمة المخرجات لاكتشاف أي تغيير في السجلات بين التشغيلات"""
+    encoded = json.dumps(result, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+def measure(parser, html, repeat):
+    """زمن التحليل وذروة الذاكرة وعدد الكتل المحجوزة لصفحة واحدة"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parser(html)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = parser(html)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    median = statistics.median(timings)
+    return {
+        "ms": round(median * 1000, 3),
+        "pages_per_sec": round(1 / median, 1) if median else 0.0,
+        "peak_kb": round(peak / 1024, 1),
+        "blocks": blocks,
+        "records": records_digest(result),
+        "result": result,
+    }
+
+
+def run_cases(repeat):
+    return {case: measure(parser, load_fixture(fixture), repeat) for case, fixture, parser in CASES}
+
+
+def report(results, repeat):
+    print(f"parser: {qou_parsers.HTML_PARSER} | repeat: {repeat}")
+    print(f"{'case':<16}{'ms':>9}{'pages/s':>10}{'peak KB':>10}{'blocks':>9}  records")
+    for case, _, _ in CASES:
+        r = results[case]
+        print(f"{case:<16}{r['ms']:>9.2f}{r['pages_per_sec']:>10.0f}{r['peak_kb']:>10.0f}{r['blocks']:>9}  {r['records']}")
+    total = sum(r["ms"] for r in results.values())
+    print(f"{'total':<16}{total:>9.2f}{len(results) * 1000 / total:>10.0f}")
+
+
+def compare_modes(repeat) -> bool:
+    """قبل/بعد التحليل المحدد، مع التأكد من تطابق السجلات"""
+    results = {}
+    for mode, parser_name, use_strainers in MODES:
+        qou_parsers.set_parse_mode(parser_name, use_strainers)
+        results[mode] = run_cases(repeat)
+    qou_parsers.set_parse_mode(MODES[-1][1], MODES[-1][2])
+
+    print(f"parser: {qou_parsers.HTML_PARSER} | repeat: {repeat}")
+    print(f"{'case':<16}{'before ms':>11}{'after ms':>10}{'speedup':>9}{'before KB':>11}{'after KB':>10}  same")
+    mismatches = []
+    for case, _, _ in CASES:
+        before, after = results["before"][case], results["after"][case]
+        same = before["result"] == after["result"]
+        if not same:
+            mismatches.append(case)
+        print(f"{case:<16}{before['ms']:>11.2f}{after['ms']:>10.2f}{before['ms'] / after['ms']:>8.1f}x"
+              f"{before['peak_kb']:>11.0f}{after['peak_kb']:>10.0f}  {'✓' if same else '✗'}")
+
+    if mismatches:
+        print(f"❌ نتائج مختلفة بعد التحسين: {', '.join(mismatches)}")
+    return not mismatches
+
+
+def check_baseline(results, baseline, tolerance) -> bool:
+    """تراجع = أبطأ من خط الأساس بأكثر من tolerance، أو سجلات مختلفة"""
+    regressions = []
+    for case, r in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        if r["records"] != base["records"]:
+            regressions.append(f"{case}: السجلات تغيرت ({base['records']} → {r['records']})")
+        if base["ms"] >= MIN_COMPARABLE_MS and r["pages_per_sec"] < base["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{case}: {base['pages_per_sec']:.0f} → {r['pages_per_sec']:.0f} صفحة/ثانية")
+
+    if regressions:
+        print("❌ تراجع مقارنة بخط الأساس:")
+        for line in regressions:
+            print(f"   {line}")
+    else:
+        print(f"✅ لا يوجد تراجع (السماحية {tolerance:.0%})")
+    return not regressions
+
+
+def save_baseline(results, path):
+    data = {case: {k: v for k, v in r.items() if k != "result"} for case, r in results.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"💾 تم حفظ خط الأساس في {path}")
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="قياس أداء تحليل صفحات البوابة")
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--compare", action="store_true", help="مقارنة قبل/بعد التحليل المحدد")
+    arg_parser.add_argument("--baseline", nargs="?", const=BASELINE_PATH, help="ملف خط الأساس للمقارنة")
+    arg_parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, help="حفظ النتائج كخط أساس")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="نسبة التباطؤ المسموحة")
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        raise SystemExit(0 if compare_modes(args.repeat) else 1)
+
+    results = run_cases(args.repeat)
+    report(results, args.repeat)
+    ok = True
+    if args.baseline:
+        ok = check_baseline(results, load_baseline(args.baseline), args.tolerance)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    raise SystemExit(0 if ok else 1)
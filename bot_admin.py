@@ -7,12 +7,9 @@ from database import (
     update_deadline,
     delete_deadline,
     get_deadline_by_id,
-    add_group,
-    get_categories,
-    get_groups_by_category,
-    get_bot_stats,
-    get_group_link
+    get_bot_stats
 )
+from group_directory import add_group, get_categories, get_groups_by_category, get_group_link
 from scheduler import send_reminder_for_new_deadline
 from datetime import date, datetime
 from bot_instance import bot
@@ -2,16 +2,31 @@ import json
 import os
 import logging
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 from telebot import types
 from database import (
     get_user, add_user, logout_user, update_last_msg,
-    log_chat_id, get_categories, get_groups_by_category,
-    get_group_link, get_portal_credentials, update_portal_data,
+    get_portal_credentials, update_portal_data,
     get_user_branch_and_courses, find_potential_partners,
-    create_anonymous_chat, add_chat_message, end_chat
+    create_anonymous_chat, end_chat
 )
-from qou_scraper import QOUScraper
+from event_writer import log_chat_id, add_chat_message
+from group_directory import (
+    get_categories, is_category, get_groups_by_category,
+    get_group_link, search_groups
+)
+from qou_scraper import (
+    QOUScraper,
+    calendar_cache,
+    balance_cache,
+    format_balance_totals,
+    cached_balance_pdf,
+    balance_pdf_async,
+)
+from pdf_worker import PdfQueueFull, PDF_BUSY_MSG
+from portal_breaker import portal_breaker, breakers, PORTAL_UNAVAILABLE_MSG
+from ecourse_client import EcourseClient
+import exam_cache
 from scheduler import get_user_scheduled_events, format_scheduled_events_message
 from scheduler import run_existing_functions_for_user
 from bot_instance import bot
@@ -26,6 +41,7 @@ user_sessions = {}
 user_categories_data = {}
 user_data = {}
 study_plan_states = {}
+group_search_states = set()
 
 # تحميل الخطط الدراسية
 plans_file_path = os.path.join(os.path.dirname(__file__), "qou.json")
@@ -139,6 +155,26 @@ def show_main_menu(chat_id):
     """دالة مساعدة لعرض القائمة الرئيسية"""
     send_main_menu(chat_id)
 
+def portal_unavailable(chat_id):
+    """رد فوري إذا كانت بوابة الجامعة معطلة بدل انتظار انتهاء مهلة الاتصال"""
+    if portal_breaker.available():
+        return False
+    bot.send_message(chat_id, PORTAL_UNAVAILABLE_MSG)
+    return True
+
+def show_active_calendar(chat_id):
+    """عرض الحدث الفعال حالياً في تقويم الجامعة"""
+    # التقويم المحفوظ في الذاكرة يُعرض حتى لو كانت البوابة معطلة
+    if calendar_cache.get("calendar") is None and portal_unavailable(chat_id):
+        return
+    bot.send_message(chat_id, QOUScraper.get_active_calendar())
+
+def show_semester_calendar(chat_id):
+    """عرض أحداث الفصل الحالي كاملة من تقويم الجامعة"""
+    if calendar_cache.get("calendar") is None and portal_unavailable(chat_id):
+        return
+    bot.send_message(chat_id, QOUScraper.get_full_current_semester_calendar())
+
 def start_login(chat_id):
     """ابدأ مسار تسجيل الدخول للمستخدم"""
     registration_states[chat_id] = {"stage": "awaiting_student_id"}
@@ -162,7 +198,7 @@ def handle_user_commands():
         if user:
             bot.send_message(chat_id, "👋  مرحــــباً!  ")
         else:
-            add_user(chat_id, student_id="", password="", registered_at=datetime.utcnow().isoformat())
+            add_user(chat_id, student_id="", password="", registered_at=datetime.now(timezone.utc))
             bot.send_message(chat_id, "👤 لم يتم تسجيلك بعد. الرجاء تسجيل الدخول.")
             
             # إرسال إشعار للأدمن (يمكن نقله لملف الأدمن إذا أردت)
@@ -212,6 +248,9 @@ def handle_user_commands():
             chat_id = message.chat.id
             logger.info(f"[{chat_id}] طلب تحديث الجدولة الفوري")
             
+            if portal_unavailable(chat_id):
+                return
+
             bot.send_chat_action(chat_id, 'typing')
             bot.send_message(chat_id, "🔄 جاري تحديث الجدولة... قد يستغرق هذا بضع ثوانٍ")
             
@@ -236,6 +275,10 @@ def handle_user_commands():
             bot.answer_callback_query(call.id, "❌ لم يتم العثور على بياناتك. أرسل /start أولاً.")
             return
 
+        if portal_unavailable(chat_id):
+            bot.answer_callback_query(call.id)
+            return
+
         try:
             bot.delete_message(chat_id, call.message.message_id)
             wait_msg = bot.send_message(chat_id, "⏳ جاري تحضير المحاضرات القادمة...")
@@ -299,6 +342,10 @@ def handle_user_commands():
         try:
             chat_id = call.message.chat.id
             logger.info(f"[{chat_id}] طلب تحديث الجدولة من الزر")
+
+            if portal_unavailable(chat_id):
+                bot.answer_callback_query(call.id)
+                return
             
             bot.edit_message_text(
                 "🔄 جاري تحديث الجدولة...", 
@@ -364,6 +411,8 @@ def handle_user_commands():
                 bot.answer_callback_query(call.id, "❌ لم يتم العثور على بياناتك.")
                 return
 
+            if portal_unavailable(chat_id):
+                return
             scraper = QOUScraper(user['student_id'], user['password'])
             if not scraper.login():
                 bot.send_message(chat_id, "❌ فشل تسجيل الدخول.")
@@ -442,6 +491,8 @@ def handle_user_commands():
             return
         
         bot.send_chat_action(chat_id, 'typing')
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user["student_id"], user["password"])
         
         if scraper.login():
@@ -519,6 +570,8 @@ def handle_main_message_flow(chat_id, text):
             password = registration_states[chat_id].get("password")
 
             try:
+                if portal_unavailable(chat_id):
+                    return
                 scraper = QOUScraper(student_id, password)
                 if scraper.login():
                     add_user(chat_id, student_id, password)
@@ -558,7 +611,8 @@ def handle_menu_buttons(chat_id, text):
     
     menu_handlers = {
         "👤 تسجيل الدخول": lambda: start_login(chat_id),
-        "📅 التقويم الحالي": lambda: bot.send_message(chat_id, QOUScraper.get_active_calendar()),
+        "📅 التقويم الحالي": lambda: show_active_calendar(chat_id),
+        "📅 عرض التقويم القادم للفصل الحالي": lambda: show_semester_calendar(chat_id),
         "📚 عرض القروبات": lambda: show_groups_menu(chat_id),
         "🚪 تسجيل الخروج": lambda: logout_and_return(chat_id),
         "📖 الخدمات الأكاديمية": lambda: send_academic_services(chat_id),
@@ -574,6 +628,7 @@ def handle_menu_buttons(chat_id, text):
         "📊 عرض بيانات الفصل": lambda: show_term_stats(chat_id),
         "📅 جدول الامتحانات": lambda: show_exam_schedule_menu(chat_id),
         "🎙️ حلقات النقاش": lambda: show_discussion_sessions(chat_id),
+        "💻 اللقاءات الافتراضية": lambda: show_virtual_meetings(chat_id),
         "💰 رصيد الطالب": lambda: show_balance(chat_id),
         "📚 الخطط الدراسية": lambda: show_study_plans(chat_id),
         "📊 إحصائياتي": lambda: show_user_stats(chat_id),
@@ -587,11 +642,13 @@ def handle_menu_buttons(chat_id, text):
     }
     
     if text in menu_handlers:
+        # مغادرة البحث بزر ثابت: الرد النصي التالي ليس كلمة بحث
+        group_search_states.discard(chat_id)
         menu_handlers[text]()
         return True
     
     # معالجات خاصة
-    if text in get_categories():
+    if is_category(text):
         show_groups_in_category(chat_id, text)
     elif get_group_link(text):
         show_group_link(chat_id, text)
@@ -628,10 +685,12 @@ def return_to_main_menu(chat_id):
     """العودة للقائمة الرئيسية"""
     if chat_id in user_data:
         del user_data[chat_id]
+    group_search_states.discard(chat_id)
     send_main_menu(chat_id)
 
 def show_groups_menu(chat_id):
     """عرض قائمة القروبات"""
+    group_search_states.discard(chat_id)
     markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True, one_time_keyboard=True)
     categories = get_categories()
     for category in categories:
@@ -656,8 +715,22 @@ def show_group_link(chat_id, group_name):
 
 def ask_search(chat_id):
     """طلب كلمة للبحث"""
+    group_search_states.add(chat_id)
     bot.send_message(chat_id, "🔍 اكتب كلمة للبحث في القروبات:")
 
+def show_search_results(chat_id, query):
+    """عرض القروبات المطابقة لكلمة البحث"""
+    group_search_states.discard(chat_id)
+    results = search_groups(query)
+    markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True, one_time_keyboard=True)
+    for group_id, group_name, link in results:
+        markup.add(types.KeyboardButton(group_name))
+    markup.add(types.KeyboardButton("العودة للقروبات"))
+    if not results:
+        bot.send_message(chat_id, "📭 لا توجد نتائج", reply_markup=markup)
+        return
+    bot.send_message(chat_id, f"🔍 نتائج البحث عن '{query}': اختر قروب:", reply_markup=markup)
+
 def show_courses_and_grades(chat_id):
     """عرض المقررات والعلامات"""
     user = get_user(chat_id)
@@ -666,6 +739,8 @@ def show_courses_and_grades(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         if not scraper.login():
             bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
@@ -705,6 +780,8 @@ def show_lecture_schedule(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         if not scraper.login():
             bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
@@ -779,6 +856,8 @@ def show_term_stats(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         if not scraper.login():
             bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
@@ -828,6 +907,8 @@ def show_exam_schedule_menu(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         if not scraper.login():
             bot.send_message(chat_id, "❌ فشل تسجيل الدخول.")
@@ -879,16 +960,6 @@ def handle_exam_type_selection(chat_id, text):
         bot.send_message(chat_id, "❌ حدث خطأ، يرجى اختيار الفصل أولاً.")
         return
 
-    try:
-        scraper = QOUScraper(user['student_id'], user['password'])
-        if not scraper.login():
-            bot.send_message(chat_id, "❌ فشل تسجيل الدخول. يرجى إعادة اختيار الفصل الدراسي.")
-            return
-    except Exception as e:
-        logger.exception(f"Error creating scraper for {chat_id}: {e}")
-        bot.send_message(chat_id, "❌ حدث خطأ أثناء الاتصال بموقع الجامعة. حاول مرة أخرى لاحقاً.")
-        return
-
     term_no = session_states[chat_id]['term_no']
     exam_type_map = {
         "📝 النصفي": "MT&IM",
@@ -898,8 +969,24 @@ def handle_exam_type_selection(chat_id, text):
     }
     exam_type = exam_type_map[text]
 
+    # الجدول المحفوظ (من دورة الليل أو طلب سابق) لا يحتاج تسجيل دخول
+    exams = exam_cache.get_exams(user['student_id'], term_no, exam_type)
+    if exams is None:
+        try:
+            if portal_unavailable(chat_id):
+                return
+            scraper = QOUScraper(user['student_id'], user['password'])
+            if not scraper.login():
+                bot.send_message(chat_id, "❌ فشل تسجيل الدخول. يرجى إعادة اختيار الفصل الدراسي.")
+                return
+        except Exception as e:
+            logger.exception(f"Error creating scraper for {chat_id}: {e}")
+            bot.send_message(chat_id, "❌ حدث خطأ أثناء الاتصال بموقع الجامعة. حاول مرة أخرى لاحقاً.")
+            return
+
     try:
-        exams = scraper.fetch_exam_schedule(term_no, exam_type)
+        if exams is None:
+            exams = scraper.fetch_exam_schedule(term_no, exam_type)
         if not exams:
             bot.send_message(chat_id, "📭 لا يوجد جدول لهذا النوع.")
             return
@@ -927,6 +1014,8 @@ def show_discussion_sessions(chat_id):
         bot.send_message(chat_id, "❌ لم يتم العثور على بياناتك. أرسل /start لتسجيل الدخول أولاً.")
         return
 
+    if portal_unavailable(chat_id):
+        return
     scraper = QOUScraper(user['student_id'], user['password'])
     if not scraper.login():
         bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
@@ -945,6 +1034,71 @@ def show_discussion_sessions(chat_id):
         )
     bot.send_message(chat_id, msg, parse_mode="Markdown")
 
+def send_ecourse_error(chat_id, result):
+    """رسالة خطأ منصة التعليم الإلكتروني، مع تمييز فشل تسجيل الدخول عن أخطاء الاتصال"""
+    if result.get("login_failed"):
+        bot.send_message(
+            chat_id,
+            f"🔐 فشل تسجيل الدخول إلى منصة التعليم الإلكتروني: {result['error']}\n"
+            "يتم الدخول برقمك الجامعي وكلمة مرور البوابة؛ إذا كانت كلمة مرور المنصة مختلفة فلن تظهر اللقاءات."
+        )
+    else:
+        bot.send_message(chat_id, f"❌ {result['error']}")
+
+def show_virtual_meetings(chat_id):
+    """عرض روابط اللقاءات الافتراضية لكل المقررات من منصة التعليم الإلكتروني"""
+    user = get_user(chat_id)
+    if not user:
+        bot.send_message(chat_id, "❌ لم يتم العثور على بياناتك. أرسل /start لتسجيل الدخول أولاً.")
+        return
+
+    if not breakers["ecourse.qou.edu"].available():
+        bot.send_message(chat_id, PORTAL_UNAVAILABLE_MSG)
+        return
+
+    bot.send_chat_action(chat_id, 'typing')
+    # المنصة تُجرب ببيانات البوابة نفسها، وقد تختلف كلمة مرورها عند بعض الطلاب
+    client = EcourseClient(user['student_id'], user['password'])
+    courses_result = client.fetch_courses()
+    if not courses_result["success"]:
+        send_ecourse_error(chat_id, courses_result)
+        return
+
+    # تسجيل دخول واحد ثم جلب صفحات كل المقررات بالتوازي
+    meetings_result = client.fetch_all_meetings(courses_result["courses"])
+    if not meetings_result["success"]:
+        send_ecourse_error(chat_id, meetings_result)
+        return
+
+    results = meetings_result["results"]
+    login_failure = next((result for _, result in results if result.get("login_failed")), None)
+    if login_failure and not any(result["success"] for _, result in results):
+        send_ecourse_error(chat_id, login_failure)
+        return
+
+    blocks = []
+    for course, result in results:
+        if not result["success"]:
+            continue
+        lines = [f"📘 {course['name']}"]
+        for meeting in result["meetings"]:
+            lines.append(f"🎥 {meeting['title'] or 'لقاء'} ({meeting['semester']})\n{meeting['url']}")
+        blocks.append("\n".join(lines))
+
+    if not blocks:
+        bot.send_message(chat_id, "📭 لا يوجد لقاءات افتراضية حالياً.")
+        return
+
+    # حد رسالة تيليجرام 4096 حرف
+    msg = "💻 اللقاءات الافتراضية:\n\n"
+    for block in blocks:
+        if len(msg) + len(block) + 2 > 4000:
+            bot.send_message(chat_id, msg, disable_web_page_preview=True)
+            msg = ""
+        msg += block + "\n\n"
+    if msg:
+        bot.send_message(chat_id, msg, disable_web_page_preview=True)
+
 def show_balance(chat_id):
     """عرض رصيد الطالب"""
     user = get_user(chat_id)
@@ -953,20 +1107,59 @@ def show_balance(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         if not scraper.login():
             bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
             return
 
-        balance_pdf_bytes = scraper.fetch_balance_table_pdf()
+        rows = scraper.fetch_balance_rows()
         markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True, one_time_keyboard=True)
         markup.add("📊 الإجمالي", "🏠 العودة للرئيسية")
 
+        if not rows:
+            bot.send_message(chat_id, "❌ لم يتم العثور على بيانات الرصيد", reply_markup=markup)
+            return
+
+        balance_pdf_bytes = cached_balance_pdf(rows)
         if balance_pdf_bytes:
             balance_pdf_bytes.name = "رصيد_الطالب.pdf"
             bot.send_document(chat_id, document=balance_pdf_bytes, reply_markup=markup)
-        else:
-            bot.send_message(chat_id, "❌ لم يتم العثور على بيانات الرصيد", reply_markup=markup)
+            return
+
+        # الرسم يتم في الخلفية حتى لا يتوقف البوت عن الرد على الآخرين
+        waiting = bot.send_message(chat_id, "⏳ جاري تجهيز ملف الرصيد...")
+
+        # الاستدعاءات التالية تعمل في خيط الرسم: أي خطأ فيها يجب أن يصل للمستخدم كرد
+        def send_pdf(pdf_bytes):
+            pdf_bytes.name = "رصيد_الطالب.pdf"
+            try:
+                bot.send_document(chat_id, document=pdf_bytes, reply_markup=markup)
+            except Exception as e:
+                logger.error(f"[{chat_id}] فشل إرسال ملف الرصيد: {e}")
+                pdf_failed(e)
+                return
+            try:
+                bot.delete_message(chat_id, waiting.message_id)
+            except Exception as e:
+                logger.warning(f"[{chat_id}] تعذر حذف رسالة الانتظار: {e}")
+
+        def pdf_failed(error):
+            text = "❌ تعذر تجهيز ملف الرصيد. استخدم زر الإجمالي أو حاول لاحقاً."
+            try:
+                bot.edit_message_text(text, chat_id, waiting.message_id)
+            except Exception as e:
+                logger.error(f"[{chat_id}] تعذر تعديل رسالة الانتظار: {e}")
+                try:
+                    bot.send_message(chat_id, text, reply_markup=markup)
+                except Exception as e:
+                    logger.error(f"[{chat_id}] تعذر إبلاغ الطالب بفشل ملف الرصيد: {e}")
+
+        try:
+            balance_pdf_async(rows, on_done=send_pdf, on_error=pdf_failed)
+        except PdfQueueFull:
+            bot.edit_message_text(PDF_BUSY_MSG, chat_id, waiting.message_id)
 
     except Exception as e:
         print(f"Error fetching balance: {e}")
@@ -982,12 +1175,19 @@ def handle_totals(message):
         return
 
     try:
-        scraper = QOUScraper(user['student_id'], user['password'])
-        if not scraper.login():
-            bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
-            return
+        # الرصيد الذي عُرض للتو ما زال في الذاكرة، لا حاجة لتسجيل الدخول مرة أخرى
+        rows = balance_cache.get(user['student_id'])
+        if rows is not None:
+            totals_text = format_balance_totals(rows)
+        else:
+            if portal_unavailable(chat_id):
+                return
+            scraper = QOUScraper(user['student_id'], user['password'])
+            if not scraper.login():
+                bot.send_message(chat_id, "❌ فشل تسجيل الدخول. تأكد من صحة اسم المستخدم وكلمة المرور.")
+                return
+            totals_text = scraper.fetch_balance_totals()
 
-        totals_text = scraper.fetch_balance_totals()
         markup = types.ReplyKeyboardMarkup(row_width=1, resize_keyboard=True, one_time_keyboard=True)
         markup.add("🏠 العودة للرئيسية")
         bot.send_message(chat_id, totals_text, reply_markup=markup)
@@ -1012,6 +1212,8 @@ def show_user_stats(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         study_plan = scraper.fetch_study_plan()
         stats = study_plan['stats']
@@ -1041,6 +1243,9 @@ def show_user_courses(chat_id):
         bot.send_message(chat_id, "⚠️ لم أجد بياناتك، أرسل 🔄 تحديث بياناتي أولاً.")
         return
 
+    if portal_unavailable(chat_id):
+        return
+
     try:
         loading_msg = bot.send_message(chat_id, "🎓 جاري تحضير مقرراتك...")
         
@@ -1133,6 +1338,8 @@ def show_completion_percentage(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         stats = scraper.fetch_study_plan().get('stats', {})
 
@@ -1169,6 +1376,8 @@ def show_study_plan_summary(chat_id):
         return
 
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         study_plan = scraper.fetch_study_plan()
         stats = study_plan['stats']
@@ -1203,6 +1412,9 @@ def show_current_courses(chat_id):
         bot.send_message(chat_id, "⚠️ لم أجد بياناتك، أرسل 🔄 تحديث بياناتي أولاً.")
         return
 
+    if portal_unavailable(chat_id):
+        return
+
     try:
         loading_msg = bot.send_message(chat_id, "🔄 جاري جلب المقررات...")
         
@@ -1249,6 +1461,8 @@ def update_user_data(chat_id):
     bot.send_message(chat_id, "⏳ جاري تحديث بياناتك، الرجاء الانتظار...")
     
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(user['student_id'], user['password'])
         success = scraper.update_student_data(chat_id)
         
@@ -1275,6 +1489,8 @@ def link_portal_account(chat_id):
         return
     
     try:
+        if portal_unavailable(chat_id):
+            return
         scraper = QOUScraper(creds['username'], creds['password'])
         portal_data = scraper.fetch_student_data_from_portal()
         
@@ -1501,6 +1717,11 @@ def show_partners_list(chat_id):
 
 def handle_other_selections(chat_id, text):
     """معالجة الاختيارات الأخرى"""
+    # معالجة كلمة البحث في القروبات
+    if chat_id in group_search_states:
+        show_search_results(chat_id, text)
+        return
+
     # معالجة اختيارات الخطط الدراسية
     if chat_id in study_plan_states:
         handle_study_plan_selection(chat_id, text)
@@ -1,10 +1,16 @@
 import os
 import base64
+import json
+import datetime
+from collections import Counter
 from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import logging
 import psycopg2
+from psycopg2.extras import execute_values
+from db_pool import get_pool
+from ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +18,12 @@ logger = logging.getLogger(__name__)
 fernet_instance = None
 current_fernet_key = None
 
+# ذاكرة النصوص المفكوكة: (chat_id, النص المشفر) -> النص الأصلي
+# فك Fernet مكلف ويتكرر لكل مستخدم في كل دورة من get_all_users
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", str(6 * 60 * 60)))
+CREDENTIAL_CACHE_SIZE = int(os.getenv("CREDENTIAL_CACHE_SIZE", "20000"))
+credential_cache = TTLCache(ttl=CREDENTIAL_CACHE_TTL, max_entries=CREDENTIAL_CACHE_SIZE, name="credentials")
+
 def init_fernet():
     """تهيئة نظام التشفير"""
     global fernet_instance, current_fernet_key
@@ -22,7 +34,7 @@ def init_fernet():
     if fernet_key:
         try:
             fernet_instance = Fernet(fernet_key.encode())
-            current_fernet_key = fernet_key
+            _set_current_key(fernet_key)
             logger.info(f"✅ تم تهيئة التشفير باستخدام FERNET_KEY")
             return True
         except Exception as e:
@@ -32,13 +44,21 @@ def init_fernet():
     default_key = "tO3Xb54Q-CVVRTgZgAbL_E7y7yWnEr7GX9NcT-KSdDY="
     try:
         fernet_instance = Fernet(default_key.encode())
-        current_fernet_key = default_key
+        _set_current_key(default_key)
         logger.warning("⚠️ استخدام مفتاح افتراضي للتشفير")
         return True
     except Exception as e:
         logger.error(f"❌ فشل المفتاح الافتراضي: {e}")
         return False
 
+def _set_current_key(key):
+    """تغيير المفتاح يجعل كل النصوص المفكوكة في الذاكرة غير صالحة"""
+    global current_fernet_key
+    if current_fernet_key is not None and key != current_fernet_key:
+        logger.info("🔑 تغير مفتاح التشفير، مسح ذاكرة فك التشفير")
+        credential_cache.clear()
+    current_fernet_key = key
+
 # تهيئة التشفير عند الاستيراد
 if not init_fernet():
     logger.error("❌ فشل تهيئة نظام التشفير!")
@@ -85,6 +105,22 @@ def decrypt_text(encrypted_text):
         logger.error(f"❌ فشل فك التشفير: {e}")
         return encrypted_text
 
+def decrypt_user_field(chat_id, encrypted_text):
+    """فك تشفير حقل مستخدم مع الاحتفاظ بالنتيجة في الذاكرة"""
+    if not encrypted_text or not encrypted_text.startswith('gAAAAAB'):
+        return decrypt_text(encrypted_text)
+    return credential_cache.get_or_load((chat_id, encrypted_text), lambda: decrypt_text(encrypted_text))
+
+def forget_credentials(chat_id):
+    """حذف النصوص المفكوكة لمستخدم (تسجيل دخول جديد أو خروج أو حذف)"""
+    credential_cache.invalidate_where(lambda key: key[0] == chat_id)
+
+def credential_cache_stats():
+    stats = credential_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
+
 # ---------- دوال التوافق ----------
 def decrypt_text_simple(token):
     """فك تشفير مبسط - للتوافق"""
@@ -102,14 +138,13 @@ def get_cipher():
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 def get_conn():
-    """الحصول على اتصال قاعدة البيانات"""
+    """الحصول على اتصال من مجمع الاتصالات (with أو close() يعيده للمجمع)"""
     if not DATABASE_URL:
         logger.warning("⚠️ DATABASE_URL غير معين")
         return None
     
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
+        return get_pool(DATABASE_URL).acquire()
     except Exception as e:
         logger.error(f"❌ فشل الاتصال بقاعدة البيانات: {e}")
         return None
@@ -201,14 +236,29 @@ def init_db():
                         -- الحقول الأصلية --
                         last_msg_id TEXT,
                         courses_data TEXT,
-                        last_login TEXT,
-                        last_interaction TEXT,
-                        registered_at TEXT,
+                        last_login TIMESTAMPTZ,
+                        last_interaction TIMESTAMPTZ,
+                        registered_at TIMESTAMPTZ DEFAULT now(),
                         status TEXT DEFAULT 'active',
                         last_gpa TEXT
                     )
                 ''')
 
+                # الجداول القديمة خزنت التواريخ كنص ISO بتوقيت UTC؛ القيم غير الصالحة تصبح NULL
+                cur.execute('''
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_name = 'users' AND data_type = 'text'
+                    AND column_name IN ('last_login', 'last_interaction', 'registered_at')
+                ''')
+                for (column,) in cur.fetchall():
+                    logger.info(f"🔄 تحويل users.{column} إلى timestamptz")
+                    cur.execute(f'''
+                        ALTER TABLE users ALTER COLUMN {column} TYPE TIMESTAMPTZ
+                        USING (CASE WHEN {column} ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}'
+                               THEN {column}::timestamp AT TIME ZONE 'UTC' END)
+                    ''')
+                cur.execute("ALTER TABLE users ALTER COLUMN registered_at SET DEFAULT now()")
+
                 # جدول السجلات (logs)
                 cur.execute('''
                     CREATE TABLE IF NOT EXISTS logs (
@@ -216,7 +266,40 @@ def init_db():
                         chat_id BIGINT,   -- شلنا UNIQUE
                         event_type TEXT,
                         event_value TEXT,
-                        created_at TEXT
+                        created_at TIMESTAMPTZ DEFAULT now()
+                    )
+                ''')
+                # الجداول القديمة خزنت created_at كنص ISO بتوقيت UTC
+                cur.execute('''
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'logs' AND column_name = 'created_at'
+                ''')
+                if cur.fetchone()[0] == 'text':
+                    logger.info("🔄 تحويل logs.created_at إلى timestamptz")
+                    cur.execute('''
+                        ALTER TABLE logs ALTER COLUMN created_at TYPE TIMESTAMPTZ
+                        USING (NULLIF(created_at, '')::timestamp AT TIME ZONE 'UTC')
+                    ''')
+                    cur.execute("ALTER TABLE logs ALTER COLUMN created_at SET DEFAULT now()")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_event_type ON logs (event_type)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_chat_id ON logs (chat_id)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_created_at ON logs (created_at)")
+
+                # ملخصات يومية للسجلات تُحدَّث مع كل حدث (الإحصائيات تقرأ منها بدل عدّ logs)
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS log_daily_counts (
+                        day DATE NOT NULL,
+                        event_type TEXT NOT NULL,
+                        count BIGINT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, event_type)
+                    )
+                ''')
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS log_daily_groups (
+                        day DATE NOT NULL,
+                        group_name TEXT NOT NULL,
+                        count BIGINT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, group_name)
                     )
                 ''')
 
@@ -287,31 +370,106 @@ def init_db():
                         chat_token TEXT NOT NULL,
                         sender_id BIGINT NOT NULL,
                         message_text TEXT NOT NULL,
-                        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        sent_at TIMESTAMPTZ DEFAULT now()
                     )
                 ''')
+                # الرسائل تُكتب الآن بوقت صريح مع المنطقة الزمنية من event_writer؛ القيم القديمة
+                # كانت CURRENT_TIMESTAMP بتوقيت الخادم، فتُفسر بمنطقة الجلسة نفسها
+                cur.execute('''
+                    SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'chat_messages' AND column_name = 'sent_at'
+                ''')
+                if cur.fetchone()[0] == 'timestamp without time zone':
+                    logger.info("🔄 تحويل chat_messages.sent_at إلى timestamptz")
+                    cur.execute("ALTER TABLE chat_messages ALTER COLUMN sent_at TYPE TIMESTAMPTZ")
+                    cur.execute("ALTER TABLE chat_messages ALTER COLUMN sent_at SET DEFAULT now()")
+
+                # فهرس المواد لكل مستخدم (نسخة مفككة من users.portal_courses للبحث السريع)
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS user_course (
+                        chat_id BIGINT NOT NULL,
+                        branch TEXT NOT NULL,
+                        course_name TEXT NOT NULL,
+                        PRIMARY KEY (chat_id, course_name)
+                    )
+                ''')
+                cur.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_user_course_branch_course
+                    ON user_course (branch, course_name)
+                ''')
                 
             conn.commit()
             logger.info("Database tables initialized successfully")
 
+        backfill_user_course()
+        backfill_log_rollups()
+
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
 
+def backfill_user_course():
+    """تعبئة user_course من portal_courses مرة واحدة (عندما يكون الجدول فارغاً)"""
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM user_course)")
+                if cur.fetchone()[0]:
+                    return
+                cur.execute('''
+                    INSERT INTO user_course (chat_id, branch, course_name)
+                    SELECT DISTINCT chat_id, branch, jsonb_array_elements_text(portal_courses::jsonb)
+                    FROM users
+                    WHERE branch IS NOT NULL AND portal_courses IS NOT NULL
+                    ON CONFLICT DO NOTHING
+                ''')
+                if cur.rowcount:
+                    logger.info(f"✅ تمت تعبئة فهرس المواد بـ {cur.rowcount} صف")
+            conn.commit()
+    except Exception as e:
+        logger.error(f"❌ فشل تعبئة فهرس المواد: {e}")
+
+def backfill_log_rollups():
+    """بناء الملخصات اليومية من logs مرة واحدة (عندما تكون فارغة)"""
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM log_daily_counts)")
+                if cur.fetchone()[0]:
+                    return
+                cur.execute('''
+                    INSERT INTO log_daily_counts (day, event_type, count)
+                    SELECT COALESCE((created_at AT TIME ZONE 'UTC')::date, CURRENT_DATE), event_type, COUNT(*)
+                    FROM logs WHERE event_type IS NOT NULL
+                    GROUP BY 1, 2
+                    ON CONFLICT (day, event_type) DO UPDATE SET count = EXCLUDED.count
+                ''')
+                cur.execute('''
+                    INSERT INTO log_daily_groups (day, group_name, count)
+                    SELECT COALESCE((created_at AT TIME ZONE 'UTC')::date, CURRENT_DATE), event_value, COUNT(*)
+                    FROM logs WHERE event_type = 'group_request' AND event_value IS NOT NULL
+                    GROUP BY 1, 2
+                    ON CONFLICT (day, group_name) DO UPDATE SET count = EXCLUDED.count
+                ''')
+            conn.commit()
+    except Exception as e:
+        logger.error(f"❌ فشل بناء ملخصات السجلات: {e}")
+
 # ---------- إدارة المستخدمين ----------
 def add_user(chat_id, student_id, password, registered_at=None, initial_stats=None, initial_courses=None):
     """إضافة مستخدم جديد مع البيانات الأولية للخطة الدراسية"""
+    forget_credentials(chat_id)
     with get_conn() as conn:
         with conn.cursor() as cur:
             # إضافة المستخدم الأساسي
             cur.execute('''
                 INSERT INTO users (chat_id, student_id, password, registered_at)
-                VALUES (%s, %s, %s, %s)
+                VALUES (%s, %s, %s, COALESCE(%s, now()))
                 ON CONFLICT (chat_id) DO UPDATE SET
                     student_id = EXCLUDED.student_id,
                     password = EXCLUDED.password,
-                    registered_at = EXCLUDED.registered_at
-            ''', (chat_id, encrypt_text(student_id), encrypt_text(password), registered_at))
+                    registered_at = COALESCE(%s, users.registered_at)
+            ''', (chat_id, encrypt_text(student_id), encrypt_text(password), registered_at, registered_at))
             
             # حفظ الإحصائيات إذا وجدت
             if initial_stats:
@@ -322,6 +480,7 @@ def add_user(chat_id, student_id, password, registered_at=None, initial_stats=No
                 save_student_courses(chat_id, initial_courses)
             
         conn.commit()
+    forget_user(chat_id)
 
 def log_chat_id(chat_id):
     with get_conn() as conn:
@@ -332,50 +491,68 @@ def log_chat_id(chat_id):
             )
             conn.commit()
 
-def get_user(chat_id):
-    """جلب بيانات مستخدم مع فك التشفير الذكي"""
-    try:
-        conn = get_conn()
-        if not conn:
-            return None
-            
+# سجل المستخدم يُقرأ في بداية كل زر تقريباً؛ يبقى في الذاكرة لمدة قصيرة
+# ويُحذف صراحة عند أي تعديل على بيانات المستخدم
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+user_cache = TTLCache(ttl=USER_CACHE_TTL, max_entries=10000, name="users")
+
+def _load_user(chat_id):
+    """قراءة المستخدم من قاعدة البيانات (يرفع الخطأ حتى لا يُحفظ فشل الاتصال كمستخدم غير موجود)"""
+    conn = get_conn()
+    if conn is None:
+        raise RuntimeError("لا يوجد اتصال بقاعدة البيانات")
+    with conn:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT chat_id, student_id, password, last_msg_id, registered_at FROM users WHERE chat_id = %s",
                 (chat_id,)
             )
             row = cur.fetchone()
-            
-            if row:
-                password = decrypt_text(row[2])
-                
-                # إذا كان هناك مشكلة في كلمة المرور، عدّل الرسالة
-                if password == "[PASSWORD_NEEDS_RESET]":
-                    logger.warning(f"⚠️ المستخدم {chat_id} يحتاج إعادة تسجيل الدخول")
-                    password = ""
-                
-                return {
-                    "chat_id": row[0],
-                    "student_id": row[1] or "",
-                    "password": password or "",
-                    "last_msg_id": row[3],
-                    "registered_at": row[4]
-                }
-            return None
+
+    if not row:
+        return None
+
+    password = decrypt_user_field(row[0], row[2])
+    # إذا كان هناك مشكلة في كلمة المرور، عدّل الرسالة
+    if password == "[PASSWORD_NEEDS_RESET]":
+        logger.warning(f"⚠️ المستخدم {chat_id} يحتاج إعادة تسجيل الدخول")
+        password = ""
+
+    return {
+        "chat_id": row[0],
+        "student_id": decrypt_user_field(row[0], row[1]) or "",
+        "password": password or "",
+        "last_msg_id": row[3],
+        "registered_at": row[4]
+    }
+
+def get_user(chat_id):
+    """جلب بيانات مستخدم مع فك التشفير الذكي (من الذاكرة إن وجدت)"""
+    try:
+        user = user_cache.get_or_load(chat_id, lambda: _load_user(chat_id))
     except Exception as e:
         logger.error(f"❌ خطأ في جلب المستخدم {chat_id}: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
+    if user is None:
+        # المستخدم غير الموجود لا يُحفظ: قد يُضاف من مكان لا يستدعي forget_user (مثل /start في main.py)
+        user_cache.invalidate(chat_id)
+        return None
+    # نسخة حتى لا يغير المستدعي القيمة المحفوظة
+    return dict(user)
+
+def forget_user(chat_id):
+    """حذف سجل المستخدم من الذاكرة بعد تعديل بياناته"""
+    user_cache.invalidate(chat_id)
 
 def logout_user(chat_id):
+    forget_credentials(chat_id)
     with get_conn() as conn:
         with conn.cursor() as cur:
             # مسح بيانات تسجيل الدخول فقط، مع بقاء المستخدم موجود
             cur.execute('UPDATE users SET student_id = %s, password = %s WHERE chat_id = %s',
                         ("", "", chat_id))
         conn.commit()
+    forget_user(chat_id)
 
 
 def update_last_msg(chat_id, msg_id):
@@ -383,6 +560,7 @@ def update_last_msg(chat_id, msg_id):
         with conn.cursor() as cur:
             cur.execute('UPDATE users SET last_msg_id = %s WHERE chat_id = %s', (msg_id, chat_id))
         conn.commit()
+    forget_user(chat_id)
 
 def update_user_courses(chat_id, courses_json):
     with get_conn() as conn:
@@ -414,174 +592,195 @@ def update_user_gpa(chat_id, new_gpa):
             cur.execute('UPDATE users SET last_gpa = %s WHERE chat_id = %s', (new_gpa, chat_id))
         conn.commit()
 
+# ---------- المرور على المستخدمين ----------
+USER_COLUMNS = ('chat_id', 'student_id', 'password', 'last_msg_id', 'courses_data',
+                'last_login', 'last_interaction', 'registered_at', 'status', 'last_gpa')
+ENCRYPTED_USER_COLUMNS = ('student_id', 'password')
+# عدد المستخدمين في كل دفعة عند المرور على الجدول
+USER_ITER_CHUNK = int(os.getenv("USER_ITER_CHUNK", "500"))
+
+def iter_user_chunks(columns=USER_COLUMNS, chunk_size=USER_ITER_CHUNK, with_credentials=False):
+    """
+    المرور على المستخدمين على دفعات مرتبة حسب chat_id مع جلب الأعمدة المطلوبة فقط.
+    كل دفعة استعلام قصير (chat_id > آخر رقم) والاتصال يعود للمجمع بين الدفعات.
+    """
+    columns = tuple(columns)
+    unknown = set(columns) - set(USER_COLUMNS)
+    if unknown:
+        raise ValueError(f"أعمدة غير معروفة: {', '.join(sorted(unknown))}")
+    # chat_id لازم لترتيب الدفعات حتى لو لم يُطلب
+    select_columns = columns if 'chat_id' in columns else ('chat_id',) + columns
+    credentials_filter = " AND student_id <> '' AND password <> ''" if with_credentials else ""
+    page_sql = (f"SELECT {', '.join(select_columns)} FROM users "
+                f"WHERE chat_id > %s{credentials_filter} ORDER BY chat_id LIMIT %s")
+
+    last_chat_id = -2 ** 63  # أصغر BIGINT (معرفات المجموعات سالبة)
+    while True:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(page_sql, (last_chat_id, chunk_size))
+                rows = cur.fetchall()
+        if not rows:
+            return
+
+        last_chat_id = rows[-1][0]
+        chunk = []
+        for row in rows:
+            user = dict(zip(select_columns, row))
+            for column in ENCRYPTED_USER_COLUMNS:
+                if column in user:
+                    user[column] = decrypt_user_field(user['chat_id'], user[column])
+            chunk.append(user)
+        yield chunk
+
+        if len(rows) < chunk_size:
+            return
+
+def iter_users(columns=USER_COLUMNS, chunk_size=USER_ITER_CHUNK, with_credentials=False):
+    """مستخدم واحد في كل مرة (انظر iter_user_chunks)"""
+    for chunk in iter_user_chunks(columns, chunk_size, with_credentials):
+        yield from chunk
+
 def get_all_users():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute('''
-                SELECT chat_id, student_id, password, last_msg_id, courses_data,
-                       last_login, last_interaction, registered_at, status, last_gpa
-                FROM users
-            ''')
-            rows = cur.fetchall()
-            columns = ['chat_id', 'student_id', 'password', 'last_msg_id', 'courses_data',
-                       'last_login', 'last_interaction', 'registered_at', 'status', 'last_gpa']
-            users = []
-            for row in rows:
-                user = dict(zip(columns, row))
-
-                # ✅ محاولة فك التشفير مع fallback
-                sid = decrypt_text(user['student_id'])
-                pwd = decrypt_text(user['password'])
-
-                if sid is None:  # يعني ما انشفر أصلاً
-                    sid = user['student_id']
-                if pwd is None:
-                    pwd = user['password']
-
-                user['student_id'] = sid
-                user['password'] = pwd
-                users.append(user)
-
-            return users
+    return list(iter_users())
 
 def get_all_users_with_credentials():
-    users = get_all_users()
-    return [
-        {
-            "chat_id": u["chat_id"],
-            "student_id": u["student_id"],
-            "password": u["password"],
-            "last_gpa": u.get("last_gpa")
-        }
-        for u in users
-        if u["student_id"] and u["password"]
-    ]
+    columns = ("chat_id", "student_id", "password", "last_gpa")
+    return [u for u in iter_users(columns, with_credentials=True) if u["student_id"] and u["password"]]
 
 # ---------- تسجيل الأحداث ----------
+def bump_log_rollups(cur, events):
+    """
+    تحديث الملخصات اليومية لمجموعة أحداث داخل نفس معاملة إدخالها.
+    events: قائمة (created_at, event_type, event_value)
+    """
+    counts = Counter()
+    groups = Counter()
+    for created_at, event_type, event_value in events:
+        if not event_type:
+            continue
+        day = created_at.astimezone(datetime.timezone.utc).date()
+        counts[(day, event_type)] += 1
+        if event_type == 'group_request' and event_value:
+            groups[(day, event_value)] += 1
+
+    if counts:
+        execute_values(cur, '''
+            INSERT INTO log_daily_counts (day, event_type, count) VALUES %s
+            ON CONFLICT (day, event_type) DO UPDATE SET count = log_daily_counts.count + EXCLUDED.count
+        ''', [(day, event_type, n) for (day, event_type), n in counts.items()])
+    if groups:
+        execute_values(cur, '''
+            INSERT INTO log_daily_groups (day, group_name, count) VALUES %s
+            ON CONFLICT (day, group_name) DO UPDATE SET count = log_daily_groups.count + EXCLUDED.count
+        ''', [(day, name, n) for (day, name), n in groups.items()])
+
 def log_event(chat_id, event_type, event_value=None):
+    created_at = datetime.datetime.now(datetime.timezone.utc)
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute('''
                 INSERT INTO logs (chat_id, event_type, event_value, created_at)
                 VALUES (%s, %s, %s, %s)
-            ''', (chat_id, event_type, event_value, datetime.datetime.utcnow().isoformat()))
+            ''', (chat_id, event_type, event_value, created_at))
+            bump_log_rollups(cur, [(created_at, event_type, event_value)])
         conn.commit()
 def delete_user(chat_id: int):
     """حذف مستخدم من قاعدة البيانات"""
+    forget_credentials(chat_id)
     try:
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute('DELETE FROM users WHERE chat_id = %s', (chat_id,))
                 cur.execute('DELETE FROM student_stats WHERE chat_id = %s', (chat_id,))
                 cur.execute('DELETE FROM student_courses WHERE chat_id = %s', (chat_id,))
+                cur.execute('DELETE FROM user_course WHERE chat_id = %s', (chat_id,))
             conn.commit()
+        forget_user(chat_id)
         logger.info(f"تم حذف المستخدم {chat_id}")
     except Exception as e:
         logger.error(f"Error deleting user {chat_id}: {e}")
 # ---------- الإحصائيات ----------
-def get_total_messages_sent():
+# العدادات تُقرأ من الملخصات اليومية (صف لكل يوم ونوع) وليس من logs
+def get_event_count(event_type):
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM logs WHERE event_type = 'sent_message'")
+            cur.execute("SELECT COALESCE(SUM(count), 0) FROM log_daily_counts WHERE event_type = %s", (event_type,))
             return cur.fetchone()[0]
 
+def get_total_messages_sent():
+    return get_event_count('sent_message')
+
 def get_total_messages_received():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM logs WHERE event_type = 'received_message'")
-            return cur.fetchone()[0]
+    return get_event_count('received_message')
 
 def get_total_commands_count():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT COUNT(*) FROM logs WHERE event_type = 'command'")
-            return cur.fetchone()[0]
+    return get_event_count('command')
 
 def get_top_requested_groups(limit=5):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT event_value, COUNT(*) as cnt
-                FROM logs
-                WHERE event_type = 'group_request'
-                GROUP BY event_value
+                SELECT group_name, SUM(count) as cnt
+                FROM log_daily_groups
+                GROUP BY group_name
                 ORDER BY cnt DESC
                 LIMIT %s
             """, (limit,))
             return [row[0] for row in cur.fetchall()]
 
 def get_bot_start_date():
+    """أول سجل (من فهرس created_at) بتوقيت UTC بدون منطقة زمنية"""
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT MIN(created_at) FROM logs")
             row = cur.fetchone()[0]
             if row:
-                return datetime.datetime.fromisoformat(row)
+                return row.astimezone(datetime.timezone.utc).replace(tzinfo=None)
             return datetime.datetime.utcnow()
 
-def get_bot_stats():
-    users = get_all_users()
-    total_users = len(users)
-    now = datetime.datetime.utcnow()
-
-    def parse_date(val):
-        if val is None:
-            return None
-        try:
-            return datetime.datetime.fromisoformat(val)
-        except:
-            return None
-
-    users_logged_in = sum(1 for u in users if u.get('last_login'))
-
-    active_last_7_days = 0
-    new_today = 0
-    new_last_7_days = 0
-    new_last_30_days = 0
-    unsubscribed = 0
-
-    for u in users:
-        last_inter = parse_date(u.get('last_interaction'))
-        reg_at = parse_date(u.get('registered_at'))
-
-        if last_inter and (now - last_inter).days <= 7:
-            active_last_7_days += 1
-
-        if reg_at:
-            if reg_at.date() == now.date():
-                new_today += 1
-            if (now - reg_at).days <= 7:
-                new_last_7_days += 1
-            if (now - reg_at).days <= 30:
-                new_last_30_days += 1
-
-        if u.get('status') == 'unsubscribed':
-            unsubscribed += 1
-
-    inactive_users = total_users - active_last_7_days
-
-    messages_sent = get_total_messages_sent()
-    messages_received = get_total_messages_received()
-    total_commands = get_total_commands_count()
-    top_groups = get_top_requested_groups()
-    days_active = max((now - get_bot_start_date()).days, 1)
-    avg_daily_interactions = messages_received / days_active
-
-    return {
-        "total_users": total_users,
-        "users_logged_in": users_logged_in,
-        "active_last_7_days": active_last_7_days,
-        "inactive_users": inactive_users,
-        "new_today": new_today,
-        "new_last_7_days": new_last_7_days,
-        "new_last_30_days": new_last_30_days,
-        "unsubscribed": unsubscribed,
-        "messages_sent": messages_sent,
-        "messages_received": messages_received,
-        "total_commands": total_commands,
-        "top_groups": top_groups,
-        "avg_daily_interactions": avg_daily_interactions,
-    }
+def get_bot_stats(top_groups_limit=5):
+    """كل الإحصائيات في استعلام واحد على أعمدة التواريخ مباشرة (بدون فك تشفير)"""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # (now - t).days <= N في الحساب القديم تعني أقل من N+1 يوم
+            cur.execute("""
+                WITH user_stats AS (
+                    SELECT
+                        COUNT(*) AS total_users,
+                        COUNT(last_login) AS users_logged_in,
+                        COUNT(*) FILTER (WHERE now() - last_interaction < interval '8 days') AS active_last_7_days,
+                        COUNT(*) FILTER (WHERE (registered_at AT TIME ZONE 'UTC')::date
+                                               = (now() AT TIME ZONE 'UTC')::date) AS new_today,
+                        COUNT(*) FILTER (WHERE now() - registered_at < interval '8 days') AS new_last_7_days,
+                        COUNT(*) FILTER (WHERE now() - registered_at < interval '31 days') AS new_last_30_days,
+                        COUNT(*) FILTER (WHERE status = 'unsubscribed') AS unsubscribed
+                    FROM users
+                ), event_stats AS (
+                    SELECT
+                        COALESCE(SUM(count) FILTER (WHERE event_type = 'sent_message'), 0)::bigint AS messages_sent,
+                        COALESCE(SUM(count) FILTER (WHERE event_type = 'received_message'), 0)::bigint AS messages_received,
+                        COALESCE(SUM(count) FILTER (WHERE event_type = 'command'), 0)::bigint AS total_commands
+                    FROM log_daily_counts
+                ), top_groups AS (
+                    SELECT COALESCE(array_agg(group_name ORDER BY cnt DESC), '{}') AS top_groups
+                    FROM (
+                        SELECT group_name, SUM(count) AS cnt FROM log_daily_groups
+                        GROUP BY group_name ORDER BY cnt DESC LIMIT %s
+                    ) ranked
+                )
+                SELECT user_stats.*, event_stats.*, top_groups.top_groups,
+                       GREATEST(EXTRACT(DAY FROM now() - COALESCE((SELECT MIN(created_at) FROM logs), now())), 1)::int
+                           AS days_active
+                FROM user_stats, event_stats, top_groups
+            """, (top_groups_limit,))
+            columns = [desc[0] for desc in cur.description]
+            stats = dict(zip(columns, cur.fetchone()))
+
+    days_active = stats.pop("days_active")
+    stats["inactive_users"] = stats["total_users"] - stats["active_last_7_days"]
+    stats["avg_daily_interactions"] = stats["messages_received"] / days_active
+    return stats
 
 def get_all_chat_ids_from_logs():
     with get_conn() as conn:
@@ -876,6 +1075,7 @@ def clear_portal_data(chat_id):
                     SET branch = NULL, portal_courses = NULL 
                     WHERE chat_id = %s
                 ''', (chat_id,))
+                cur.execute('DELETE FROM user_course WHERE chat_id = %s', (chat_id,))
             conn.commit()
         logger.info(f"✅ تم مسح بيانات البوابة للمستخدم {chat_id}")
         return True
@@ -912,9 +1112,9 @@ def get_courses_by_branch(branch_name):
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute('''
-                    SELECT DISTINCT jsonb_array_elements_text(portal_courses::jsonb)
-                    FROM users 
-                    WHERE branch = %s AND portal_courses IS NOT NULL
+                    SELECT DISTINCT course_name FROM user_course
+                    WHERE branch = %s
+                    ORDER BY course_name
                 ''', (branch_name,))
                 return [row[0] for row in cur.fetchall()]
     except Exception as e:
@@ -936,31 +1136,14 @@ def find_potential_partners(chat_id, course_name):
         if not user_branch:
             return []
         
-        # البحث في قاعدة البيانات
+        # بحث مفهرس على (الفرع، المادة) بدل قراءة مواد كل مستخدمي الفرع
         with get_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute('''
-                    SELECT chat_id, portal_courses FROM users 
-                    WHERE branch = %s AND chat_id != %s
-                    AND portal_courses IS NOT NULL
-                ''', (user_branch, chat_id))
-                
-                partners = []
-                for row in cur.fetchall():
-                    partner_id, courses_json = row
-                    if courses_json:
-                        try:
-                            courses_list = json.loads(courses_json)
-                            if course_name in courses_list:
-                                partners.append(partner_id)
-                        except:
-                            continue
-                
-                return partners
-                
-    except Exception as e:
-        logger.error(f"Error finding partners: {e}")
-        return []
+                    SELECT chat_id FROM user_course
+                    WHERE branch = %s AND course_name = %s AND chat_id != %s
+                ''', (user_branch, course_name, chat_id))
+                return [row[0] for row in cur.fetchall()]
                 
     except Exception as e:
         logger.error(f"❌ خطأ في البحث عن شركاء محتملين: {e}")
@@ -989,8 +1172,7 @@ def get_portal_stats():
                 
                 # عدد المواد المختلفة
                 cur.execute('''
-                    SELECT COUNT(DISTINCT jsonb_array_elements_text(portal_courses::jsonb))
-                    FROM users WHERE portal_courses IS NOT NULL
+                    SELECT COUNT(DISTINCT course_name) FROM user_course
                 ''')
                 total_courses = cur.fetchone()[0]
                 
@@ -1019,7 +1201,16 @@ def update_portal_data(chat_id, branch, portal_courses):
                     SET branch = %s, portal_courses = %s
                     WHERE chat_id = %s
                 ''', (branch, courses_json, chat_id))
+                # تحديث فهرس المواد في نفس المعاملة
+                cur.execute('DELETE FROM user_course WHERE chat_id = %s', (chat_id,))
+                if branch and portal_courses:
+                    execute_values(
+                        cur,
+                        'INSERT INTO user_course (chat_id, branch, course_name) VALUES %s',
+                        [(chat_id, branch, name) for name in dict.fromkeys(portal_courses)],
+                    )
             conn.commit()
+        forget_user(chat_id)
         return True
     except Exception as e:
         logger.error(f"Error updating portal data: {e}")
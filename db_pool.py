@@ -0,0 +1,318 @@
+import atexit
+import logging
+import os
+import threading
+import time
+import traceback
+import weakref
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+logger = logging.getLogger(__name__)
+
+# حجم المجمع: اتصالات مفتوحة دائماً والحد الأقصى (خيوط الجدولة + خيوط البوت)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+# أقصى انتظار لاتصال متاح عند امتلاء المجمع (بالثواني)
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "10"))
+# الاتصال الخامل أكثر من هذه المدة يُفحص بـ SELECT 1 قبل إعطائه
+DB_POOL_CHECK_IDLE = int(os.getenv("DB_POOL_CHECK_IDLE", "60"))
+# الاتصال المحجوز أكثر من هذه المدة يُعتبر تسريباً ويُسجل مع مكان حجزه
+DB_POOL_LEAK_SECONDS = int(os.getenv("DB_POOL_LEAK_SECONDS", "120"))
+
+
+class PooledConnection:
+    """
+    اتصال مستعار من المجمع بنفس واجهة اتصال psycopg2.
+    - with: commit عند النجاح أو rollback عند الخطأ ثم إرجاع الاتصال للمجمع
+    - close(): إرجاع الاتصال للمجمع بدل إغلاقه
+    - الطلب المتداخل في نفس الخيط يستخدم نفس الاتصال داخل SAVEPOINT، فيكون
+      commit/rollback الداخلي على نقطة الحفظ وتُثبت المعاملة مع الاتصال الخارجي
+    الاتصال يُرجع للمجمع فقط عند with أو close() الصريح؛ المنسي يظهر في تقرير التسريب.
+    """
+
+    def __init__(self, owner, conn, savepoint=None):
+        self._owner = owner
+        self._conn = conn
+        self._savepoint = savepoint
+        self._released = False
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._conn, name)
+
+    def _execute(self, sql):
+        with self._conn.cursor() as cur:
+            cur.execute(sql)
+
+    def commit(self):
+        if self._savepoint is None:
+            self._conn.commit()
+        else:
+            self._execute(f"RELEASE SAVEPOINT {self._savepoint}; SAVEPOINT {self._savepoint}")
+
+    def rollback(self):
+        if self._savepoint is None:
+            self._conn.rollback()
+        else:
+            self._execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._savepoint is not None:
+            try:
+                if not self._conn.closed:
+                    if exc_type is None:
+                        self._execute(f"RELEASE SAVEPOINT {self._savepoint}")
+                    else:
+                        self._execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}; RELEASE SAVEPOINT {self._savepoint}")
+            finally:
+                self._released = True
+                self._owner.leave_nested()
+            return False
+        try:
+            if not self._conn.closed:
+                if exc_type is None:
+                    self.commit()
+                else:
+                    self.rollback()
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        if self._savepoint is None:
+            self._owner.release(self._conn)
+            return
+        # مثل close() في psycopg2: ما لم يُثبت داخل الطلب المتداخل يُلغى
+        try:
+            if not self._conn.closed:
+                self._execute(f"ROLLBACK TO SAVEPOINT {self._savepoint}; RELEASE SAVEPOINT {self._savepoint}")
+        finally:
+            self._owner.leave_nested()
+
+
+class ConnectionPool:
+    """مجمع اتصالات مشترك بين الخيوط مع فحص صحة الاتصال وكشف التسريب"""
+
+    def __init__(self, dsn, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 check_idle=DB_POOL_CHECK_IDLE, leak_seconds=DB_POOL_LEAK_SECONDS):
+        max_size = max(1, max_size)
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.leak_seconds = leak_seconds
+        self.max_size = max_size
+        self._pool = pool.ThreadedConnectionPool(0, max_size, dsn)
+        # ThreadedConnectionPool يرفع خطأ فوراً عند الامتلاء؛ السيمافور يجعل الطلب ينتظر دوره
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        # الاتصال الحالي لكل خيط وعمق التداخل فيه
+        self._local = threading.local()
+        self._checked_out = {}
+        self._last_used = {}
+        self._idle = set()
+        self.checkouts = 0
+        self.waits = 0
+        self.discarded = 0
+        self.leaks = 0
+        self.nested = 0
+
+        # فتح الحد الأدنى من الاتصالات مسبقاً
+        opened = [self._pool.getconn() for _ in range(min(min_size, max_size))]
+        for conn in opened:
+            self._put(conn)
+
+    def _get(self):
+        conn = self._pool.getconn()
+        with self._lock:
+            self._idle.discard(id(conn))
+        return conn
+
+    def _put(self, conn, close=False):
+        close = close or bool(conn.closed)
+        with self._lock:
+            if close:
+                self._idle.discard(id(conn))
+            else:
+                self._idle.add(id(conn))
+        self._pool.putconn(conn, close=close)
+
+    def _current(self):
+        """الاتصال الخارجي المفتوح في هذا الخيط إن وجد"""
+        ref = getattr(self._local, "outer", None)
+        outer = ref() if ref is not None else None
+        if outer is None or outer._released:
+            if ref is not None and outer is None:
+                logger.warning("⚠️ اتصال قاعدة بيانات في هذا الخيط لم يُغلق، سيظهر في تقرير التسريب")
+            self._local.outer = None
+            self._local.depth = 0
+            return None
+        return outer
+
+    def acquire(self):
+        """استعارة اتصال سليم من المجمع؛ يرفع PoolError إذا لم يتوفر اتصال خلال timeout"""
+        outer = self._current()
+        if outer is not None:
+            # طلب متداخل في نفس الخيط: لا يحجز مكاناً ثانياً في المجمع
+            depth = self._local.depth + 1
+            savepoint = f"pooled_{depth}"
+            outer._execute(f"SAVEPOINT {savepoint}")
+            self._local.depth = depth
+            with self._lock:
+                self.nested += 1
+            return PooledConnection(self, outer._conn, savepoint)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            self.report_leaks()
+            if not self._slots.acquire(timeout=self.timeout):
+                raise pool.PoolError(f"لا يوجد اتصال متاح خلال {self.timeout} ثانية")
+
+        try:
+            conn = self._healthy_conn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+            # [وقت الحجز، مكان الحجز، هل سُجل كتسريب]
+            self._checked_out[id(conn)] = [time.monotonic(), traceback.extract_stack(limit=6)[:-1], False]
+        wrapper = PooledConnection(self, conn)
+        self._local.outer = weakref.ref(wrapper)
+        self._local.depth = 0
+        return wrapper
+
+    def leave_nested(self):
+        self._local.depth = max(0, getattr(self._local, "depth", 1) - 1)
+
+    def _healthy_conn(self):
+        # محاولة ثانية في حال كان الاتصال الأول مقطوعاً من الخادم
+        for attempt in range(2):
+            conn = self._get()
+            if self._is_healthy(conn):
+                return conn
+            with self._lock:
+                self.discarded += 1
+                self._last_used.pop(id(conn), None)
+            logger.warning("⚠️ اتصال قاعدة بيانات معطوب، استبداله باتصال جديد")
+            self._put(conn, close=True)
+        return self._get()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def release(self, conn):
+        """إرجاع الاتصال للمجمع بعد تنظيف أي معاملة مفتوحة"""
+        broken = bool(conn.closed)
+        if not broken and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        with self._lock:
+            self._checked_out.pop(id(conn), None)
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+        try:
+            self._put(conn, close=broken)
+        except pool.PoolError as e:
+            logger.warning(f"⚠️ فشل إرجاع الاتصال للمجمع: {e}")
+        finally:
+            self._slots.release()
+
+    def report_leaks(self):
+        """تسجيل الاتصالات المحجوزة لمدة طويلة مع مكان حجزها"""
+        now = time.monotonic()
+        leaked = []
+        with self._lock:
+            for entry in self._checked_out.values():
+                started, stack, reported = entry
+                if not reported and now - started >= self.leak_seconds:
+                    entry[2] = True
+                    leaked.append((now - started, stack))
+            self.leaks += len(leaked)
+        for held, stack in leaked:
+            logger.warning(f"🚰 اتصال قاعدة بيانات محجوز منذ {held:.0f} ثانية:\n{''.join(traceback.format_list(stack))}")
+        return len(leaked)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_use": len(self._checked_out),
+                "idle": len(self._idle),
+                "max": self.max_size,
+                "checkouts": self.checkouts,
+                "nested": self.nested,
+                "waits": self.waits,
+                "discarded": self.discarded,
+                "leaks": self.leaks,
+            }
+
+    @property
+    def closed(self):
+        return self._pool.closed
+
+    def close(self):
+        self._pool.closeall()
+        with self._lock:
+            self._idle.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(dsn):
+    """المجمع المشترك، يُنشأ عند أول طلب"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(dsn)
+                threading.Thread(target=_leak_watch_loop, daemon=True).start()
+                logger.info(f"✅ مجمع اتصالات قاعدة البيانات جاهز ({DB_POOL_MIN}-{DB_POOL_MAX})")
+    return _pool
+
+
+def _leak_watch_loop():
+    """فحص دوري للاتصالات المحجوزة طويلاً حتى لو لم يمتلئ المجمع"""
+    while True:
+        time.sleep(max(10, DB_POOL_LEAK_SECONDS))
+        try:
+            _pool.report_leaks()
+        except Exception as e:
+            logger.error(f"❌ خطأ في فحص تسريب الاتصالات: {e}")
+
+
+def pool_stats():
+    return _pool.stats() if _pool is not None else None
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None and not _pool.closed:
+        _pool.close()
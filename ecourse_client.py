@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+
+import portal_transport
+import qou_parsers
+from portal_sessions import PortalSessionRegistry
+from portal_throttle import INTERACTIVE
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ECOURSE_LOGIN_URL = "https://ecourse.qou.edu/login/index.php"
+ECOURSE_HOME_URL = "https://ecourse.qou.edu/"
+
+# عدد صفحات المقررات التي تُجلب في نفس الوقت لكل مستخدم
+ECOURSE_CONCURRENCY = int(os.getenv("ECOURSE_CONCURRENCY", "4"))
+# روابط اللقاءات لكل مقرر (نفسها لكل طلاب المقرر)
+MEETINGS_TTL = int(os.getenv("ECOURSE_MEETINGS_TTL", str(30 * 60)))
+
+# جلسات Moodle المسجلة الدخول، منفصلة عن جلسات البوابة
+ecourse_sessions = PortalSessionRegistry()
+meetings_cache = TTLCache(ttl=MEETINGS_TTL, max_entries=5000, name="ecourse_meetings")
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ar,en-US;q=0.7,en;q=0.3',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+LOGIN_ERRORS = (
+    ("حسابك معطل", "الحساب معطل أو البيانات غير صحيحة"),
+    ("اسم المستخدم أو كلمة السر غير صحيحة", "اسم المستخدم أو كلمة السر غير صحيحة"),
+)
+
+
+class EcourseLoginError(Exception):
+    """فشل تسجيل الدخول إلى منصة التعليم الإلكتروني (الرسالة جاهزة للعرض)"""
+
+
+class EcourseClient:
+    """عميل منصة التعليم الإلكتروني: تسجيل دخول واحد لكل مستخدم وجلسة محفوظة"""
+
+    def __init__(self, username: str, password: str, priority: int = INTERACTIVE):
+        self.username = username
+        self.password = password
+        self.priority = priority
+        self.session = None
+        self._login_lock = threading.Lock()
+
+    def login(self, force: bool = False):
+        """تسجيل الدخول أو إعادة استخدام جلسة محفوظة؛ يرفع EcourseLoginError عند الفشل"""
+        if not force:
+            cached_session = ecourse_sessions.get(self.username, self.password)
+            if cached_session is not None:
+                self.session = cached_session
+                return
+
+        session = portal_transport.new_session()
+        session.headers.update(HEADERS)
+        login_data = {'username': self.username, 'password': self.password, 'anchor': ''}
+        response = portal_transport.request(session, "POST", ECOURSE_LOGIN_URL, self.priority, data=login_data)
+
+        for marker, error in LOGIN_ERRORS:
+            if marker in response.text:
+                ecourse_sessions.invalidate(self.username)
+                raise EcourseLoginError(error)
+
+        self.session = session
+        ecourse_sessions.put(self.username, self.password, session)
+
+    def _get(self, url: str):
+        """طلب GET مع إعادة تسجيل الدخول مرة واحدة إذا انتهت جلسة Moodle"""
+        with self._login_lock:
+            if self.session is None:
+                self.login()
+        session = self.session
+        response = portal_transport.request(session, "GET", url, self.priority)
+        if "/login/index.php" in response.url:
+            with self._login_lock:
+                # ربما أعاد خيط آخر تسجيل الدخول أثناء هذا الطلب
+                if self.session is session:
+                    logger.info(f"انتهت جلسة التعليم الإلكتروني لـ {self.username}، إعادة تسجيل الدخول")
+                    ecourse_sessions.invalidate(self.username)
+                    self.login(force=True)
+            response = portal_transport.request(self.session, "GET", url, self.priority)
+        else:
+            ecourse_sessions.touch(self.username)
+        return response
+
+    def fetch_courses(self) -> Dict[str, Any]:
+        """جلب المقررات المسجلة في النظام الإلكتروني"""
+        try:
+            response = self._get(ECOURSE_HOME_URL)
+            if response.status_code != 200:
+                return {"success": False, "error": f"خطأ في الاتصال: {response.status_code}"}
+
+            courses = qou_parsers.parse_ecourse_courses(response.text)
+            if courses is None:
+                return {"success": False, "error": "لم يتم العثور على المقررات المسجلة"}
+            return {"success": True, "courses": courses}
+
+        except EcourseLoginError as e:
+            return {"success": False, "error": str(e), "login_failed": True}
+        except requests.RequestException as e:
+            return {"success": False, "error": f"خطأ في الاتصال: {str(e)}"}
+        except Exception as e:
+            return {"success": False, "error": f"خطأ غير متوقع: {str(e)}"}
+
+    def _load_meetings(self, course_url: str) -> List[dict]:
+        response = self._get(course_url)
+        response.raise_for_status()
+        return qou_parsers.parse_virtual_meetings(response.text)
+
+    def fetch_course_meetings(self, course_url: str) -> Dict[str, Any]:
+        """جلب اللقاءات الافتراضية لمقرر واحد (من الذاكرة إن وجدت)"""
+        try:
+            meetings = meetings_cache.get_or_load(course_url, lambda: self._load_meetings(course_url))
+        except EcourseLoginError as e:
+            return {"success": False, "error": str(e), "login_failed": True}
+        except requests.HTTPError as e:
+            return {"success": False, "error": f"خطأ في جلب صفحة المقرر: {e.response.status_code}"}
+        except Exception as e:
+            return {"success": False, "error": f"خطأ في جلب اللقاءات: {str(e)}"}
+
+        if not meetings:
+            return {"success": False, "error": "لم يتم العثور على روابط لقاءات افتراضية"}
+        return {"success": True, "meetings": [dict(meeting) for meeting in meetings]}
+
+    def fetch_all_meetings(self, courses: List[dict]) -> Dict[str, Any]:
+        """جلب لقاءات كل المقررات بالتوازي: results = قائمة (المقرر، النتيجة) بنفس الترتيب"""
+        courses = [course for course in courses if course.get('url')]
+        if not courses:
+            return {"success": True, "results": []}
+        # تسجيل الدخول مرة واحدة قبل توزيع الطلبات
+        try:
+            with self._login_lock:
+                if self.session is None:
+                    self.login()
+        except EcourseLoginError as e:
+            return {"success": False, "error": str(e), "login_failed": True}
+        except requests.RequestException as e:
+            return {"success": False, "error": f"خطأ في الاتصال: {str(e)}"}
+        except Exception as e:
+            return {"success": False, "error": f"خطأ غير متوقع: {str(e)}"}
+
+        with ThreadPoolExecutor(max_workers=max(1, ECOURSE_CONCURRENCY)) as pool:
+            results = pool.map(lambda course: self.fetch_course_meetings(course['url']), courses)
+            return {"success": True, "results": list(zip(courses, results))}
@@ -0,0 +1,274 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from database import get_conn, bump_log_rollups
+
+logger = logging.getLogger(__name__)
+
+# حجم الطابور في الذاكرة، وحجم كل دفعة إدخال، وأقصى انتظار قبل كتابة دفعة ناقصة
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "2"))
+# عند امتلاء الطابور أو تعطل قاعدة البيانات تُحفظ الأحداث في ملف وتُعاد كتابتها لاحقاً
+EVENT_SPILL_PATH = os.getenv("EVENT_SPILL_PATH", "event_spill.jsonl")
+# بعد هذا الحجم تُهمل الأحداث الجديدة بدل ملء القرص (تحليلات فقط)
+EVENT_SPILL_MAX_BYTES = int(os.getenv("EVENT_SPILL_MAX_BYTES", str(50 * 1024 * 1024)))
+# مهلة قبل إعادة محاولة ملف الانسكاب بعد فشل الكتابة (بالثواني)
+EVENT_RETRY_SECONDS = int(os.getenv("EVENT_RETRY_SECONDS", "30"))
+
+EVENT = "event"
+CHAT_MESSAGE = "chat_message"
+
+# أخطاء تعني أن قاعدة البيانات غير متاحة (وليس أن السجل نفسه مرفوض)
+_UNAVAILABLE_ERRORS = (RuntimeError, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class EventWriter:
+    """
+    كتابة أحداث التحليلات ورسائل المحادثات في الخلفية حتى لا ينتظرها المستخدم.
+    - put: لا تنتظر أبداً؛ عند امتلاء الطابور يُكتب الحدث في ملف الانسكاب أو يُهمل
+    - خيط واحد يكتب الدفعات بـ execute_values في معاملة واحدة مع تحديث الملخصات اليومية
+    """
+
+    def __init__(self, max_queue=EVENT_QUEUE_SIZE, batch_size=EVENT_BATCH_SIZE,
+                 flush_interval=EVENT_FLUSH_SECONDS, spill_path=EVENT_SPILL_PATH,
+                 spill_max_bytes=EVENT_SPILL_MAX_BYTES):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._retry_at = 0.0
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_lag = 0.0
+
+    # ---------- الإدخال ----------
+    def put(self, kind, row):
+        """إضافة سجل للطابور؛ row تحتوي وقت الحدث في آخرها"""
+        self._start()
+        try:
+            self._queue.put_nowait((kind, row, time.monotonic()))
+        except queue.Full:
+            self._spill([(kind, row)])
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+    # ---------- الكتابة ----------
+    def _run(self):
+        while True:
+            try:
+                batch = self._take_batch(self.flush_interval)
+                if batch:
+                    self._write(batch)
+                elif time.monotonic() >= self._retry_at and (
+                        os.path.exists(self.spill_path) or os.path.exists(self.spill_path + ".replay")):
+                    # الطابور فارغ: وقت مناسب لإعادة كتابة ما انسكب
+                    self.replay_spill()
+            except Exception as e:
+                # هذا الخيط هو الكاتب الوحيد: لا يتوقف بسبب خطأ واحد (مثل خطأ في ملف الانسكاب)
+                with self._lock:
+                    self.failures += 1
+                    self._retry_at = time.monotonic() + EVENT_RETRY_SECONDS
+                logger.error(f"❌ خطأ في كاتب الأحداث: {e}")
+
+    def _take_batch(self, timeout):
+        """انتظار أول سجل حتى timeout ثم أخذ ما تيسر حتى حجم الدفعة"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        oldest = min(enqueued for _, _, enqueued in batch)
+        rows = [(kind, row) for kind, row, _ in batch]
+        if self._insert(rows):
+            with self._lock:
+                self.last_lag = time.monotonic() - oldest
+        else:
+            self._spill(rows)
+
+    def _insert_rows(self, rows):
+        """إدخال دفعة في معاملة واحدة؛ يرفع الخطأ عند الفشل"""
+        events = [row for kind, row in rows if kind == EVENT]
+        messages = [row for kind, row in rows if kind == CHAT_MESSAGE]
+        with self._write_lock:
+            conn = get_conn()
+            if conn is None:
+                raise RuntimeError("لا يوجد اتصال بقاعدة البيانات")
+            with conn:
+                with conn.cursor() as cur:
+                    if events:
+                        execute_values(cur, '''
+                            INSERT INTO logs (chat_id, event_type, event_value, created_at) VALUES %s
+                        ''', events)
+                        bump_log_rollups(cur, [(created_at, event_type, value)
+                                               for _, event_type, value, created_at in events])
+                    if messages:
+                        execute_values(cur, '''
+                            INSERT INTO chat_messages (chat_token, sender_id, message_text, sent_at) VALUES %s
+                        ''', messages)
+
+    def _insert(self, rows):
+        """إدخال دفعة في معاملة واحدة؛ يرجع False عند الفشل"""
+        try:
+            self._insert_rows(rows)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+                self._retry_at = time.monotonic() + EVENT_RETRY_SECONDS
+            logger.error(f"❌ فشل كتابة {len(rows)} حدث: {e}")
+            return False
+
+        with self._lock:
+            self.written += len(rows)
+        return True
+
+    def _insert_each(self, rows):
+        """
+        بعد فشل دفعة: كتابة كل سجل وحده، والسجل الذي ترفضه قاعدة البيانات يُهمل
+        حتى لا يمنع كتابة ما بعده. يرجع السجلات المتبقية إذا انقطع الاتصال.
+        """
+        for index, (kind, row) in enumerate(rows):
+            try:
+                self._insert_rows([(kind, row)])
+            except _UNAVAILABLE_ERRORS:
+                return rows[index:]
+            except Exception as e:
+                with self._lock:
+                    self.dropped += 1
+                logger.warning(f"⚠️ إهمال حدث رفضته قاعدة البيانات ({kind}): {e}")
+                continue
+            with self._lock:
+                self.written += 1
+        return []
+
+    # ---------- ملف الانسكاب ----------
+    def _spill(self, rows):
+        with self._spill_lock:
+            try:
+                size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+                if size >= self.spill_max_bytes:
+                    raise OSError("ملف الانسكاب ممتلئ")
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for kind, row in rows:
+                        *values, created_at = row
+                        f.write(json.dumps([kind, values, created_at.isoformat()], ensure_ascii=False) + "\n")
+            except OSError as e:
+                with self._lock:
+                    self.dropped += len(rows)
+                logger.warning(f"⚠️ إهمال {len(rows)} حدث: {e}")
+                return
+        with self._lock:
+            self.spilled += len(rows)
+
+    def replay_spill(self):
+        """إعادة كتابة الأحداث المحفوظة في ملف الانسكاب؛ يبقى الملف إذا فشلت الكتابة"""
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return 0
+                os.replace(self.spill_path, replay_path)
+
+        rows = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    kind, values, created_at = json.loads(line)
+                    rows.append((kind, (*values, datetime.datetime.fromisoformat(created_at))))
+                except ValueError:
+                    continue
+
+        with self._lock:
+            written_before = self.written
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if self._insert(batch):
+                continue
+            # سجل واحد مرفوض لا يجب أن يعيد الدفعة كلها للملف في كل محاولة
+            remaining = self._insert_each(batch)
+            if remaining:
+                # قاعدة البيانات غير متاحة: نعيد ما لم يُكتب للملف الأصلي ليُجرب لاحقاً
+                self._spill(remaining + rows[start + self.batch_size:])
+                break
+        os.remove(replay_path)
+        with self._lock:
+            replayed = self.written - written_before
+        if replayed:
+            logger.info(f"💾 إعادة كتابة {replayed} حدث من ملف الانسكاب")
+        return replayed
+
+    # ---------- الإغلاق والقياسات ----------
+    def flush(self):
+        """كتابة كل ما في الطابور الآن (عند الإغلاق)"""
+        while True:
+            batch = self._take_batch(0.01)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "lag_seconds": round(self.last_lag, 3),
+                "written": self.written,
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+                "failures": self.failures,
+            }
+
+
+event_writer = EventWriter()
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def log_event(chat_id, event_type, event_value=None):
+    event_writer.put(EVENT, (chat_id, event_type, event_value, _now()))
+
+
+def log_chat_id(chat_id):
+    event_writer.put(EVENT, (chat_id, None, None, _now()))
+
+
+def add_chat_message(chat_token, sender_id, message_text):
+    """حفظ رسالة المحادثة في الخلفية (الترتيب محفوظ داخل الطابور)"""
+    event_writer.put(CHAT_MESSAGE, (chat_token, sender_id, message_text, _now()))
+    return True
+
+
+@atexit.register
+def _flush_on_exit():
+    if event_writer.stats()["queued"]:
+        logger.info("💾 كتابة الأحداث المعلقة قبل الإغلاق")
+        event_writer.flush()
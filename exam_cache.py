@@ -0,0 +1,45 @@
+import logging
+import os
+import threading
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# جداول الامتحانات نادراً ما تتغير خلال اليوم؛ دورة الليل تعيد جلبها وتحدث الذاكرة
+EXAM_CACHE_TTL = int(os.getenv("EXAM_CACHE_TTL", str(12 * 60 * 60)))
+# عدد طلبات جدول الامتحانات المتزامنة لكل طالب (يبقى ضمن حدود المحدد المشترك)
+EXAM_FETCH_CONCURRENCY = int(os.getenv("EXAM_FETCH_CONCURRENCY", "4"))
+
+# (الرقم الجامعي، الفصل، نوع الامتحان) -> قائمة الامتحانات
+exam_schedules = TTLCache(ttl=EXAM_CACHE_TTL, max_entries=50000, name="exams")
+
+# الرقم الجامعي -> آخر قائمة فصول رآها البوت (لاكتشاف بداية فصل جديد)
+_known_terms = TTLCache(ttl=EXAM_CACHE_TTL, max_entries=20000, name="exam_terms")
+_terms_lock = threading.Lock()
+
+
+def get_exams(student_id, term_no, exam_type):
+    """جدول محفوظ لم تنته صلاحيته، أو None"""
+    return exam_schedules.get((student_id, str(term_no), exam_type))
+
+
+def store_exams(student_id, term_no, exam_type, exams):
+    exam_schedules.put((student_id, str(term_no), exam_type), exams)
+
+
+def note_terms(student_id, terms):
+    """تسجيل قائمة الفصول الحالية؛ إذا تغيرت تُحذف جداول الطالب المحفوظة"""
+    values = tuple(term["value"] for term in terms or ())
+    if not values:
+        return
+    with _terms_lock:
+        previous = _known_terms.get(student_id)
+        _known_terms.put(student_id, values)
+    if previous is not None and previous != values:
+        logger.info(f"[{student_id}] تغيرت قائمة الفصول، حذف جداول الامتحانات المحفوظة")
+        forget_student(student_id)
+
+
+def forget_student(student_id):
+    exam_schedules.invalidate_where(lambda key: key[0] == student_id)
@@ -0,0 +1,149 @@
+import bisect
+import logging
+import os
+import re
+
+import database
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# جدول القروبات صغير ويتغير فقط من لوحة الأدمن: يُحمل مرة في الذاكرة
+# ويُحدّث في الخلفية كل GROUPS_REFRESH، وفوراً عند إضافة قروب من البوت
+GROUPS_REFRESH = int(os.getenv("GROUPS_REFRESH", str(10 * 60)))
+GROUPS_TTL = int(os.getenv("GROUPS_TTL", str(24 * 60 * 60)))
+SEARCH_LIMIT = 20
+
+directory_cache = TTLCache(ttl=GROUPS_TTL, max_entries=1, refresh_after=GROUPS_REFRESH,
+                           stale_on_error=True, name="groups")
+
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_NON_WORD = re.compile(r"[^\w\s]")
+_LETTER_FOLDS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+})
+
+
+def normalize_arabic(text):
+    """توحيد النص للبحث: حذف التشكيل والتطويل، توحيد الألف والتاء المربوطة والياء"""
+    text = _DIACRITICS.sub("", text or "")
+    text = text.translate(_LETTER_FOLDS).lower()
+    text = _NON_WORD.sub(" ", text)
+    return " ".join(text.split())
+
+
+def _search_token(token):
+    """الكلمة كما تُفهرس: بدون (ال) التعريف حتى تطابق رياضيات كلمة الرياضيات"""
+    if token.startswith("ال") and len(token) > 3:
+        return token[2:]
+    return token
+
+
+class GroupIndex:
+    """لقطة ثابتة من جدول القروبات مع فهرس البحث (تُستبدل كاملة عند التحديث)"""
+
+    def __init__(self, rows):
+        self.groups = {}
+        self.by_category = {}
+        self.link_by_name = {}
+        self.normalized_names = {}
+        postings = {}
+        for group_id, category, name, link in rows:
+            self.groups[group_id] = (group_id, name, link)
+            self.by_category.setdefault(category, []).append((group_id, name, link))
+            self.link_by_name[name] = link
+            normalized = normalize_arabic(name)
+            self.normalized_names[group_id] = normalized
+            for token in map(_search_token, normalized.split()):
+                postings.setdefault(token, set()).add(group_id)
+
+        for groups in self.by_category.values():
+            groups.sort(key=lambda group: group[1])
+        self.categories = sorted(self.by_category)
+        self.category_set = set(self.categories)
+        self._postings = postings
+        self._tokens = sorted(postings)
+
+    def _prefix_ids(self, prefix):
+        """كل القروبات التي تحتوي كلمة تبدأ بـ prefix"""
+        ids = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            ids |= self._postings[token]
+        return ids
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """بحث بكل كلمات الاستعلام (كل كلمة كبداية كلمة في الاسم)"""
+        normalized = normalize_arabic(query)
+        if not normalized:
+            return []
+
+        matches = None
+        for token in map(_search_token, normalized.split()):
+            ids = self._prefix_ids(token)
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+
+        def rank(group_id):
+            name = self.normalized_names[group_id]
+            return (name != normalized, not name.startswith(normalized), name)
+
+        return [self.groups[group_id] for group_id in sorted(matches, key=rank)[:limit]]
+
+
+def _load_index():
+    with database.get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, category, name, link FROM groups")
+            rows = cur.fetchall()
+    logger.info(f"📚 تم تحميل {len(rows)} قروب في الذاكرة")
+    return GroupIndex(rows)
+
+
+def get_index():
+    return directory_cache.get_or_load("groups", _load_index)
+
+
+def refresh():
+    """إعادة تحميل القروبات فوراً (بعد تعديل الجدول)؛ عند الفشل تبقى النسخة الحالية"""
+    try:
+        directory_cache.put("groups", _load_index())
+    except Exception as e:
+        logger.error(f"❌ فشل تحديث القروبات: {e}")
+
+
+def get_categories():
+    """كل التصنيفات المتاحة"""
+    return list(get_index().categories)
+
+
+def is_category(text):
+    return text in get_index().category_set
+
+
+def get_groups_by_category(category):
+    """القروبات ضمن تصنيف: (id, name, link) مرتبة حسب الاسم"""
+    return list(get_index().by_category.get(category, ()))
+
+
+def get_group_link(name):
+    """رابط القروب حسب الاسم"""
+    return get_index().link_by_name.get(name)
+
+
+def search_groups(query, limit=SEARCH_LIMIT):
+    """بحث في أسماء القروبات: (id, name, link)"""
+    return get_index().search(query, limit)
+
+
+def add_group(category, name, link):
+    """إضافة قروب ثم تحديث الفهرس"""
+    group_id = database.add_group(category, name, link)
+    refresh()
+    return group_id
@@ -1,6 +1,7 @@
 import os
 import logging
 import sys
+import signal
 import time
 import threading
 from telebot import types
@@ -237,24 +238,17 @@ def setup_system_handlers():
         # تسجيل دخول بسيط في قاعدة البيانات
         try:
             import database
-            from datetime import datetime
             
+            # with يعيد الاتصال للمجمع حتى عند فشل الاستعلام
             conn = database.get_conn()
             if conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO users (chat_id, username, name, created_at) 
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (chat_id) DO NOTHING
-                """, (
-                    chat_id,
-                    message.from_user.username or "",
-                    message.from_user.first_name or "مستخدم",
-                    datetime.utcnow()
-                ))
-                conn.commit()
-                cursor.close()
-                conn.close()
+                with conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("""
+                            INSERT INTO users (chat_id) VALUES (%s)
+                            ON CONFLICT (chat_id) DO NOTHING
+                        """, (chat_id,))
+                database.forget_user(chat_id)
         except Exception as db_e:
             logger.error(f"❌ خطأ في قاعدة البيانات: {db_e}")
 
@@ -435,7 +429,10 @@ def main():
     # 6. إعداد إرسال الرسائل يدوياً (للأدمن فقط)
     setup_manual_message_sender()
     
-    # 7. تشغيل البوت
+    # 7. عند الإيقاف (SIGTERM) نخرج بشكل طبيعي حتى تُكتب التحديثات المعلقة
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # 8. تشغيل البوت
     try:
         logger.info("🔄 بدء استقبال الرسائل...")
         bot.remove_webhook()
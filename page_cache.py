@@ -0,0 +1,101 @@
+import copy
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لعدد الصفحات المحفوظة (طالب × نوع صفحة)
+MAX_ENTRIES = 50000
+
+# أجزاء تتغير في كل طلب دون أن يتغير محتوى الصفحة فعلياً
+_VOLATILE_PATTERNS = (
+    re.compile(r";jsessionid=[^\"'?#&\s]*", re.IGNORECASE),
+    re.compile(r"(name=\"(?:_csrf|csrf_token|token)\"\s+value=\")[^\"]*", re.IGNORECASE),
+)
+
+
+def page_digest(html: str) -> bytes:
+    """بصمة مختصرة لمحتوى الصفحة بعد حذف الأجزاء المتغيرة"""
+    for pattern in _VOLATILE_PATTERNS:
+        html = pattern.sub(lambda m: m.group(1) if m.groups() else "", html)
+    return hashlib.blake2b(html.encode("utf-8", "ignore"), digest_size=16).digest()
+
+
+class PageHashStore:
+    """
+    آخر بصمة ونتيجة تحليل لكل (نطاق، طالب، نوع صفحة) لتخطي التحليل عند عدم التغيير.
+    النطاق يفصل ما رآه البوت عما رأته دورة الجدولة، حتى لا يُخفي فتح الطالب لصفحة
+    تغييراً لم تُرسل إشعاراته بعد.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, student_id, kind, html, scope=0):
+        """ترجع (البصمة، هل الصفحة كما هي، النتيجة المحفوظة)"""
+        digest = page_digest(html)
+        key = (scope, student_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return digest, True, copy.deepcopy(entry[1])
+            self.misses += 1
+            return digest, False, None
+
+    def store(self, student_id, kind, digest, value, scope=0, pending=None):
+        """حفظ البصمة؛ مع pending تُؤجل الحفظ حتى يؤكده commit بعد نجاح الإشعارات"""
+        if pending is not None:
+            pending.append((student_id, kind, digest, copy.deepcopy(value), scope))
+            return
+        key = (scope, student_id, kind)
+        with self._lock:
+            self._entries[key] = (digest, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def parse(self, student_id, kind, html, parser, changes=None, scope=0, pending=None):
+        """
+        تحليل الصفحة فقط إذا تغيرت منذ آخر مرة، وإلا إرجاع النتيجة السابقة.
+        يسجل في changes[kind] إذا تغيرت الصفحة (True) أو لا (False).
+        """
+        digest, unchanged, value = self.lookup(student_id, kind, html, scope)
+        if changes is not None:
+            changes[kind] = not unchanged
+        if unchanged:
+            return value
+        value = parser(html)
+        self.store(student_id, kind, digest, value, scope, pending)
+        return value
+
+    def commit(self, pending):
+        """حفظ البصمات المؤجلة بعد أن عولجت صفحاتها بنجاح"""
+        for student_id, kind, digest, value, scope in pending:
+            self.store(student_id, kind, digest, value, scope)
+
+    def forget(self, student_id):
+        """حذف كل الصفحات المحفوظة لطالب (مثلاً عند تسجيل الخروج)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == student_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def section_unchanged(changes) -> bool:
+    """هل كل الصفحات التي جُلبت لقسم ما بقيت كما هي؟"""
+    return bool(changes) and not any(changes.values())
+
+
+page_store = PageHashStore()
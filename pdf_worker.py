@@ -0,0 +1,174 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import List
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+
+from arabic_shaping import shape, shape_row, shape_table, shaping_stats
+
+logger = logging.getLogger(__name__)
+
+font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'arial.ttf')
+pdfmetrics.registerFont(TTFont('Arial', font_path))
+
+# رسم ملفات PDF في عمليات منفصلة حتى لا يحجز GIL خيوط البوت
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+# الحد الأقصى للملفات قيد الرسم أو بالانتظار؛ بعده يُرفض الطلب فوراً
+PDF_QUEUE_SIZE = int(os.getenv("PDF_QUEUE_SIZE", "8"))
+PDF_TIMEOUT = int(os.getenv("PDF_TIMEOUT", "30"))
+
+PDF_BUSY_MSG = "⏳ يوجد ضغط على تجهيز الملفات حالياً، حاول مرة أخرى بعد قليل."
+
+
+class PdfQueueFull(Exception):
+    """طابور الرسم ممتلئ"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PDF_QUEUE_SIZE)
+
+
+def _get_executor(reset=False):
+    global _executor
+    with _executor_lock:
+        if reset and _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _executor is None:
+            # spawn بدل fork: البوت متعدد الخيوط ونسخ أقفاله إلى العملية الجديدة غير آمن
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, PDF_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def submit(func, *args):
+    """إرسال مهمة رسم؛ ترجع Future أو ترفع PdfQueueFull"""
+    if not _slots.acquire(blocking=False):
+        raise PdfQueueFull()
+    try:
+        try:
+            future = _get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            logger.warning("⚠️ عملية رسم PDF توقفت بشكل غير متوقع، إعادة إنشاء المجمع")
+            future = _get_executor(reset=True).submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def run(func, *args, timeout=PDF_TIMEOUT):
+    """رسم وانتظار النتيجة (للاستخدام خارج خيوط البوت)"""
+    return submit(func, *args).result(timeout=timeout)
+
+
+def run_async(func, *args, on_done, on_error, timeout=PDF_TIMEOUT):
+    """رسم في الخلفية؛ يُستدعى on_done(النتيجة) أو on_error(الخطأ) مرة واحدة فقط"""
+    future = submit(func, *args)
+    finished = []
+    lock = threading.Lock()
+
+    def claim():
+        with lock:
+            if finished:
+                return False
+            finished.append(True)
+            return True
+
+    def report_error(error):
+        try:
+            on_error(error)
+        except Exception as e:
+            logger.error(f"❌ خطأ في معالجة فشل رسم PDF: {e}")
+
+    def complete(fut):
+        if not claim():
+            return
+        timer.cancel()
+        try:
+            result = fut.result()
+        except Exception as e:
+            logger.error(f"❌ فشل رسم PDF: {e}")
+            report_error(e)
+            return
+        try:
+            on_done(result)
+        except Exception as e:
+            # خطأ الاستدعاء لا يظهر إلا في سجل concurrent.futures، فنبلغ المستخدم بالفشل
+            logger.error(f"❌ خطأ في تسليم ملف PDF: {e}")
+            report_error(e)
+
+    def expire():
+        if not claim():
+            return
+        future.cancel()
+        logger.warning(f"⚠️ تجاوز رسم PDF المهلة ({timeout} ثانية)")
+        report_error(FutureTimeout())
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    future.add_done_callback(complete)
+    return future
+
+
+def render_balance_pdf(rows: List[List[str]]) -> bytes:
+    """رسم جدول الرصيد كملف PDF"""
+    # الأعمدة والبيانات
+    columns = ["الفصل", " المطلوب", " المدفوع", " المنح", "المبلغ المتبقي"]
+    data = [columns]
+    for cols in rows:
+        data.append([cols[0], cols[1], cols[2], cols[4], cols[5]])
+
+    # معالجة النص العربي للعناوين وكل خلايا الجدول
+    data = [shape_row(columns)] + shape_table(data[1:])
+
+    output = BytesIO()
+    pdf = SimpleDocTemplate(output, pagesize=A4)
+    elements = []
+
+    style_sheet = getSampleStyleSheet()
+    arabic_style = style_sheet['Normal']
+    arabic_style.fontName = 'Arial'
+    arabic_style.fontSize = 12
+
+    # عنوان الصفحة
+    title_text = shape("رصيد الطالب")
+    elements.append(Paragraph(title_text, arabic_style))
+    elements.append(Spacer(1, 12))
+
+    # إنشاء الجدول
+    table = Table(data, repeatRows=1, hAlign='CENTER')
+    style = TableStyle([
+        ('FONTNAME', (0,0), (-1,-1), 'Arial'),
+        ('BACKGROUND', (0,0), (-1,0), colors.lightblue),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+        ('BACKGROUND', (0,1), (-1,-1), colors.whitesmoke),
+    ])
+    table.setStyle(style)
+
+    # تلوين الصفوف بالتناوب
+    for i in range(1, len(data)):
+        if i % 2 == 0:
+            table.setStyle(TableStyle([('BACKGROUND', (0,i), (-1,i), colors.lightgrey)]))
+
+    elements.append(table)
+    pdf.build(elements)
+    logger.debug(f"Arabic shaping cache: {shaping_stats()}")
+    return output.getvalue()
@@ -0,0 +1,111 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# عدد أخطاء الاتصال المتتالية قبل فتح القاطع
+FAILURE_THRESHOLD = int(os.getenv("PORTAL_BREAKER_FAILURES", "5"))
+# المدة قبل السماح بطلب تجريبي واحد بعد فتح القاطع (بالثواني)
+RESET_TIMEOUT = int(os.getenv("PORTAL_BREAKER_RESET", "120"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+PORTAL_UNAVAILABLE_MSG = "⚠️ بوابة الجامعة غير متاحة حالياً، يرجى المحاولة بعد قليل."
+
+
+class PortalUnavailable(requests.exceptions.ConnectionError):
+    """يُرفع فوراً عندما يكون القاطع مفتوحاً بدل انتظار مهلة الاتصال"""
+
+
+class CircuitBreaker:
+    """قاطع دائرة لموقع واحد: مغلق ← مفتوح بعد أخطاء متتالية ← نصف مفتوح (طلب تجريبي واحد)"""
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    def available(self):
+        """هل يمكن محاولة الاتصال الآن؟ (للحلقات والأزرار قبل البدء)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_timeout
+            return not self._probe_in_flight
+
+    def before_request(self):
+        """يُستدعى قبل كل طلب؛ يرفع PortalUnavailable إذا كان القاطع مفتوحاً"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                logger.info(f"🟡 قاطع {self.name}: إرسال طلب تجريبي")
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise PortalUnavailable(f"{self.name} غير متاح حالياً (القاطع مفتوح)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"🟢 قاطع {self.name}: عاد الاتصال، إغلاق القاطع")
+            self.state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(f"🔴 قاطع {self.name}: فتح القاطع بعد {self._failures} خطأ متتالي")
+
+    def release_probe(self):
+        """إلغاء الطلب التجريبي إذا انتهى بخطأ لا يخص الاتصال"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+breakers = {
+    "portal.qou.edu": CircuitBreaker("portal.qou.edu"),
+    "ecourse.qou.edu": CircuitBreaker("ecourse.qou.edu"),
+}
+portal_breaker = breakers["portal.qou.edu"]
+
+
+def breaker_for(url):
+    return breakers.get(urlparse(str(url)).hostname or "")
+
+
+def is_outage_status(status_code):
+    """أخطاء الخادم التي تعني أن البوابة متوقفة وليس أن الطلب خاطئ"""
+    return status_code in (502, 503, 504)
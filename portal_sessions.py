@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# مدة بقاء الجلسة الخاملة في الذاكرة قبل إزالتها (بالثواني)
+SESSION_IDLE_TTL = 20 * 60
+# الحد الأقصى لعدد الجلسات المحفوظة في نفس الوقت
+MAX_SESSIONS = 5000
+
+
+def _password_fingerprint(password):
+    """بصمة لكلمة المرور حتى لا تُعطى جلسة لمستخدم غيّر كلمة مروره"""
+    return hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+
+
+class PortalSessionRegistry:
+    """
+    سجل مشترك لجلسات البوابة المسجلة الدخول، مفهرس حسب الرقم الجامعي.
+    الجلسات مرتبة حسب آخر استخدام (الأقدم أولاً)، فالإزالة تتوقف عند أول جلسة غير منتهية
+    ولا يُفحص السجل كاملاً مع كل طلب.
+    """
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, max_sessions=MAX_SESSIONS):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, student_id, password):
+        """إرجاع جلسة مسجلة الدخول إن وجدت وما زالت صالحة، وإلا None"""
+        if not student_id:
+            return None
+
+        fingerprint = _password_fingerprint(password)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(student_id)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                self.misses += 1
+                return None
+
+            entry["last_used"] = now
+            self._entries.move_to_end(student_id)
+            self.hits += 1
+            return entry["session"]
+
+    def put(self, student_id, password, session):
+        """حفظ جلسة بعد نجاح تسجيل الدخول"""
+        if not student_id:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._entries[student_id] = {
+                "session": session,
+                "fingerprint": _password_fingerprint(password),
+                "last_used": now,
+            }
+            self._entries.move_to_end(student_id)
+            self._evict_expired(now)
+            # إزالة الأقدم استخداماً عند تجاوز الحد
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def touch(self, student_id):
+        """تحديث وقت آخر استخدام للجلسة"""
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                entry["last_used"] = time.monotonic()
+                self._entries.move_to_end(student_id)
+
+    def invalidate(self, student_id):
+        """إزالة جلسة الطالب (مثلاً عند انتهاء صلاحيتها على البوابة)"""
+        with self._lock:
+            self._entries.pop(student_id, None)
+
+    def evict_idle(self):
+        """إزالة جميع الجلسات الخاملة منذ أكثر من idle_ttl"""
+        with self._lock:
+            return self._evict_expired(time.monotonic())
+
+    def _evict_expired(self, now):
+        # يُستدعى مع الاحتفاظ بالقفل؛ الأقدم استخداماً في البداية
+        expired = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry["last_used"] <= self.idle_ttl:
+                break
+            del self._entries[key]
+            expired += 1
+        if expired:
+            logger.debug(f"تمت إزالة {expired} جلسة خاملة من سجل الجلسات")
+        return expired
+
+    def stats(self):
+        """إحصائيات السجل (للمراقبة)"""
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# السجل المشترك على مستوى العملية
+portal_sessions = PortalSessionRegistry()
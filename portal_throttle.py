@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# الأولويات: طلبات المستخدم في البوت تسبق دورات الجدولة في الخلفية
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# حدود كل موقع: (طلبات في الثانية، أقصى عدد طلبات جارية في نفس الوقت)
+HOST_LIMITS = {
+    "portal.qou.edu": (
+        float(os.getenv("PORTAL_RPS", "5")),
+        int(os.getenv("PORTAL_MAX_IN_FLIGHT", "8")),
+    ),
+    "ecourse.qou.edu": (
+        float(os.getenv("ECOURSE_RPS", "3")),
+        int(os.getenv("ECOURSE_MAX_IN_FLIGHT", "4")),
+    ),
+}
+# فترة الاستطلاع للمهام غير المتزامنة أثناء الانتظار (بالثواني)
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class HostBudget:
+    """دلو رموز (token bucket) مع حد للطلبات الجارية وطابور أولويات لموقع واحد"""
+
+    def __init__(self, host, rate, max_in_flight):
+        self.host = host
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.max_in_flight = max_in_flight
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiters = []
+        self._cond = threading.Condition()
+        self._wait_stats = {
+            INTERACTIVE: {"requests": 0, "total_wait": 0.0, "max_wait": 0.0},
+            BACKGROUND: {"requests": 0, "total_wait": 0.0, "max_wait": 0.0},
+        }
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def _try_acquire(self, ticket):
+        """محاولة حجز مكان للتذكرة؛ ترجع (نجاح، مدة الانتظار المقترحة أو None)"""
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiters[0] != ticket or self._in_flight >= self.max_in_flight:
+            return False, None
+        if self._tokens < 1:
+            return False, (1 - self._tokens) / self.rate
+        heapq.heappop(self._waiters)
+        self._tokens -= 1
+        self._in_flight += 1
+        return True, None
+
+    def _cancel(self, ticket):
+        if ticket in self._waiters:
+            self._waiters.remove(ticket)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def _record_wait(self, priority, waited):
+        stats = self._wait_stats[priority]
+        stats["requests"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        if waited > 5:
+            logger.info(f"⏳ انتظار {waited:.1f} ثانية لطلب على {self.host} (طابور: {len(self._waiters)})")
+
+    def acquire(self, ticket):
+        priority = ticket[0]
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    acquired, wait = self._try_acquire(ticket)
+                    if acquired:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                self._cancel(ticket)
+                raise
+            self._record_wait(priority, time.monotonic() - started)
+            self._cond.notify_all()
+
+    async def acquire_async(self, ticket):
+        priority = ticket[0]
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                with self._cond:
+                    acquired, wait = self._try_acquire(ticket)
+                    if acquired:
+                        self._record_wait(priority, time.monotonic() - started)
+                        self._cond.notify_all()
+                        return
+                await asyncio.sleep(min(wait or ASYNC_POLL_INTERVAL, 1.0))
+        except BaseException:
+            with self._cond:
+                self._cancel(ticket)
+            raise
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            waits = {}
+            for priority, data in self._wait_stats.items():
+                name = "interactive" if priority == INTERACTIVE else "background"
+                waits[name] = {
+                    "requests": data["requests"],
+                    "avg_wait": round(data["total_wait"] / data["requests"], 3) if data["requests"] else 0.0,
+                    "max_wait": round(data["max_wait"], 3),
+                }
+            return {
+                "rate": self.rate,
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "queued_background": sum(1 for ticket in self._waiters if ticket[0] == BACKGROUND),
+                "tokens": round(self._tokens, 2),
+                "waits": waits,
+            }
+
+
+class PortalGovernor:
+    """محدد مشترك لكل طلبات البوابة والتعليم الإلكتروني (متزامن وغير متزامن)"""
+
+    def __init__(self, limits=None):
+        self._budgets = {
+            host: HostBudget(host, rate, max_in_flight)
+            for host, (rate, max_in_flight) in (limits or HOST_LIMITS).items()
+        }
+        self._sequence = itertools.count()
+
+    def _budget_for(self, url):
+        return self._budgets.get(urlparse(str(url)).hostname or "")
+
+    def _ticket(self, priority):
+        return (priority, next(self._sequence))
+
+    @contextmanager
+    def slot(self, url, priority=INTERACTIVE):
+        """حجز مكان قبل إرسال طلب متزامن (requests)"""
+        budget = self._budget_for(url)
+        if budget is None:
+            yield
+            return
+        budget.acquire(self._ticket(priority))
+        try:
+            yield
+        finally:
+            budget.release()
+
+    @asynccontextmanager
+    async def slot_async(self, url, priority=INTERACTIVE):
+        """حجز مكان قبل إرسال طلب غير متزامن (aiohttp)"""
+        budget = self._budget_for(url)
+        if budget is None:
+            yield
+            return
+        await budget.acquire_async(self._ticket(priority))
+        try:
+            yield
+        finally:
+            budget.release()
+
+    def stats(self):
+        return {host: budget.stats() for host, budget in self._budgets.items()}
+
+
+# المحدد المشترك على مستوى العملية
+portal_governor = PortalGovernor()
@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from portal_breaker import breaker_for, is_outage_status
+from portal_throttle import portal_governor, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# مهلة (الاتصال، القراءة) بالثواني حسب الصفحة؛ أول بادئة مطابقة تُستخدم
+ENDPOINT_TIMEOUTS = (
+    ("portal.qou.edu/login.do", (5, 30)),
+    ("portal.qou.edu/student/showMajorSheet.do", (5, 30)),
+    ("portal.qou.edu/student/showTermSchedule.do", (5, 10)),
+    ("portal.qou.edu/calendarProposed.do", (5, 10)),
+    ("ecourse.qou.edu", (5, 30)),
+)
+DEFAULT_TIMEOUT = (5, 20)
+
+# إعادة المحاولة لطلبات GET فقط (آمنة للتكرار)
+GET_RETRIES = int(os.getenv("PORTAL_GET_RETRIES", "2"))
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (502, 503, 504)
+
+# حدود فئات زمن الاستجابة (بالملي ثانية)
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# محوّل مشترك لكل جلسات requests حتى تتشارك نفس مجمع اتصالات urllib3
+SHARED_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=int(os.getenv("PORTAL_POOL_SIZE", "32")),
+    max_retries=0,
+)
+
+
+def new_session() -> requests.Session:
+    """جلسة requests جديدة (كوكيز مستقلة) فوق مجمع الاتصالات المشترك"""
+    session = requests.Session()
+    session.mount("https://", SHARED_ADAPTER)
+    session.mount("http://", SHARED_ADAPTER)
+    return session
+
+
+# جلسة للصفحات العامة التي لا تحتاج تسجيل دخول (التقويم)
+_public_session = new_session()
+
+
+def endpoint_key(url) -> str:
+    parsed = urlparse(str(url))
+    return f"{parsed.hostname}{parsed.path}"
+
+
+def timeout_for(url):
+    key = endpoint_key(url)
+    for prefix, timeout in ENDPOINT_TIMEOUTS:
+        if key.startswith(prefix):
+            return timeout
+    return DEFAULT_TIMEOUT
+
+
+class EndpointMetrics:
+    """مدرج زمن الاستجابة وحالات الرد لكل صفحة"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, url, elapsed, status=None, error=None):
+        key = endpoint_key(url)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            data = self._endpoints.get(key)
+            if data is None:
+                data = self._endpoints[key] = {
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                    "statuses": {},
+                    "errors": {},
+                    "retries": 0,
+                }
+            data["count"] += 1
+            data["total_ms"] += elapsed_ms
+            data["max_ms"] = max(data["max_ms"], elapsed_ms)
+            data["buckets"][bisect.bisect_left(LATENCY_BUCKETS, elapsed_ms)] += 1
+            if status is not None:
+                data["statuses"][status] = data["statuses"].get(status, 0) + 1
+            if error is not None:
+                data["errors"][error] = data["errors"].get(error, 0) + 1
+
+    def record_retry(self, url):
+        key = endpoint_key(url)
+        with self._lock:
+            if key in self._endpoints:
+                self._endpoints[key]["retries"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for key, data in self._endpoints.items():
+                labels = [f"<{b}ms" for b in LATENCY_BUCKETS] + [f">={LATENCY_BUCKETS[-1]}ms"]
+                result[key] = {
+                    "count": data["count"],
+                    "avg_ms": round(data["total_ms"] / data["count"], 1) if data["count"] else 0.0,
+                    "max_ms": round(data["max_ms"], 1),
+                    "histogram": {label: n for label, n in zip(labels, data["buckets"]) if n},
+                    "statuses": dict(data["statuses"]),
+                    "errors": dict(data["errors"]),
+                    "retries": data["retries"],
+                }
+            return result
+
+
+metrics = EndpointMetrics()
+
+
+def _backoff(attempt):
+    # تأخير عشوائي كامل (full jitter) لتجنب تزامن إعادة المحاولات
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+
+def request(session, method, url, priority=INTERACTIVE, **kwargs):
+    """
+    نقطة الإرسال الموحدة لكل طلبات البوابة والتعليم الإلكتروني:
+    المحدد المشترك + قاطع الدائرة + مهلة لكل صفحة + إعادة محاولة لطلبات GET + القياسات.
+    القاطع يسجل نتيجة واحدة للطلب بعد انتهاء المحاولات، لا لكل محاولة.
+    """
+    session = session or _public_session
+    kwargs.setdefault("timeout", timeout_for(url))
+    retries = GET_RETRIES if method.upper() == "GET" else 0
+    breaker = breaker_for(url)
+
+    if breaker:
+        breaker.before_request()
+    for attempt in range(retries + 1):
+        last_attempt = attempt >= retries
+        started = time.monotonic()
+        try:
+            with portal_governor.slot(url, priority):
+                resp = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.record(url, time.monotonic() - started, error=type(e).__name__)
+            if last_attempt:
+                if breaker:
+                    breaker.record_failure()
+                raise
+            logger.info(f"إعادة محاولة {method} {endpoint_key(url)} بعد خطأ: {type(e).__name__}")
+        except BaseException:
+            if breaker:
+                breaker.release_probe()
+            raise
+        else:
+            metrics.record(url, time.monotonic() - started, status=resp.status_code)
+            if resp.status_code not in RETRY_STATUSES or last_attempt:
+                if breaker:
+                    if is_outage_status(resp.status_code):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                return resp
+            logger.info(f"إعادة محاولة {method} {endpoint_key(url)} بعد الحالة {resp.status_code}")
+
+        metrics.record_retry(url)
+        time.sleep(_backoff(attempt))
+
+
+def aiohttp_timeout_for(url) -> aiohttp.ClientTimeout:
+    connect, read = timeout_for(url)
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+class AsyncResponse:
+    """رد request_async بعد قراءة النص وإرجاع الاتصال للمجمع (مثل requests.Response)"""
+
+    def __init__(self, text, url, status, request_info, history):
+        self.text = text
+        self.url = url
+        self.status = status
+        self._request_info = request_info
+        self._history = history
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(self._request_info, self._history, status=self.status,
+                                              message=f"HTTP {self.status}")
+
+
+async def request_async(session, method, url, priority=INTERACTIVE, **kwargs):
+    """النسخة غير المتزامنة من request؛ ترجع AsyncResponse ولا ترفع خطأ لحالات 4xx/5xx مثل request"""
+    kwargs.setdefault("timeout", aiohttp_timeout_for(url))
+    retries = GET_RETRIES if method.upper() == "GET" else 0
+    breaker = breaker_for(url)
+
+    if breaker:
+        breaker.before_request()
+    for attempt in range(retries + 1):
+        last_attempt = attempt >= retries
+        started = time.monotonic()
+        try:
+            async with portal_governor.slot_async(url, priority):
+                async with session.request(method, url, **kwargs) as resp:
+                    status = resp.status
+                    metrics.record(url, time.monotonic() - started, status=status)
+                    if status not in RETRY_STATUSES or last_attempt:
+                        result = AsyncResponse(await resp.text(), str(resp.url), status,
+                                               resp.request_info, resp.history)
+                        if breaker:
+                            if is_outage_status(status):
+                                breaker.record_failure()
+                            else:
+                                breaker.record_success()
+                        return result
+            logger.info(f"إعادة محاولة {method} {endpoint_key(url)} بعد الحالة {status}")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            metrics.record(url, time.monotonic() - started, error=type(e).__name__)
+            if last_attempt:
+                if breaker:
+                    breaker.record_failure()
+                raise
+            logger.info(f"إعادة محاولة {method} {endpoint_key(url)} بعد خطأ: {type(e).__name__}")
+        except BaseException:
+            if breaker:
+                breaker.release_probe()
+            raise
+
+        metrics.record_retry(url)
+        await asyncio.sleep(_backoff(attempt))
+
+
+def transport_stats():
+    """قياسات الطلبات لكل صفحة (للمراقبة وضبط المهل)"""
+    return metrics.snapshot()
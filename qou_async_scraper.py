@@ -0,0 +1,321 @@
+import asyncio
+import logging
+import os
+from typing import Optional, List
+
+import aiohttp
+from yarl import URL
+
+import qou_parsers
+import exam_cache
+from page_cache import page_store, section_unchanged
+from portal_sessions import portal_sessions
+import portal_transport
+from portal_throttle import INTERACTIVE, BACKGROUND
+from portal_breaker import PortalUnavailable, portal_breaker
+from qou_scraper import (
+    LOGIN_URL,
+    INBOX_URL,
+    TERM_SUMMARY_URL,
+    WEEKLY_MEETINGS_URL,
+    EXAMS_SCHEDULE_URL,
+    EXAM_TYPE_MAP,
+)
+
+logger = logging.getLogger(__name__)
+
+PORTAL_ROOT = URL("https://portal.qou.edu/")
+# عدد الطلاب الذين يتم جلب بياناتهم في نفس الوقت
+PORTAL_CONCURRENCY = int(os.getenv("PORTAL_CONCURRENCY", "10"))
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=60)
+
+
+class AsyncQOUScraper:
+    """نسخة غير متزامنة من QOUScraper (aiohttp) بنفس الدوال ونفس المخرجات"""
+
+    def __init__(self, student_id: str, password: str, session: Optional[aiohttp.ClientSession] = None,
+                 priority: int = INTERACTIVE, connector: Optional[aiohttp.BaseConnector] = None):
+        self.student_id = student_id
+        self.password = password
+        self.is_logged_in = False
+        self.priority = priority
+        self.page_changes = {}
+        self.pending_pages = None
+        # يمنع عدة مهام من إعادة تسجيل الدخول معاً عند انتهاء الجلسة
+        self._login_lock = asyncio.Lock()
+        self._login_count = 0
+        self._owns_session = session is None
+        # عند تمرير connector مشترك تتشارك الجلسات نفس مجمع الاتصالات مع كوكيز مستقلة
+        self.session = session or aiohttp.ClientSession(
+            cookie_jar=aiohttp.CookieJar(),
+            timeout=REQUEST_TIMEOUT,
+            connector=connector,
+            connector_owner=connector is None,
+        )
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                          "AppleWebKit/537.36 (KHTML, like Gecko) "
+                          "Chrome/114.0.0.0 Safari/537.36",
+            "Accept-Language": "ar,en;q=0.9",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session and not self.session.closed:
+            await self.session.close()
+
+    # ------------------- الجلسة وتسجيل الدخول -------------------
+    def _load_cached_cookies(self) -> bool:
+        """نسخ كوكيز جلسة متزامنة محفوظة (إن وجدت) إلى جلسة aiohttp"""
+        cached_session = portal_sessions.get(self.student_id, self.password)
+        if cached_session is None:
+            return False
+        self.session.cookie_jar.update_cookies(cached_session.cookies.get_dict(), response_url=PORTAL_ROOT)
+        return True
+
+    def _share_cookies(self):
+        """حفظ الجلسة في السجل المشترك حتى تستفيد منها QOUScraper أيضاً"""
+        shared = portal_transport.new_session()
+        for cookie in self.session.cookie_jar:
+            shared.cookies.set(
+                cookie.key,
+                cookie.value,
+                domain=cookie["domain"] or PORTAL_ROOT.host,
+                path=cookie["path"] or "/",
+            )
+        portal_sessions.put(self.student_id, self.password, shared)
+
+    async def login(self, force: bool = False) -> bool:
+        """تسجيل الدخول إلى بوابة الجامعة والتحقق من نجاح العملية"""
+        if not force and self._load_cached_cookies():
+            self.is_logged_in = True
+            return True
+
+        try:
+            # زيارة الصفحة الرئيسية أولاً لتهيئة الجلسة
+            await self._send("GET", LOGIN_URL, headers=self.headers)
+
+            params = {
+                'userId': self.student_id,
+                'password': self.password,
+                'logBtn': 'Login'
+            }
+
+            resp = await self._send("POST", LOGIN_URL, data=params, headers=self.headers, allow_redirects=True)
+            success = "logout" in resp.text.lower() or "student" in resp.url
+
+            self.is_logged_in = success
+            if success:
+                self._login_count += 1
+                self._share_cookies()
+            else:
+                portal_sessions.invalidate(self.student_id)
+            return success
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, PortalUnavailable) as e:
+            logger.error(f"Login request failed for {self.student_id}: {e}")
+            self.is_logged_in = False
+            return False
+
+    async def _send(self, method: str, url: str, **kwargs):
+        """إرسال طلب واحد عبر طبقة النقل الموحدة؛ يرجع AsyncResponse"""
+        return await portal_transport.request_async(self.session, method, url, self.priority, **kwargs)
+
+    async def _fetch(self, method: str, url: str, **kwargs) -> str:
+        """إرسال طلب وإرجاع نص الصفحة، مع إعادة تسجيل الدخول مرة واحدة إذا انتهت الجلسة؛ يرفع خطأ لحالات 4xx/5xx"""
+        kwargs.setdefault("headers", self.headers)
+        for attempt in range(2):
+            login_count = self._login_count
+            resp = await self._send(method, url, **kwargs)
+            login_page = resp.url.split("?")[0].endswith("/login.do") or 'name="logBtn"' in resp.text
+
+            if not (self.is_logged_in and login_page) or attempt == 1:
+                break
+
+            async with self._login_lock:
+                # ربما أعادت مهمة أخرى تسجيل الدخول أثناء هذا الطلب
+                if self._login_count == login_count:
+                    logger.info(f"انتهت جلسة البوابة للطالب {self.student_id}، إعادة تسجيل الدخول")
+                    portal_sessions.invalidate(self.student_id)
+                    await self.login(force=True)
+            if not self.is_logged_in:
+                break
+
+        portal_sessions.touch(self.student_id)
+        # مثل resp.raise_for_status() في دوال QOUScraper
+        resp.raise_for_status()
+        return resp.text
+
+    async def _get(self, url: str, **kwargs) -> str:
+        return await self._fetch("GET", url, **kwargs)
+
+    async def _post(self, url: str, **kwargs) -> str:
+        return await self._fetch("POST", url, **kwargs)
+
+    # ------------------- جلب البيانات -------------------
+    def _parse_page(self, kind: str, html: str, parser):
+        """تحليل الصفحة فقط إذا تغيرت منذ آخر جلب لنفس الطالب"""
+        return page_store.parse(self.student_id, kind, html, parser, self.page_changes, self.priority,
+                                self.pending_pages)
+
+    async def fetch_latest_message(self) -> Optional[dict]:
+        html = await self._get(INBOX_URL)
+        digest, unchanged, cached = page_store.lookup(self.student_id, "inbox", html, self.priority)
+        self.page_changes["inbox"] = not unchanged
+        if unchanged:
+            return cached
+
+        latest = qou_parsers.parse_inbox_latest(html, INBOX_URL)
+        if latest:
+            latest['body'] = qou_parsers.parse_message_body(await self._get(latest.pop('link')))
+        page_store.store(self.student_id, "inbox", digest, latest, self.priority, self.pending_pages)
+        return latest
+
+    async def fetch_term_summary_courses(self) -> List[dict]:
+        try:
+            html = await self._get(TERM_SUMMARY_URL)
+            return self._parse_page("term_courses", html, qou_parsers.parse_term_summary_courses)
+        except Exception as e:
+            logger.info(f"تم تخطي خطأ في جلب المقررات: {e}")
+            return []
+
+    async def fetch_discussion_sessions(self) -> List[dict]:
+        html = await self._get(WEEKLY_MEETINGS_URL)
+        return self._parse_page("discussions", html, qou_parsers.parse_discussion_sessions)
+
+    async def fetch_term_summary_stats(self) -> dict:
+        html = await self._get(TERM_SUMMARY_URL)
+        return self._parse_page("term_stats", html, qou_parsers.parse_term_summary_stats)
+
+    async def fetch_gpa(self):
+        return qou_parsers.gpa_from_stats(await self.fetch_term_summary_stats())
+
+    async def get_last_two_terms(self):
+        html = await self._get(EXAMS_SCHEDULE_URL)
+        terms = self._parse_page("exam_terms", html, qou_parsers.parse_exam_terms)
+        exam_cache.note_terms(self.student_id, terms)
+        return terms
+
+    async def fetch_exam_schedule(self, term_no, exam_type, use_cache: bool = True) -> List[dict]:
+        if use_cache:
+            cached = exam_cache.get_exams(self.student_id, term_no, exam_type)
+            if cached is not None:
+                return [dict(exam) for exam in cached]
+
+        payload = {
+            "termNo": term_no,
+            "examType": exam_type
+        }
+        html = await self._post(EXAMS_SCHEDULE_URL, data=payload)
+        exams = self._parse_page(f"exams:{term_no}:{exam_type}", html, qou_parsers.parse_exam_schedule)
+        exam_cache.store_exams(self.student_id, term_no, exam_type, exams)
+        return exams
+
+    async def fetch_lectures_schedule(self) -> List[dict]:
+        try:
+            html = await self._get(WEEKLY_MEETINGS_URL)
+        except asyncio.TimeoutError:
+            logger.error("Request timeout for weekly meetings")
+            return []
+        except aiohttp.ClientError as e:
+            logger.error(f"Connection error: {e}")
+            return []
+
+        try:
+            return self._parse_page("lectures", html, qou_parsers.parse_lectures_schedule)
+        except Exception as e:
+            logger.error(f"Error parsing schedule HTML: {e}")
+            return []
+
+    async def fetch_all_exams(self, use_cache: bool = True) -> list:
+        """جلب امتحانات آخر فصلين لكل الأنواع بالتوازي: قائمة (نوع الامتحان، الامتحانات)"""
+        terms = await self.get_last_two_terms()
+        if not terms:
+            logger.warning(f"[{self.student_id}] لا توجد فصول دراسية")
+            return []
+
+        jobs = [(term["value"], exam_code) for term in terms for exam_code in EXAM_TYPE_MAP]
+
+        async def fetch(job):
+            term_no, exam_code = job
+            return exam_code, await self.fetch_exam_schedule(term_no, exam_code, use_cache)
+
+        results = []
+        for job, result in zip(jobs, await run_bounded(jobs, fetch, exam_cache.EXAM_FETCH_CONCURRENCY)):
+            if isinstance(result, BaseException):
+                logger.error(f"[{self.student_id}] خطأ أثناء جلب الامتحانات للفصل {job[0]} ونوع {job[1]}: {result}")
+                continue
+            results.append(result)
+        return results
+
+
+# ====================== التشغيل المتوازي المحدود ======================
+CRAWL_ORDER = ("messages", "courses", "gpa", "discussions", "lectures", "exams")
+
+
+async def crawl_user_async(user: dict, sections, connector=None) -> Optional[dict]:
+    """تسجيل الدخول مرة واحدة وجلب الأقسام المطلوبة، بنفس شكل لقطة scheduler.crawl_user"""
+    chat_id = user['chat_id']
+    # إذا تعطلت البوابة أثناء الدورة نتوقف فوراً بدل محاولة تسجيل دخول كل مستخدم
+    if not portal_breaker.available():
+        raise PortalUnavailable("portal.qou.edu غير متاح حالياً")
+
+    async with AsyncQOUScraper(user['student_id'], user['password'], priority=BACKGROUND, connector=connector) as scraper:
+        if not await scraper.login():
+            logger.warning(f"[{chat_id}] فشل تسجيل الدخول للطالب {user['student_id']}")
+            return None
+
+        fetchers = {
+            "messages": scraper.fetch_latest_message,
+            "courses": scraper.fetch_term_summary_courses,
+            "gpa": scraper.fetch_gpa,
+            "discussions": scraper.fetch_discussion_sessions,
+            "lectures": scraper.fetch_lectures_schedule,
+            "exams": lambda: scraper.fetch_all_exams(use_cache=False),
+        }
+
+        snapshot = {}
+        for section in CRAWL_ORDER:
+            if section not in sections:
+                continue
+            try:
+                scraper.page_changes.clear()
+                scraper.pending_pages = snapshot.setdefault("pages", {}).setdefault(section, [])
+                snapshot[section] = await fetchers[section]()
+                if section_unchanged(scraper.page_changes):
+                    snapshot.setdefault("unchanged", set()).add(section)
+            except Exception as e:
+                logger.error(f"[{chat_id}] خطأ في جلب {section}: {e}")
+        return snapshot
+
+
+async def run_bounded(items, worker, concurrency: int = PORTAL_CONCURRENCY) -> list:
+    """تشغيل worker على كل عنصر بحد أقصى من المهام المتزامنة، النتائج بنفس الترتيب"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(item):
+        async with semaphore:
+            return await worker(item)
+
+    return await asyncio.gather(*(run_one(item) for item in items), return_exceptions=True)
+
+
+def crawl_users(users: list, sections, concurrency: int = PORTAL_CONCURRENCY) -> list:
+    """
+    جلب لقطات عدة مستخدمين بالتوازي (واجهة متزامنة للاستخدام من scheduler).
+    ترجع قائمة بنفس ترتيب users: لقطة، أو None عند فشل الدخول، أو الاستثناء.
+    """
+    async def crawl_all():
+        connector = aiohttp.TCPConnector(limit=max(1, concurrency) * 2)
+        try:
+            return await run_bounded(users, lambda user: crawl_user_async(user, sections, connector), concurrency)
+        finally:
+            await connector.close()
+
+    return asyncio.run(crawl_all())
@@ -0,0 +1,668 @@
+import logging
+import re
+from datetime import datetime
+from typing import Optional, List
+from urllib.parse import urljoin
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+# دوال تحليل صفحات البوابة (بدون أي اتصال بالشبكة)
+# تستخدمها QOUScraper والنسخة غير المتزامنة AsyncQOUScraper لضمان نفس المخرجات
+
+# lxml أسرع بكثير من html.parser إن كان مثبتاً
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# تحليل الجزء المطلوب فقط من الصفحة بدل بناء الشجرة كاملة
+USE_STRAINERS = True
+
+LECTURES_TABLE_CLASS = "table table-hover table-condensed table-striped table-curved"
+
+
+def _has_class(name):
+    # أثناء التحليل تُقارن class كنص كامل، لذلك نطابق الاسم كأحد الأصناف
+    return re.compile(rf"(^|\s){re.escape(name)}(\s|$)")
+
+
+STRAINERS = {
+    "inbox": SoupStrainer("tbody"),
+    "message_body": SoupStrainer("div", class_=_has_class("message-body")),
+    "term_courses": SoupStrainer("div", class_="box box-warning"),
+    "data_table": SoupStrainer("table", id="dataTable"),
+    "term_stats": SoupStrainer("table", id="dataTable3"),
+    "exam_terms": SoupStrainer("select", attrs={"name": "termNo"}),
+    "lectures": SoupStrainer("table", class_=LECTURES_TABLE_CLASS),
+    "calendar_rows": SoupStrainer("tr"),
+    "member_cards": SoupStrainer("div", class_=_has_class("member-card")),
+    "form_groups": SoupStrainer("div", class_=_has_class("form-group")),
+    "box_headers": SoupStrainer("div", class_=_has_class("box-header")),
+    "ecourse_courses": SoupStrainer("div", id="frontpage-course-list"),
+}
+
+# محددات CSS مترجمة مسبقاً
+INBOX_ROW = soupsieve.compile("tbody tr")
+INBOX_LINK = soupsieve.compile("td[col_4] a[href*='msgId=']")
+INBOX_SENDER = soupsieve.compile("td[col_7]")
+INBOX_DATE = soupsieve.compile("td[col_5]")
+BALANCE_ROW = soupsieve.compile("table#dataTable tbody tr")
+
+CALENDAR_LABELS = ("الموضوع : ", "الاسبوع : ", "اليوم : ", "من : ", "الى : ")
+
+STUDY_STAT_PATTERNS = {
+    'total_hours_required': re.compile(r'عدد الساعات المطلوبة[^\d]*(\d+)'),
+    'total_hours_completed': re.compile(r'عدد الساعات المجتازة[^\d]*(\d+)'),
+    'total_hours_transferred': re.compile(r'عدد الساعات المحتسبة[^\d]*(\d+)'),
+    'semesters_count': re.compile(r'عدد الفصول[^\d]*(\d+)'),
+}
+PLAN_COMPLETED_PATTERN = re.compile(r'انهى الخطة[^\d]*(نعم|لا)')
+
+MEETING_LINK_KEYWORDS = ('playback', 'vc1.qou.edu', 'vc2.qou.edu', 'vc3.qou.edu')
+MEETING_SEMESTERS = (
+    (('الفصل الدراسي الأول', '1201'), 'الفصل الدراسي الأول'),
+    (('الفصل الدراسي الثاني', '1202'), 'الفصل الدراسي الثاني'),
+    (('الفصل الدراسي الصيفي', '1203'), 'الفصل الدراسي الصيفي'),
+    (('1193',), 'الفصل الصيفي (1193)'),
+    (('1192',), 'الفصل الثاني (1192)'),
+    (('1191',), 'الفصل الأول (1191)'),
+)
+
+
+def set_parse_mode(parser=None, use_strainers=True):
+    """تغيير طريقة التحليل (يُستخدم في قياس الأداء للمقارنة قبل/بعد)"""
+    global HTML_PARSER, USE_STRAINERS
+    if parser:
+        HTML_PARSER = parser
+    USE_STRAINERS = use_strainers
+
+
+def make_soup(html: str, target: str = None) -> BeautifulSoup:
+    """بناء شجرة HTML، مقتصرة على العنصر المطلوب إذا حُدد target"""
+    strainer = STRAINERS.get(target) if USE_STRAINERS and target else None
+    return BeautifulSoup(html, HTML_PARSER, parse_only=strainer)
+
+
+def parse_inbox_latest(html: str, base_url: str) -> Optional[dict]:
+    """استخراج آخر رسالة من صندوق الوارد (بدون نص الرسالة)"""
+    soup = make_soup(html, "inbox")
+
+    row = INBOX_ROW.select_one(soup)
+    if not row:
+        return None
+
+    link_tag = INBOX_LINK.select_one(row)
+    if not link_tag:
+        return None
+
+    sender = INBOX_SENDER.select_one(row)
+    date = INBOX_DATE.select_one(row)
+
+    return {
+        'msg_id': link_tag['href'].split('msgId=')[-1],
+        'link': urljoin(base_url, link_tag['href']),
+        'subject': link_tag.get_text(strip=True),
+        'sender': sender.get_text(strip=True) if sender else '',
+        'date': date.get_text(strip=True) if date else '',
+    }
+
+
+def parse_message_body(html: str) -> str:
+    soup = make_soup(html, "message_body")
+    body = soup.find('div', class_='message-body')
+    return body.get_text(strip=True) if body else ''
+
+
+def parse_term_summary_courses(html: str) -> List[dict]:
+    soup = make_soup(html, "term_courses")
+
+    courses = []
+
+    # ✅ البحث عن المقررات من الـ HTML الحالي (صفحة الجدول الزمني)
+    course_boxes = soup.find_all('div', class_='box box-warning')
+
+    for box in course_boxes:
+        try:
+            # استخراج عنوان المقرر
+            header = box.find('div', class_='box-header')
+            if not header:
+                continue
+
+            title_div = header.find('div', class_='pull-right text-warning')
+            if not title_div:
+                continue
+
+            course_title = title_div.get_text(strip=True)
+            # مثال: "1/0111 اللغة العربية (1)" → نستخرج "1/0111" و"اللغة العربية (1)"
+            parts = course_title.split(' ', 1)
+            course_code = parts[0] if len(parts) > 0 else ""
+            course_name = parts[1] if len(parts) > 1 else ""
+
+            # استخراج الساعات المعتمدة من قسم اللقاءات
+            credit_hours = "3"  # قيمة افتراضية
+            schedule_section = box.find('div', class_='box-body box-body-dark')
+            if schedule_section:
+                credit_label = schedule_section.find('label', string='س.م:')
+                if credit_label:
+                    credit_div = credit_label.find_next('div')
+                    if credit_div:
+                        credit_hours = credit_div.get_text(strip=True)
+
+            courses.append({
+                'course_code': course_code,
+                'course_name': course_name,
+                'credit_hours': credit_hours,
+                'status': "مسجل",  # جميع المقررات في الجدول تكون مسجلة
+                'midterm_mark': "-",  # لا توجد علامات في صفحة الجدول
+                'final_mark': "-",   # لا توجد علامات في صفحة الجدول
+                'final_mark_date': "-"
+            })
+
+        except Exception as e:
+            logger.info(f"خطأ في معالجة مقرر: {e}")
+            continue
+
+    return courses
+
+
+def parse_discussion_sessions(html: str) -> List[dict]:
+    soup = make_soup(html, "data_table")
+
+    sessions = []
+    table = soup.find("table", {"id": "dataTable"})
+    if not table:
+        return sessions
+
+    rows = table.find("tbody").find_all("tr")
+    for row in rows:
+        cols = row.find_all("td")
+        if len(cols) < 5:
+            continue
+        sessions.append({
+            "course_code": cols[0].get_text(strip=True),
+            "course_name": cols[1].get_text(strip=True),
+            "section": cols[2].get_text(strip=True),
+            "date": cols[3].get_text(strip=True),  # 17/08/2025
+            "time": cols[4].get_text(strip=True)   # 11:00 - 12:00
+        })
+    return sessions
+
+
+def parse_term_summary_stats(html: str) -> dict:
+    soup = make_soup(html, "term_stats")
+
+    stats_table = soup.find('table', id='dataTable3')
+    if not stats_table:
+        return {}
+
+    rows = stats_table.find('tbody').find_all('tr')
+    if len(rows) < 2:
+        return {}
+
+    def parse_row(row):
+        cols = row.find_all('td')
+        return {
+            'type': cols[0].get_text(strip=True),
+            'registered_hours': cols[1].get_text(strip=True),
+            'passed_hours': cols[2].get_text(strip=True),
+            'counted_hours': cols[3].get_text(strip=True),
+            'failed_hours': cols[4].get_text(strip=True),
+            'withdrawn_hours': cols[5].get_text(strip=True),
+            'points': cols[6].get_text(strip=True),
+            'gpa': cols[7].get_text(strip=True),
+            'honor_list': cols[8].get_text(strip=True)
+        }
+
+    return {
+        'term': parse_row(rows[0]),
+        'cumulative': parse_row(rows[1])
+    }
+
+
+def gpa_from_stats(stats: dict) -> Optional[dict]:
+    """استخراج المعدل الفصلي والتراكمي من إحصائيات الفصل"""
+    if not stats:
+        return None
+
+    # تنظيف البيانات
+    def clean_gpa_value(gpa):
+        if not gpa or gpa in ['غير متوفر', 'N/A', '']:
+            return "غير متوفر"
+        try:
+            # تحويل إلى رقم للتأكد من صحته
+            float(gpa)
+            return gpa
+        except (ValueError, TypeError):
+            return "غير متوفر"
+
+    return {
+        "term_gpa": clean_gpa_value(stats.get('term', {}).get('gpa')),
+        "cumulative_gpa": clean_gpa_value(stats.get('cumulative', {}).get('gpa'))
+    }
+
+
+def parse_exam_terms(html: str) -> List[dict]:
+    """استخراج آخر فصلين من قائمة الفصول في صفحة الامتحانات"""
+    soup = make_soup(html, "exam_terms")
+    select_term = soup.find("select", {"name": "termNo"})
+    if not select_term:
+        return []
+    options = select_term.find_all("option")
+    # عادةً يكون أول خيار هو الفصل الحالي، الثاني السابق
+    last_two = options[:2]
+    return [{'value': opt['value'], 'label': opt.get_text(strip=True)} for opt in last_two]
+
+
+def parse_exam_schedule(html: str) -> List[dict]:
+    soup = make_soup(html, "data_table")
+    table = soup.find("table", id="dataTable")
+    if not table:
+        return []
+
+    exams = []
+    rows = table.find("tbody").find_all("tr")
+    for row in rows:
+        cols = row.find_all("td")
+        if len(cols) < 11:
+            continue
+
+        exams.append({
+            "exam_kind": cols[0].get_text(strip=True),
+            "course_code": cols[1].get_text(strip=True),
+            "course_name": cols[2].get_text(strip=True),
+            "lecturer": cols[3].get_text(strip=True),
+            "section": cols[4].get_text(strip=True),
+            "day": cols[5].get_text(strip=True),
+            "date": cols[6].get_text(strip=True),
+            "session": cols[7].get_text(strip=True),
+            "from_time": cols[8].get_text(strip=True),
+            "to_time": cols[9].get_text(strip=True),
+            "note": cols[10].get_text(strip=True)
+        })
+
+    return exams
+
+
+def parse_lectures_schedule(html: str) -> List[dict]:
+    soup = make_soup(html, "lectures")
+    schedule = []
+
+    table = soup.find("table", {"class": LECTURES_TABLE_CLASS})
+
+    if not table:
+        logger.warning("Table not found")
+        return schedule
+
+    # البحث عن tbody أولاً
+    tbody = table.find("tbody")
+    if not tbody:
+        logger.warning("tbody not found")
+        return schedule
+
+    # البحث عن جميع العناصر tr داخل tbody - بدون أي فلترة أولية
+    rows = tbody.find_all("tr")
+    logger.info(f"Found {len(rows)} raw tr elements")
+
+    for i, row in enumerate(rows):
+        try:
+            # البحث عن خلايا td داخل الصف - حتى لو كان هناك input
+            cols = row.find_all("td")
+            if len(cols) < 9:  # يجب أن يكون هناك على الأقل 9 أعمدة
+                logger.debug(f"Skipping row {i} - only {len(cols)} columns")
+                continue
+
+            # استخراج البيانات من الأعمدة
+            course_code_full = cols[0].get_text(strip=True)
+            course_name = cols[1].get_text(strip=True)
+            section = cols[3].get_text(strip=True)
+            day = cols[4].get_text(strip=True)
+            time = cols[5].get_text(strip=True)
+            building = cols[6].get_text(strip=True)
+            room = cols[7].get_text(strip=True)
+            lecturer_text = cols[8].get_text(strip=True)
+
+            # تنظيف اسم المحاضر
+            lecturer = lecturer_text.replace('عرض', '').replace('📧', '').strip()
+
+            # فصل رمز المقرر
+            if "/" in course_code_full:
+                course_code = course_code_full.split("/")[-1]
+            else:
+                course_code = course_code_full
+
+            schedule.append({
+                "course_code": course_code or "غير محدد",
+                "course_name": course_name or "غير محدد",
+                "section": section or "غير محدد",
+                "day": day or "غير محدد",
+                "time": time or "--:-- - --:--",
+                "building": building or "",
+                "room": room or "",
+                "lecturer": lecturer or "غير محدد"
+            })
+            logger.debug(f"Processed meeting {i+1}: {course_name} - {day} - {time}")
+
+        except Exception as e:
+            logger.warning(f"Error processing row {i}: {e}")
+            continue
+
+    logger.info(f"Successfully processed {len(schedule)} meetings")
+    return schedule
+
+
+def parse_balance_rows(html: str) -> List[List[str]]:
+    """صفوف جدول الرصيد (بدون الفواصل)، فقط الصفوف الكاملة"""
+    soup = make_soup(html, "data_table")
+    rows = []
+    for row in BALANCE_ROW.select(soup):
+        cols = [c.get_text(strip=True).replace(',', '') for c in row.find_all("td")]
+        if len(cols) < 7:
+            continue
+        rows.append(cols)
+    return rows
+
+
+def balance_totals(rows: List[List[str]]) -> dict:
+    """مجموع أعمدة الرصيد من صفوف parse_balance_rows"""
+    totals = {"required": 0.0, "paid": 0.0, "grants": 0.0, "balance": 0.0}
+    for cols in rows:
+        totals["required"] += float(cols[1])
+        totals["paid"] += float(cols[2])
+        totals["grants"] += float(cols[4])
+        totals["balance"] += float(cols[5])
+    return totals
+
+
+def _calendar_event(cols, strip_labels=False) -> dict:
+    values = [col.get_text(strip=True) for col in cols[:5]]
+    if strip_labels:
+        values = [value.replace(label, "") for value, label in zip(values, CALENDAR_LABELS)]
+    return dict(zip(("subject", "week", "day", "start", "end"), values))
+
+
+def parse_active_calendar_events(html: str) -> List[dict]:
+    """أحداث التقويم الفعالة (كل الصفوف غير text-not-active)"""
+    soup = make_soup(html, "calendar_rows")
+    events = []
+    for row in soup.find_all("tr", class_=lambda x: x != "text-not-active"):
+        cols = row.find_all("td")
+        if len(cols) < 5:
+            continue
+        events.append(_calendar_event(cols))
+    return events
+
+
+def parse_semester_calendar(html: str, now: datetime = None) -> Optional[dict]:
+    """
+    أحداث الفصل الحالي من صفحة التقويم: {"title", "events"}.
+    ترجع None إذا لم توجد فصول، و events = None إذا لم يوجد جدول للفصل.
+    """
+    soup = make_soup(html)
+
+    semesters = soup.find_all("div", class_="text-warning")
+    if not semesters:
+        return None
+
+    # تحديد الفصل الحالي: أول فصل فيه حدث بدأ قبل التاريخ الحالي
+    current_date = now or datetime.now()
+    current_semester_div = None
+    for semester_div in semesters:
+        table = semester_div.find_next_sibling("table")
+        if not table:
+            continue
+
+        start_date_found = False
+        for row in table.find_all("tr"):
+            cols = row.find_all("td")
+            if len(cols) >= 5:
+                date_text = cols[3].get_text(strip=True)
+                if date_text and date_text != "من :":
+                    try:
+                        if datetime.strptime(date_text, "%d/%m/%Y") <= current_date:
+                            start_date_found = True
+                            break
+                    except ValueError:
+                        continue
+
+        if start_date_found:
+            current_semester_div = semester_div
+            break
+
+    # إذا لم نجد فصلًا مناسبًا، نأخذ آخر فصل
+    if not current_semester_div:
+        current_semester_div = semesters[-1]
+
+    title = current_semester_div.get_text(strip=True)
+    table = current_semester_div.find_next_sibling("table")
+    if not table:
+        return {"title": title, "events": None}
+
+    events = []
+    for row in table.find_all("tr"):
+        # تخطي الصفوف غير النشطة (المنتهية)
+        if "text-not-active" in row.get("class", []):
+            continue
+        cols = row.find_all("td")
+        if len(cols) < 5:
+            continue
+        events.append(_calendar_event(cols, strip_labels=True))
+
+    return {"title": title, "events": events}
+
+
+def delay_applications_open(html: str) -> bool:
+    """هل فترة التأجيل مفتوحة؟ (زر التقدم بطلب تأجيل ظاهر)"""
+    return "التقدم بطلب تأجيل" in html
+
+
+def _parse_number(text) -> int:
+    """تحويل النص إلى رقم"""
+    try:
+        if not text:
+            return 0
+        # إزالة أي أحرف غير رقمية
+        cleaned = ''.join(filter(str.isdigit, str(text)))
+        return int(cleaned) if cleaned else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def parse_study_plan_stats(html: str) -> dict:
+    """إحصائيات الخطة الدراسية (الساعات، عدد الفصول، نسبة الإنجاز)"""
+    stats = {
+        'total_hours_required': 132,
+        'total_hours_completed': 21,
+        'total_hours_transferred': 21,
+        'semesters_count': 1,
+        'plan_completed': False,
+        'completion_percentage': 31.8
+    }
+
+    try:
+        # ✅ البحث المباشر عن القيم باستخدام regex
+        text = make_soup(html).get_text()
+
+        for key, pattern in STUDY_STAT_PATTERNS.items():
+            match = pattern.search(text)
+            if match:
+                stats[key] = int(match.group(1))
+
+        # البحث عن حالة الخطة
+        plan_match = PLAN_COMPLETED_PATTERN.search(text)
+        if plan_match:
+            stats['plan_completed'] = plan_match.group(1).lower() == 'نعم'
+
+        # حساب نسبة الإنجاز
+        if stats['total_hours_required'] > 0:
+            total_done = stats['total_hours_completed'] + stats['total_hours_transferred']
+            stats['completion_percentage'] = round(min(total_done / stats['total_hours_required'] * 100, 100), 2)
+
+            # تحديث حالة الخطة إذا نسبة الإنجاز 100% أو أكثر
+            if stats['completion_percentage'] >= 100:
+                stats['plan_completed'] = True
+
+    except Exception as e:
+        logger.error(f"Error extracting stats: {e}")
+
+    return stats
+
+
+def parse_study_plan_courses(html: str) -> List[dict]:
+    """استخراج المقررات من صفحة الخطة الدراسية بشكل آمن"""
+    courses = []
+    try:
+        # ✅ البحث عن جميع الجداول داخل div.member-card
+        member_cards = make_soup(html, "member_cards").find_all('div', class_='member-card')
+        logger.info(f"Found {len(member_cards)} member cards")
+
+        for card_idx, card in enumerate(member_cards):
+            # استخراج اسم الفئة من العنوان
+            category_header = card.find('h4')
+            if category_header:
+                category = category_header.get_text(strip=True)
+            else:
+                category = f"الفئة {card_idx + 1}"
+
+            # البحث عن الجدول داخل البطاقة
+            table = card.find('table')
+            if not table:
+                continue
+
+            rows = table.find_all('tr')
+            logger.info(f"Card {card_idx + 1} ({category}): Found {len(rows)} rows")
+
+            for row_idx, row in enumerate(rows):
+                cols = row.find_all(['td', 'th'])
+
+                # تجاهل الصفوف التي تحتوي على عدد قليل من الأعمدة أو صفوف العناوين
+                if len(cols) < 5:
+                    continue
+
+                try:
+                    course_code_elem = cols[1].find('a')
+                    course_code = course_code_elem.get_text(strip=True) if course_code_elem else cols[1].get_text(strip=True)
+                    course_name = cols[2].get_text(strip=True)
+
+                    # تجاهل الصفوف التي لا تحتوي على رمز مقرر صالح
+                    if not course_code or '/' not in course_code:
+                        continue
+
+                    # تحديد الحالة بناءً على class أيقونة العمود الأول
+                    status_icon = cols[0].find('i')
+                    status_class = ' '.join(status_icon.get('class', [])) if status_icon else ''
+                    if 'btn-success' in status_class:
+                        status = 'completed'
+                    elif 'btn-danger' in status_class:
+                        status = 'failed'
+                    elif 'btn-default' in status_class:
+                        status = 'not_registered'
+                    else:
+                        status = 'unknown'
+
+                    courses.append({
+                        "course_code": course_code,
+                        "course_name": course_name,
+                        "category": category,
+                        "hours": _parse_number(cols[3].get_text(strip=True)),
+                        "status": status,
+                        "detailed_status": cols[4].get_text(strip=True),
+                        "is_elective": 'اختياري' in category
+                    })
+
+                except Exception as e:
+                    logger.warning(f"Error parsing row {row_idx} in card {card_idx}: {e}")
+                    continue
+
+    except Exception as e:
+        logger.error(f"Error extracting study plan courses: {e}")
+        return []
+
+    logger.info(f"Successfully extracted {len(courses)} courses")
+    return courses
+
+
+def parse_student_branch(html: str) -> str:
+    """اسم فرع الطالب من صفحة معلومات الطالب"""
+    soup = make_soup(html, "form_groups")
+    for group in soup.find_all('div', class_='form-group'):
+        labels = group.find_all('label', class_='control-label')
+        for i, label in enumerate(labels):
+            if 'الفرع:' in label.text:
+                # العنصر التالي بعد التسمية يحتوي على اسم الفرع
+                branch_divs = group.find_all('div', class_='col-sm-4 col-md-4 text-right')
+                if len(branch_divs) > i:
+                    return branch_divs[i].get_text(strip=True)
+    return "غير محدد"
+
+
+def parse_registered_course_names(html: str) -> List[str]:
+    """أسماء المقررات المسجلة من صفحة خدمات المقررات"""
+    soup = make_soup(html, "box_headers")
+    courses = []
+    for header in soup.find_all('div', class_='box-header'):
+        pull_right = header.find('div', class_='pull-right')
+        if not pull_right:
+            continue
+        course_text = pull_right.get_text(strip=True)
+        # فصل الرقم عن اسم المادة (مثال: "2/0101 تعلم كيف تتعلم")
+        if '/' in course_text and ' ' in course_text:
+            course_name = course_text.split(' ', 1)[1].strip()
+            if course_name and course_name not in courses:
+                courses.append(course_name)
+    return courses
+
+
+def parse_ecourse_courses(html: str) -> Optional[List[dict]]:
+    """المقررات المسجلة من الصفحة الرئيسية لمنصة التعليم الإلكتروني (None إذا لم توجد القائمة)"""
+    soup = make_soup(html, "ecourse_courses")
+    courses_section = soup.find('div', {'id': 'frontpage-course-list'})
+    if not courses_section:
+        return None
+
+    courses = []
+    for card in courses_section.find_all('div', {'class': 'card'}):
+        try:
+            title_link = card.find('h4', class_='card-title').find('a')
+            img = card.find('img')
+            category = card.find('div', {'class': 'coursecat'})
+            courses.append({
+                'id': card.get('data-courseid', ''),
+                'name': title_link.text.strip() if title_link else "غير معروف",
+                'url': title_link.get('href', '') if title_link else "",
+                'image': img.get('src', '') if img else "",
+                'category': category.text.strip() if category else "غير محدد"
+            })
+        except Exception:
+            continue
+    return courses
+
+
+def _meeting_semester(parent_text: str) -> str:
+    for keywords, semester in MEETING_SEMESTERS:
+        if any(keyword in parent_text for keyword in keywords):
+            return semester
+    return "غير محدد"
+
+
+def parse_virtual_meetings(html: str) -> List[dict]:
+    """روابط اللقاءات الافتراضية (playback / vc) في صفحة مقرر"""
+    soup = make_soup(html)
+    meetings = []
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '')
+        if not any(keyword in href for keyword in MEETING_LINK_KEYWORDS):
+            continue
+
+        # البحث عن الفصل الدراسي من النص المحيط فقط إذا كان موجوداً
+        parent = link.find_parent()
+        meetings.append({
+            'semester': _meeting_semester(parent.get_text()) if parent else "غير محدد",
+            'title': link.get_text(strip=True),
+            'url': href,
+            'type': 'virtual_meeting'
+        })
+    return meetings
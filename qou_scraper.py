@@ -1,25 +1,27 @@
 import requests
-from bs4 import BeautifulSoup
 import os
+import hashlib
+import json
 from typing import Optional, List
 from datetime import datetime, timedelta  
 import logging
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-import arabic_reshaper
-from bidi.algorithm import get_display
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import database 
 from typing import Dict, Any
 from database import save_student_stats, save_student_courses
+from portal_sessions import portal_sessions
+import qou_parsers
+from page_cache import page_store
+from portal_throttle import INTERACTIVE
+import portal_transport
+from portal_transport import new_session
+from ttl_cache import TTLCache
+import exam_cache
+import pdf_worker
+from ecourse_client import EcourseClient
 
-
-font_path = os.path.join(os.path.dirname(__file__), 'fonts', 'arial.ttf')
-pdfmetrics.registerFont(TTFont('Arial', font_path))
 STUDY_PLAN_URL = "https://portal.qou.edu/student/showMajorSheet.do" 
 LOGIN_URL = 'https://portal.qou.edu/login.do'
 INBOX_URL = 'https://portal.qou.edu/student/inbox.do'
@@ -31,6 +33,92 @@ cel = 'https://portal.qou.edu/calendarProposed.do'
 DELAY_APP_URL = "https://portal.qou.edu/student/studDelayAppList.do"
 
 logger = logging.getLogger(__name__)
+
+# التقويم صفحة عامة واحدة لكل المستخدمين وتتغير نادراً:
+# تُحدَّث في الخلفية كل ساعة، وتبقى صالحة 6 ساعات إذا تعطلت البوابة
+CALENDAR_TTL = int(os.getenv("CALENDAR_TTL", str(6 * 60 * 60)))
+CALENDAR_REFRESH = int(os.getenv("CALENDAR_REFRESH", str(60 * 60)))
+calendar_cache = TTLCache(
+    ttl=CALENDAR_TTL,
+    max_entries=1,
+    refresh_after=CALENDAR_REFRESH,
+    stale_on_error=True,
+    name="calendar",
+)
+
+
+def _load_calendar() -> dict:
+    """جلب صفحة التقويم وتحليلها (الأحداث الفعالة + أحداث الفصل الحالي)"""
+    res = portal_transport.request(None, "GET", cel)
+    res.raise_for_status()
+    res.encoding = "utf-8"
+    return {
+        "active": qou_parsers.parse_active_calendar_events(res.text),
+        "semester": qou_parsers.parse_semester_calendar(res.text),
+    }
+
+
+def get_calendar() -> dict:
+    """التقويم المحلل من الذاكرة (طلب واحد للبوابة لكل فترة تحديث)"""
+    return calendar_cache.get_or_load("calendar", _load_calendar)
+
+
+# صفوف الرصيد لكل طالب لفترة قصيرة (زر الرصيد ثم زر الإجمالي = طلب واحد للبوابة)
+BALANCE_TTL = int(os.getenv("BALANCE_TTL", "300"))
+balance_cache = TTLCache(ttl=BALANCE_TTL, max_entries=5000, name="balance")
+# ملفات PDF الجاهزة حسب بصمة المحتوى
+balance_pdf_cache = TTLCache(ttl=24 * 60 * 60, max_entries=1000, name="balance_pdf")
+
+
+def _balance_digest(rows) -> str:
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def balance_pdf(rows: List[List[str]]) -> Optional[BytesIO]:
+    """ملف PDF للرصيد؛ نفس المحتوى لا يُرسم مرتين (الرسم في عملية منفصلة)"""
+    if not rows:
+        return None
+    return BytesIO(balance_pdf_cache.get_or_load(
+        _balance_digest(rows),
+        lambda: pdf_worker.run(pdf_worker.render_balance_pdf, rows),
+    ))
+
+
+def cached_balance_pdf(rows: List[List[str]]) -> Optional[BytesIO]:
+    """ملف PDF جاهز لنفس المحتوى إن وجد، بدون رسم"""
+    pdf_bytes = balance_pdf_cache.get(_balance_digest(rows)) if rows else None
+    return BytesIO(pdf_bytes) if pdf_bytes is not None else None
+
+
+def balance_pdf_async(rows: List[List[str]], on_done, on_error):
+    """
+    رسم ملف الرصيد في الخلفية بدون حجز خيط البوت؛ on_done(BytesIO) أو on_error(خطأ).
+    يرفع pdf_worker.PdfQueueFull فوراً إذا كان طابور الرسم ممتلئاً.
+    """
+    digest = _balance_digest(rows)
+
+    def done(pdf_bytes):
+        balance_pdf_cache.put(digest, pdf_bytes)
+        on_done(BytesIO(pdf_bytes))
+
+    pdf_worker.run_async(pdf_worker.render_balance_pdf, rows, on_done=done, on_error=on_error)
+
+
+def format_balance_totals(rows: List[List[str]]) -> str:
+    if not rows:
+        return "❌ لم يتم العثور على بيانات الرصيد"
+
+    totals = qou_parsers.balance_totals(rows)
+
+    text = "📌 الإجمالي الكلي للرصيد:\n\n"
+    text += f"💰 المطلوب: {totals['required']}\n"
+    text += f"✅ المدفوع: {totals['paid']}\n"
+    text += f"🎓 المنح: {totals['grants']}\n"
+    text += f"📊 رصيد الفصل: {totals['balance']}\n"
+
+    return text
+
+
 EXAM_TYPE_MAP = {
     "MT&IM": "📝 النصفي",
     "FT&IF": "🏁 النهائي النظري",
@@ -39,11 +127,20 @@ EXAM_TYPE_MAP = {
 }
 
 class QOUScraper:
-    def __init__(self, student_id: str, password: str):
-        self.session = requests.Session()
+    def __init__(self, student_id: str, password: str, priority: int = INTERACTIVE):
+        self.session = new_session()
         self.student_id = student_id
         self.password = password
         self.is_logged_in = False 
+        # أولوية الطلبات في المحدد المشترك (INTERACTIVE للبوت، BACKGROUND للجدولة)
+        self.priority = priority
+        # الصفحات التي جُلبت وهل تغيرت منذ آخر مرة (نوع الصفحة -> True/False)
+        self.page_changes = {}
+        # عند تعيينها قائمة تُؤجل حفظ البصمات الجديدة حتى تؤكدها دورة الجدولة
+        self.pending_pages = None
+        # يمنع عدة خيوط من إعادة تسجيل الدخول معاً عند انتهاء الجلسة
+        self._login_lock = threading.Lock()
+        self._login_count = 0
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                           "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -53,11 +150,19 @@ class QOUScraper:
             "Connection": "keep-alive"
         }
 
-    def login(self) -> bool:
+    def login(self, force: bool = False) -> bool:
         """تسجيل الدخول إلى بوابة الجامعة والتحقق من نجاح العملية"""
+        # إعادة استخدام جلسة مسجلة الدخول مسبقاً لنفس الطالب إن وجدت
+        if not force:
+            cached_session = portal_sessions.get(self.student_id, self.password)
+            if cached_session is not None:
+                self.session = cached_session
+                self.is_logged_in = True
+                return True
+
         try:
             # زيارة الصفحة الرئيسية أولاً لتهيئة الجلسة
-            self.session.get(LOGIN_URL, headers=self.headers, timeout=30)
+            self._send("GET", LOGIN_URL, headers=self.headers, timeout=30)
     
             # بيانات تسجيل الدخول
             params = {
@@ -67,174 +172,100 @@ class QOUScraper:
             }
     
             # إرسال POST لتسجيل الدخول
-            resp = self.session.post(LOGIN_URL, data=params, headers=self.headers, timeout=30, allow_redirects=True)
+            resp = self._send("POST", LOGIN_URL, data=params, headers=self.headers, timeout=30, allow_redirects=True)
             resp.raise_for_status()
 
     
             # تحقق من نجاح تسجيل الدخول
             success = "logout" in resp.text.lower() or "student" in resp.url
             self.is_logged_in = success  # <-- تخزين حالة تسجيل الدخول
+            if success:
+                self._login_count += 1
+                portal_sessions.put(self.student_id, self.password, self.session)
+            else:
+                portal_sessions.invalidate(self.student_id)
             return success
     
         except requests.exceptions.RequestException as e:
             logger.error(f"Login request failed for {self.student_id}: {e}")
             self.is_logged_in = False
             return False
+
+    @staticmethod
+    def _is_login_page(resp) -> bool:
+        """التحقق إذا أعادت البوابة صفحة تسجيل الدخول (انتهاء الجلسة)"""
+        return resp.url.split("?")[0].endswith("/login.do") or 'name="logBtn"' in resp.text
+
+    def _send(self, method: str, url: str, **kwargs):
+        """إرسال طلب واحد عبر طبقة النقل الموحدة للبوابة"""
+        return portal_transport.request(self.session, method, url, self.priority, **kwargs)
+
+    def _request(self, method: str, url: str, **kwargs):
+        """إرسال طلب عبر الجلسة مع إعادة تسجيل الدخول تلقائياً إذا انتهت الجلسة"""
+        login_count = self._login_count
+        resp = self._send(method, url, **kwargs)
+        if self.is_logged_in and self._is_login_page(resp):
+            with self._login_lock:
+                # ربما أعاد خيط آخر تسجيل الدخول أثناء هذا الطلب
+                if self._login_count == login_count:
+                    logger.info(f"انتهت جلسة البوابة للطالب {self.student_id}، إعادة تسجيل الدخول")
+                    portal_sessions.invalidate(self.student_id)
+                    self.login(force=True)
+            if self.is_logged_in:
+                resp = self._send(method, url, **kwargs)
+        else:
+            portal_sessions.touch(self.student_id)
+        return resp
+
+    def _get(self, url: str, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def _post(self, url: str, **kwargs):
+        return self._request("POST", url, **kwargs)
     
 
     def fetch_latest_message(self) -> Optional[dict]:
-        resp = self.session.get(INBOX_URL)
+        resp = self._get(INBOX_URL)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        row = soup.select_one("tbody tr")
-        if not row:
-            return None
-
-        link_tag = row.select_one("td[col_4] a[href*='msgId=']")
-        if not link_tag:
-            return None
 
-        msg_id = link_tag['href'].split('msgId=')[-1]
-        full_link = requests.compat.urljoin(INBOX_URL, link_tag['href'])
-        subject = link_tag.get_text(strip=True)
+        # صندوق الوارد كما هو: لا حاجة لتحليله ولا لجلب نص الرسالة مرة أخرى
+        digest, unchanged, cached = page_store.lookup(self.student_id, "inbox", resp.text, self.priority)
+        self.page_changes["inbox"] = not unchanged
+        if unchanged:
+            return cached
 
-        sender = row.select_one("td[col_7]")
-        sender_text = sender.get_text(strip=True) if sender else ''
+        latest = qou_parsers.parse_inbox_latest(resp.text, INBOX_URL)
+        if latest:
+            resp_msg = self._get(latest.pop('link'))
+            resp_msg.raise_for_status()
+            latest['body'] = qou_parsers.parse_message_body(resp_msg.text)
 
-        date = row.select_one("td[col_5]")
-        date_text = date.get_text(strip=True) if date else ''
+        page_store.store(self.student_id, "inbox", digest, latest, self.priority, self.pending_pages)
+        return latest
 
-        resp_msg = self.session.get(full_link)
-        resp_msg.raise_for_status()
-        soup_msg = BeautifulSoup(resp_msg.text, 'html.parser')
-
-        body = soup_msg.find('div', class_='message-body')
-        body_text = body.get_text(strip=True) if body else ''
-
-        return {
-            'msg_id': msg_id,
-            'subject': subject,
-            'sender': sender_text,
-            'date': date_text,
-            'body': body_text
-        }
+    def _parse_page(self, kind: str, html: str, parser):
+        """تحليل الصفحة فقط إذا تغيرت منذ آخر جلب لنفس الطالب"""
+        return page_store.parse(self.student_id, kind, html, parser, self.page_changes, self.priority,
+                                self.pending_pages)
 
     def fetch_term_summary_courses(self) -> List[dict]:
         try:
-            resp = self.session.get(TERM_SUMMARY_URL)
+            resp = self._get(TERM_SUMMARY_URL)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-    
-            courses = []
-            
-            # ✅ البحث عن المقررات من الـ HTML الحالي (صفحة الجدول الزمني)
-            course_boxes = soup.find_all('div', class_='box box-warning')
-            
-            for box in course_boxes:
-                try:
-                    # استخراج عنوان المقرر
-                    header = box.find('div', class_='box-header')
-                    if not header:
-                        continue
-                        
-                    title_div = header.find('div', class_='pull-right text-warning')
-                    if not title_div:
-                        continue
-                        
-                    course_title = title_div.get_text(strip=True)
-                    # مثال: "1/0111 اللغة العربية (1)" → نستخرج "1/0111" و"اللغة العربية (1)"
-                    parts = course_title.split(' ', 1)
-                    course_code = parts[0] if len(parts) > 0 else ""
-                    course_name = parts[1] if len(parts) > 1 else ""
-    
-                    # استخراج الساعات المعتمدة من قسم اللقاءات
-                    credit_hours = "3"  # قيمة افتراضية
-                    schedule_section = box.find('div', class_='box-body box-body-dark')
-                    if schedule_section:
-                        credit_label = schedule_section.find('label', string='س.م:')
-                        if credit_label:
-                            credit_div = credit_label.find_next('div')
-                            if credit_div:
-                                credit_hours = credit_div.get_text(strip=True)
-    
-                    course = {
-                        'course_code': course_code,
-                        'course_name': course_name,
-                        'credit_hours': credit_hours,
-                        'status': "مسجل",  # جميع المقررات في الجدول تكون مسجلة
-                        'midterm_mark': "-",  # لا توجد علامات في صفحة الجدول
-                        'final_mark': "-",   # لا توجد علامات في صفحة الجدول
-                        'final_mark_date': "-"
-                    }
-                    courses.append(course)
-                    
-                except Exception as e:
-                    logger.info(f"خطأ في معالجة مقرر: {e}")
-                    continue
-    
-            return courses
-    
+            return self._parse_page("term_courses", resp.text, qou_parsers.parse_term_summary_courses)
         except Exception as e:
             logger.info(f"تم تخطي خطأ في جلب المقررات: {e}")
             return []
 
     def fetch_discussion_sessions(self) -> List[dict]:
-            resp = self.session.get(WEEKLY_MEETINGS_URL)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-    
-            sessions = []
-            table = soup.find("table", {"id": "dataTable"})
-            if not table:
-                return sessions
-    
-            rows = table.find("tbody").find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
-                if len(cols) < 5:
-                    continue
-                session = {
-                    "course_code": cols[0].get_text(strip=True),
-                    "course_name": cols[1].get_text(strip=True),
-                    "section": cols[2].get_text(strip=True),
-                    "date": cols[3].get_text(strip=True),  # 17/08/2025
-                    "time": cols[4].get_text(strip=True)   # 11:00 - 12:00
-                }
-                sessions.append(session)
-            return sessions
+        resp = self._get(WEEKLY_MEETINGS_URL)
+        resp.raise_for_status()
+        return self._parse_page("discussions", resp.text, qou_parsers.parse_discussion_sessions)
 
     def fetch_term_summary_stats(self) -> dict:
-        resp = self.session.get(TERM_SUMMARY_URL)
+        resp = self._get(TERM_SUMMARY_URL)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        stats_table = soup.find('table', id='dataTable3')
-        if not stats_table:
-            return {}
-
-        rows = stats_table.find('tbody').find_all('tr')
-        if len(rows) < 2:
-            return {}
-
-        def parse_row(row):
-            cols = row.find_all('td')
-            return {
-                'type': cols[0].get_text(strip=True),
-                'registered_hours': cols[1].get_text(strip=True),
-                'passed_hours': cols[2].get_text(strip=True),
-                'counted_hours': cols[3].get_text(strip=True),
-                'failed_hours': cols[4].get_text(strip=True),
-                'withdrawn_hours': cols[5].get_text(strip=True),
-                'points': cols[6].get_text(strip=True),
-                'gpa': cols[7].get_text(strip=True),
-                'honor_list': cols[8].get_text(strip=True)
-            }
-
-        return {
-            'term': parse_row(rows[0]),
-            'cumulative': parse_row(rows[1])
-        }
+        return self._parse_page("term_stats", resp.text, qou_parsers.parse_term_summary_stats)
     def convert_arabic_numbers(text):
         """تحويل الأرقام العربية إلى إنجليزية"""
         arabic_to_english = {
@@ -270,79 +301,56 @@ class QOUScraper:
             return None
     # ------------------- جلب آخر فصلين -------------------
     def get_last_two_terms(self):
-        resp = self.session.get(EXAMS_SCHEDULE_URL)
+        resp = self._get(EXAMS_SCHEDULE_URL)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        select_term = soup.find("select", {"name": "termNo"})
-        if not select_term:
-            return []
-        options = select_term.find_all("option")
-        # عادةً يكون أول خيار هو الفصل الحالي، الثاني السابق
-        last_two = options[:2]
-        return [{'value': opt['value'], 'label': opt.get_text(strip=True)} for opt in last_two]
+        terms = self._parse_page("exam_terms", resp.text, qou_parsers.parse_exam_terms)
+        exam_cache.note_terms(self.student_id, terms)
+        return terms
 
     # ------------------- جلب جدول الامتحانات من البوابة -------------------
-    def fetch_exam_schedule(self, term_no, exam_type) -> List[dict]:
+    def fetch_exam_schedule(self, term_no, exam_type, use_cache: bool = True) -> List[dict]:
+        if use_cache:
+            cached = exam_cache.get_exams(self.student_id, term_no, exam_type)
+            if cached is not None:
+                return [dict(exam) for exam in cached]
+
         payload = {
             "termNo": term_no,
             "examType": exam_type
         }
 
-        resp = self.session.post(EXAMS_SCHEDULE_URL, data=payload)
+        resp = self._post(EXAMS_SCHEDULE_URL, data=payload)
         resp.raise_for_status()
+        exams = self._parse_page(f"exams:{term_no}:{exam_type}", resp.text, qou_parsers.parse_exam_schedule)
+        exam_cache.store_exams(self.student_id, term_no, exam_type, exams)
+        return exams
 
-        soup = BeautifulSoup(resp.text, "html.parser")
-        table = soup.find("table", id="dataTable")
-        if not table:
+    def fetch_all_exams(self, use_cache: bool = True) -> list:
+        """جلب امتحانات آخر فصلين لكل الأنواع بالتوازي: قائمة (نوع الامتحان، الامتحانات)"""
+        terms = self.get_last_two_terms()
+        if not terms:
+            logger.warning(f"[{self.student_id}] لا توجد فصول دراسية")
             return []
 
-        exams = []
-        rows = table.find("tbody").find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            if len(cols) < 11:
-                continue
-
-            exam = {
-                "exam_kind": cols[0].get_text(strip=True),
-                "course_code": cols[1].get_text(strip=True),
-                "course_name": cols[2].get_text(strip=True),
-                "lecturer": cols[3].get_text(strip=True),
-                "section": cols[4].get_text(strip=True),
-                "day": cols[5].get_text(strip=True),
-                "date": cols[6].get_text(strip=True),
-                "session": cols[7].get_text(strip=True),
-                "from_time": cols[8].get_text(strip=True),
-                "to_time": cols[9].get_text(strip=True),
-                "note": cols[10].get_text(strip=True)
-            }
-            exams.append(exam)
+        jobs = [(term["value"], exam_code) for term in terms for exam_code in EXAM_TYPE_MAP]
 
-        return exams
-        
-    def fetch_gpa(self):
-        stats = self.fetch_term_summary_stats()
-        if not stats:
-            return None
-        
-        # تنظيف البيانات
-        def clean_gpa_value(gpa):
-            if not gpa or gpa in ['غير متوفر', 'N/A', '']:
-                return "غير متوفر"
+        def fetch(job):
+            term_no, exam_code = job
             try:
-                # تحويل إلى رقم للتأكد من صحته
-                float(gpa)
-                return gpa
-            except (ValueError, TypeError):
-                return "غير متوفر"
-        
-        return {
-            "term_gpa": clean_gpa_value(stats.get('term', {}).get('gpa')),
-            "cumulative_gpa": clean_gpa_value(stats.get('cumulative', {}).get('gpa'))
-        }
+                return exam_code, self.fetch_exam_schedule(term_no, exam_code, use_cache)
+            except Exception as e:
+                logger.error(f"[{self.student_id}] خطأ أثناء جلب الامتحانات للفصل {term_no} ونوع {exam_code}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, exam_cache.EXAM_FETCH_CONCURRENCY)) as pool:
+            return [result for result in pool.map(fetch, jobs) if result is not None]
+
+    def fetch_gpa(self):
+        return qou_parsers.gpa_from_stats(self.fetch_term_summary_stats())
+
     def fetch_lectures_schedule(self) -> List[dict]:
         try:
-            resp = self.session.get(WEEKLY_MEETINGS_URL, timeout=10)
+            resp = self._get(WEEKLY_MEETINGS_URL, timeout=10)
             resp.raise_for_status()
             
         except requests.exceptions.Timeout:
@@ -356,209 +364,46 @@ class QOUScraper:
             return []
     
         try:
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            schedule = []
-            
-            table = soup.find("table", {"class": "table table-hover table-condensed table-striped table-curved"})
-            
-            if not table:
-                logger.warning("Table not found")
-                return schedule
-    
-            # البحث عن tbody أولاً
-            tbody = table.find("tbody")
-            if not tbody:
-                logger.warning("tbody not found")
-                return schedule
-    
-            # البحث عن جميع العناصر tr داخل tbody - بدون أي فلترة أولية
-            rows = tbody.find_all("tr")
-            logger.info(f"Found {len(rows)} raw tr elements")
-    
-            if not rows:
-                return schedule
-    
-            for i, row in enumerate(rows):
-                try:
-                    # البحث عن خلايا td داخل الصف - حتى لو كان هناك input
-                    cols = row.find_all("td")
-                    if len(cols) < 9:  # يجب أن يكون هناك على الأقل 9 أعمدة
-                        logger.debug(f"Skipping row {i} - only {len(cols)} columns")
-                        continue
-                    
-                    # استخراج البيانات من الأعمدة
-                    course_code_full = cols[0].get_text(strip=True)
-                    course_name = cols[1].get_text(strip=True)
-                    section = cols[3].get_text(strip=True)
-                    day = cols[4].get_text(strip=True)
-                    time = cols[5].get_text(strip=True)
-                    building = cols[6].get_text(strip=True)
-                    room = cols[7].get_text(strip=True)
-                    lecturer_text = cols[8].get_text(strip=True)
-    
-                    # تنظيف اسم المحاضر
-                    lecturer = lecturer_text.replace('عرض', '').replace('📧', '').strip()
-                    
-                    # فصل رمز المقرر
-                    if "/" in course_code_full:
-                        course_code = course_code_full.split("/")[-1]
-                    else:
-                        course_code = course_code_full
-    
-                    meeting = {
-                        "course_code": course_code or "غير محدد",
-                        "course_name": course_name or "غير محدد",
-                        "section": section or "غير محدد",
-                        "day": day or "غير محدد",
-                        "time": time or "--:-- - --:--",
-                        "building": building or "",
-                        "room": room or "",
-                        "lecturer": lecturer or "غير محدد"
-                    }
-                    
-                    schedule.append(meeting)
-                    logger.debug(f"Processed meeting {i+1}: {course_name} - {day} - {time}")
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing row {i}: {e}")
-                    continue
-    
-            logger.info(f"Successfully processed {len(schedule)} meetings")
-            return schedule
-            
+            return self._parse_page("lectures", resp.text, qou_parsers.parse_lectures_schedule)
         except Exception as e:
             logger.error(f"Error parsing schedule HTML: {e}")
             return []
-    def fetch_balance_table_pdf(self) -> BytesIO:
-        resp = self.session.get(BALANCE_URL)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        rows = soup.select("table#dataTable tbody tr")
-        if not rows:
-            return None
 
-        # الأعمدة والبيانات
-        columns = ["الفصل", " المطلوب", " المدفوع", " المنح", "المبلغ المتبقي"]
-        data = [columns]
-
-        for row in rows:
-            cols = [c.get_text(strip=True).replace(',', '') for c in row.find_all("td")]
-            if len(cols) < 7:
-                continue
-            data.append([cols[0], cols[1], cols[2], cols[4], cols[5]])
+    def _load_balance_rows(self) -> List[List[str]]:
+        resp = self._get(BALANCE_URL)
+        resp.raise_for_status()
+        return qou_parsers.parse_balance_rows(resp.text)
 
-        if len(data) == 1:
-            return None
+    def fetch_balance_rows(self, use_cache: bool = True) -> List[List[str]]:
+        """صفوف الرصيد المحللة (مشتركة بين ملف PDF والإجمالي)"""
+        if not use_cache:
+            balance_cache.invalidate(self.student_id)
+        return balance_cache.get_or_load(self.student_id, self._load_balance_rows)
 
-        # معالجة النص العربي لكل خلية في الجدول
-        for i in range(1, len(data)):
-            for j in range(len(data[i])):
-                data[i][j] = get_display(arabic_reshaper.reshape(data[i][j]))
-
-        # معالجة عناوين الأعمدة
-        data[0] = [get_display(arabic_reshaper.reshape(col)) for col in data[0]]
-
-        output = BytesIO()
-        pdf = SimpleDocTemplate(output, pagesize=A4)
-        elements = []
-
-        style_sheet = getSampleStyleSheet()
-        arabic_style = style_sheet['Normal']
-        arabic_style.fontName = 'Arial'
-        arabic_style.fontSize = 12
-
-        # عنوان الصفحة
-        title_text = get_display(arabic_reshaper.reshape("رصيد الطالب"))
-        elements.append(Paragraph(title_text, arabic_style))
-        elements.append(Spacer(1, 12))
-
-        # إنشاء الجدول
-        table = Table(data, repeatRows=1, hAlign='CENTER')
-        style = TableStyle([
-            ('FONTNAME', (0,0), (-1,-1), 'Arial'),
-            ('BACKGROUND', (0,0), (-1,0), colors.lightblue),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-            ('BACKGROUND', (0,1), (-1,-1), colors.whitesmoke),
-        ])
-        table.setStyle(style)
-
-        # تلوين الصفوف بالتناوب
-        for i in range(1, len(data)):
-            if i % 2 == 0:
-                table.setStyle(TableStyle([('BACKGROUND', (0,i), (-1,i), colors.lightgrey)]))
-
-        elements.append(table)
-        pdf.build(elements)
-        output.seek(0)
-        return output
+    def fetch_balance_table_pdf(self) -> BytesIO:
+        return balance_pdf(self.fetch_balance_rows())
 
     def fetch_balance_totals(self) -> str:
         """
         يحسب الإجمالي لكل الأعمدة ويعرضه بشكل مرتب على Telegram
         """
-        resp = self.session.get(BALANCE_URL)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        rows = soup.select("table#dataTable tbody tr")
-        if not rows:
-            return "❌ لم يتم العثور على بيانات الرصيد"
-
-        total_required = total_paid = total_grants = total_balance = 0.0
-
-        for row in rows:
-            cols = [c.get_text(strip=True).replace(',', '') for c in row.find_all("td")]
-            if len(cols) < 7:
-                continue
-            total_required += float(cols[1])
-            total_paid     += float(cols[2])
-            total_grants   += float(cols[4])
-            total_balance  += float(cols[5])
-
-        text = "📌 الإجمالي الكلي للرصيد:\n\n"
-        text += f"💰 المطلوب: {total_required}\n"
-        text += f"✅ المدفوع: {total_paid}\n"
-        text += f"🎓 المنح: {total_grants}\n"
-        text += f"📊 رصيد الفصل: {total_balance}\n"
-
-        return text
+        return format_balance_totals(self.fetch_balance_rows())
 
 
     @staticmethod
     def get_active_calendar():
-        res = requests.get(cel)
-        res.encoding = "utf-8"
-        soup = BeautifulSoup(res.text, "html.parser")
-    
         # كل الصفوف اللي مش text-not-active
-        active_rows = soup.find_all("tr", class_=lambda x: x != "text-not-active")
-    
-        if not active_rows:  # إذا ما في أي صف
-            return "ما لقيت أحداث حالياً 🤷‍♂️"
-    
-        events = []
-        for row in active_rows:
-            cols = row.find_all("td")
-            if len(cols) < 5:
-                continue
-            subject = cols[0].get_text(strip=True)
-            week = cols[1].get_text(strip=True)
-            day = cols[2].get_text(strip=True)
-            start = cols[3].get_text(strip=True)
-            end = cols[4].get_text(strip=True)
-    
-            event_text = f"""🗓 {subject}
-    📅 {day} {week}
-    ⏳ {start} → {end}"""
-            events.append(event_text)
-    
+        events = get_calendar()["active"]
         if not events:
             return "ما لقيت أحداث حالياً 🤷‍♂️"
-    
-        return events[0]  # أول حدث فعال
+
+        return QOUScraper.format_calendar_event(events[0])  # أول حدث فعال
+
+    @staticmethod
+    def format_calendar_event(event: dict) -> str:
+        return f"""🗓 {event['subject']}
+    📅 {event['day']} {event['week']}
+    ⏳ {event['start']} → {event['end']}"""
         
     @staticmethod
     def get_current_week_type(target_date=None):
@@ -604,9 +449,9 @@ class QOUScraper:
         """Get delay application status"""
         try:
             # جلب الصفحة مباشرة (الsession ستعيد التسجيل إذا needed)
-            resp = self.session.get("https://portal.qou.edu/student/studDelayAppList.do")
-            
-            if "التقدم بطلب تأجيل" in resp.text:
+            resp = self._get(DELAY_APP_URL)
+
+            if qou_parsers.delay_applications_open(resp.text):
                 return "📅 فترة التأجيل: مفتوحة 🟢"
             else:
                 return "📅 فترة التأجيل: مغلقة 🔴"
@@ -618,85 +463,18 @@ class QOUScraper:
     @staticmethod
     def get_full_current_semester_calendar():
         try:
-            res = requests.get(cel, timeout=10)
-            res.raise_for_status()
-            res.encoding = "utf-8"
-            soup = BeautifulSoup(res.text, "html.parser")
-        
-            # البحث عن جميع الفصول
-            semesters = soup.find_all("div", class_="text-warning")
-            if not semesters:
+            semester = get_calendar()["semester"]
+            if semester is None:
                 return "لم أتمكن من العثور على أي فصول."
-        
-            # تحديد الفصل الحالي بناءً على التاريخ الحالي (تحسين)
-            current_date = datetime.now()
-            current_semester_div = None
-            
-            for semester_div in semesters:
-                # محاولة استخراج تاريخ بداية الفصل من الجدول التالي
-                table = semester_div.find_next_sibling("table")
-                if not table:
-                    continue
-                    
-                # البحث عن تاريخ بداية الفصل في الجدول
-                start_date_found = False
-                for row in table.find_all("tr"):
-                    cols = row.find_all("td")
-                    if len(cols) >= 5:
-                        date_text = cols[3].get_text(strip=True)
-                        if date_text and date_text != "من :":
-                            try:
-                                event_date = datetime.strptime(date_text, "%d/%m/%Y")
-                                if event_date <= current_date:
-                                    start_date_found = True
-                                    break
-                            except ValueError:
-                                continue
-                
-                if start_date_found:
-                    current_semester_div = semester_div
-                    break
-            
-            # إذا لم نجد فصلًا مناسبًا، نأخذ آخر فصل
-            if not current_semester_div:
-                current_semester_div = semesters[-1]
-        
-            # الحصول على الجدول التالي للفصل
-            table = current_semester_div.find_next_sibling("table")
-            if not table:
+            if semester["events"] is None:
                 return "لم أتمكن من العثور على جدول الأحداث للفصل الحالي."
-        
-            # استخراج الأحداث مع تصفية الصفوف غير النشطة
-            events = []
-            rows = table.find_all("tr")
-            
-            for row in rows:
-                # تخطي الصفوف غير النشطة (المنتهية)
-                if "text-not-active" in row.get("class", []):
-                    continue
-                    
-                cols = row.find_all("td")
-                if len(cols) < 5:
-                    continue
-                    
-                subject = cols[0].get_text(strip=True).replace("الموضوع : ", "")
-                week = cols[1].get_text(strip=True).replace("الاسبوع : ", "")
-                day = cols[2].get_text(strip=True).replace("اليوم : ", "")
-                start = cols[3].get_text(strip=True).replace("من : ", "")
-                end = cols[4].get_text(strip=True).replace("الى : ", "")
-    
-                event_text = f"""🗓 {subject}
-    📅 {day} {week}
-    ⏳ {start} → {end}"""
-                events.append(event_text)
-        
-            if not events:
+            if not semester["events"]:
                 return "لا يوجد أحداث للفصل الحالي 🤷‍♂️"
-        
+
             # إضافة عنوان الفصل
-            semester_title = current_semester_div.get_text(strip=True)
-            result = f"📚 {semester_title}\n\n" + "\n\n".join(events)
-            
+            events = [QOUScraper.format_calendar_event(event) for event in semester["events"]]
+            result = f"📚 {semester['title']}\n\n" + "\n\n".join(events)
+
             return result
             
         except requests.RequestException:
@@ -761,7 +539,7 @@ class QOUScraper:
             headers = self.headers.copy()
             headers['Referer'] = "https://portal.qou.edu/portalLogin.do"
     
-            response = self.session.get(STUDY_PLAN_URL, headers=headers, timeout=30)
+            response = self._get(STUDY_PLAN_URL, headers=headers, timeout=30)
             response.raise_for_status()
     
             if any(x in response.url for x in ["errorPage", "jsessionid"]) or "No data" in response.text:
@@ -774,15 +552,8 @@ class QOUScraper:
                     'error': 'Redirected to error page or no data'
                 }
         
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # ✅ DEBUG: لرؤية هيكل الصفحة
-            if not soup.find_all('table'):
-                debug_info = self.debug_page_structure(soup)
-                logger.info(f"Page structure for {self.student_id}:\n{debug_info}")
-            
-            stats = self._extract_study_stats(soup)
-            courses = self._extract_courses(soup)
+            stats = qou_parsers.parse_study_plan_stats(response.text)
+            courses = qou_parsers.parse_study_plan_courses(response.text)
     
             return {
                 'stats': stats,
@@ -810,272 +581,6 @@ class QOUScraper:
                 'error': str(e)
             }
     
-        
-    def _extract_study_stats(self, soup) -> Dict[str, Any]:
-        stats = {
-            'total_hours_required': 132,
-            'total_hours_completed': 21,
-            'total_hours_transferred': 21,
-            'semesters_count': 1,
-            'plan_completed': False,
-            'completion_percentage': 31.8
-        }
-    
-        try:
-            # ✅ البحث المباشر عن القيم باستخدام regex
-            text = soup.get_text()
-            
-            import re
-            
-            # البحث عن الساعات المطلوبة
-            required_match = re.search(r'عدد الساعات المطلوبة[^\d]*(\d+)', text)
-            if required_match:
-                stats['total_hours_required'] = int(required_match.group(1))
-            
-            # البحث عن الساعات المجتازة
-            completed_match = re.search(r'عدد الساعات المجتازة[^\d]*(\d+)', text)
-            if completed_match:
-                stats['total_hours_completed'] = int(completed_match.group(1))
-            
-            # البحث عن الساعات المحتسبة
-            transferred_match = re.search(r'عدد الساعات المحتسبة[^\d]*(\d+)', text)
-            if transferred_match:
-                stats['total_hours_transferred'] = int(transferred_match.group(1))
-            
-            # البحث عن عدد الفصول
-            semesters_match = re.search(r'عدد الفصول[^\d]*(\d+)', text)
-            if semesters_match:
-                stats['semesters_count'] = int(semesters_match.group(1))
-            
-            # البحث عن حالة الخطة
-            plan_match = re.search(r'انهى الخطة[^\d]*(نعم|لا)', text)
-            if plan_match:
-                stats['plan_completed'] = plan_match.group(1).lower() == 'نعم'
-            
-            # حساب نسبة الإنجاز
-            if stats['total_hours_required'] > 0:
-                total_done = stats['total_hours_completed'] + stats['total_hours_transferred']
-                stats['completion_percentage'] = round(min(total_done / stats['total_hours_required'] * 100, 100), 2)
-            
-                # تحديث حالة الخطة إذا نسبة الإنجاز 100% أو أكثر
-                if stats['completion_percentage'] >= 100:
-                    stats['plan_completed'] = True
-    
-        except Exception as e:
-            logger.error(f"Error extracting stats: {e}")
-    
-        return stats
-    
-
-        
-    def _extract_courses(self, soup) -> list[dict]:
-        """استخراج المقررات من صفحة الخطة الدراسية بشكل آمن"""
-        
-        courses = []
-        try:
-            # ✅ البحث عن جميع الجداول داخل div.member-card
-            member_cards = soup.find_all('div', class_='member-card')
-            logger.info(f"Found {len(member_cards)} member cards")
-            
-            for card_idx, card in enumerate(member_cards):
-                # استخراج اسم الفئة من العنوان
-                category_header = card.find('h4')
-                if category_header:
-                    category = category_header.get_text(strip=True)
-                else:
-                    category = f"الفئة {card_idx + 1}"
-                
-                # البحث عن الجدول داخل البطاقة
-                table = card.find('table')
-                if not table:
-                    continue
-                    
-                rows = table.find_all('tr')
-                logger.info(f"Card {card_idx + 1} ({category}): Found {len(rows)} rows")
-                
-                for row_idx, row in enumerate(rows):
-                    cols = row.find_all(['td', 'th'])
-                    
-                    # تجاهل الصفوف التي تحتوي على عدد قليل من الأعمدة أو صفوف العناوين
-                    if len(cols) < 5:
-                        continue
-                    
-                    try:
-                        # استخراج البيانات من الأعمدة
-                        course_code_elem = cols[1].find('a')
-                        course_code = course_code_elem.get_text(strip=True) if course_code_elem else cols[1].get_text(strip=True)
-                        course_name = cols[2].get_text(strip=True) if len(cols) > 2 else ''
-                        
-                        # تجاهل الصفوف التي لا تحتوي على رمز مقرر صالح
-                        if not course_code or '/' not in course_code:
-                            continue
-                        
-                        # استخراج حالة المقرر من العمود الأول (الأيقونة)
-                        status_icon = cols[0].find('i')
-                        status_class = ''
-                        if status_icon:
-                            status_class = ' '.join(status_icon.get('class', []))
-                        
-                        # تحديد الحالة بناءً على class الأيقونة
-                        if 'btn-success' in status_class:
-                            status = 'completed'
-                        elif 'btn-danger' in status_class:
-                            status = 'failed'
-                        elif 'btn-default' in status_class:
-                            status = 'not_registered'
-                        else:
-                            status = 'unknown'
-                        
-                        course = {
-                            "course_code": course_code,
-                            "course_name": course_name,
-                            "category": category,
-                            "hours": self._parse_number(cols[3].get_text(strip=True)) if len(cols) > 3 else 0,
-                            "status": status,
-                            "detailed_status": cols[4].get_text(strip=True) if len(cols) > 4 else '',
-                            "is_elective": 'اختياري' in category
-                        }
-                        
-                        courses.append(course)
-                        logger.debug(f"Extracted course: {course_code} - {course_name}")
-                        
-                    except Exception as e:
-                        logger.warning(f"Error parsing row {row_idx} in card {card_idx}: {e}")
-                        continue
-        
-        except Exception as e:
-            logger.error(f"Error extracting courses for {self.student_id}: {e}")
-            return []
-        
-        logger.info(f"Successfully extracted {len(courses)} courses")
-        return courses
-        
-        
-    
-    def _parse_course_row(self, cols, category) -> Optional[Dict[str, Any]]:
-        """تحليل صف المقرر مع تجاهل الصفوف الفارغة أو التوضيحية"""
-        try:
-            # نتأكد أن الصف يحتوي على الأقل 2 عمود (رمز المقرر والاسم)
-            if len(cols) < 2:
-                return None
-    
-            # حالة المقرر (مبسط)
-            status = self._get_course_status_simple(cols[0])
-    
-            # رمز المقرر
-            course_code_elem = cols[1].find('a')
-            course_code = course_code_elem.get_text(strip=True) if course_code_elem else cols[1].get_text(strip=True)
-    
-            # اسم المقرر
-            course_name = cols[2].get_text(strip=True) if len(cols) > 2 else ''
-    
-            # الساعات
-            hours = self._parse_number(cols[3].get_text(strip=True)) if len(cols) > 3 else 0
-    
-            # حالة مفصلة (اختياري)
-            detailed_status = cols[4].get_text(strip=True) if len(cols) > 4 else ''
-    
-            return {
-                'course_code': course_code,
-                'course_name': course_name,
-                'category': category,
-                'hours': hours,
-                'status': status,
-                'detailed_status': detailed_status,
-                'is_elective': 'اختياري' in category or 'elective' in category.lower()
-            }
-    
-        except Exception as e:
-            logger.error(f"Error parsing course row: {e}")
-            return None
-        
-    def debug_page_structure(self, soup):
-        """لتصحيح هيكل الصفحة"""
-        debug_info = []
-        
-        # تحليل جميع الجداول
-        tables = soup.find_all('table')
-        for i, table in enumerate(tables):
-            debug_info.append(f"📊 Table {i + 1}:")
-            rows = table.find_all('tr')
-            for j, row in enumerate(rows[:3]):  # أول 3 صفوف فقط لكل جدول
-                cols = row.find_all(['td', 'th'])
-                col_texts = [col.get_text(strip=True) for col in cols]
-                debug_info.append(f"   Row {j + 1}: {col_texts}")
-    
-        return "\n".join(debug_info)
-    def _get_course_status_simple(self, status_element):
-        """دالة مبسطة لتحديد حالة المقرر من النص"""
-        try:
-            if hasattr(status_element, 'get_text'):
-                text = status_element.get_text(strip=True).lower()
-            else:
-                text = str(status_element).lower()
-            
-            status_mapping = {
-                'completed': ['ناجح', 'مكتمل', 'completed', 'passed', 'نجح', 'تم بنجاح', 'محتسب'],
-                'failed': ['راسب', 'فاشل', 'failed', 'رسب', 'غير مكتمل'],
-                'in_progress': ['مسجل', 'قيد', 'in progress', 'registered', 'مستمر', 'قيد التقدم'],
-                'not_registered': ['لم يسجل', 'غير مسجل', 'not registered'],
-                'exempted': ['معفي', 'معفى', 'exempted', 'معفاة']
-            }
-            
-            for status_key, keywords in status_mapping.items():
-                if any(keyword in text for keyword in keywords):
-                    return status_key
-            
-            return 'unknown'
-            
-        except Exception:
-            return 'unknown'
-
-    def _parse_number(self, text):
-        """تحويل النص إلى رقم"""
-        try:
-            if not text:
-                return 0
-            # إزالة أي أحرف غير رقمية
-            cleaned = ''.join(filter(str.isdigit, str(text)))
-            return int(cleaned) if cleaned else 0
-        except (ValueError, TypeError):
-            return 0
-
-    def debug_page_structure(self, soup):
-        """لتصحيح هيكل الصفحة"""
-        debug_info = []
-        
-        # تحليل البطاقات
-        member_cards = soup.find_all('div', class_='member-card')
-        debug_info.append(f"📊 عدد البطاقات: {len(member_cards)}")
-        
-        for i, card in enumerate(member_cards):
-            # العنوان
-            title = card.find('h4')
-            debug_info.append(f"\n🎯 البطاقة {i+1}: {title.get_text(strip=True) if title else 'لا يوجد عنوان'}")
-            
-            # الجدول
-            table = card.find('table')
-            if table:
-                rows = table.find_all('tr')
-                debug_info.append(f"   📋 عدد الصفوف: {len(rows)}")
-                
-                # أول 3 صفوف
-                for j, row in enumerate(rows[:3]):
-                    cols = row.find_all(['td', 'th'])
-                    col_data = []
-                    for col in cols:
-                        text = col.get_text(strip=True)
-                        # تقصير النص الطويل
-                        if len(text) > 20:
-                            text = text[:20] + "..."
-                        col_data.append(text)
-                    debug_info.append(f"   📝 الصف {j+1}: {col_data}")
-        
-        return "\n".join(debug_info)
-
-
-
-
 
 
     def fetch_student_data_from_portal(self):
@@ -1094,7 +599,7 @@ class QOUScraper:
     
             # 2. جلب صفحة معلومات الطالب لاستخراج الفرع
             info_url = "https://portal.qou.edu/student/changePassword.do#studInfo"
-            info_response = self.session.get(info_url, headers=self.headers)
+            info_response = self._get(info_url, headers=self.headers)
             
             if info_response.status_code != 200:
                 return {
@@ -1103,24 +608,11 @@ class QOUScraper:
                 }
     
             # 3. استخراج الفرع من HTML
-            soup = BeautifulSoup(info_response.text, 'html.parser')
-            branch_name = "غير محدد"
-            
-            # البحث عن الفرع في الهيكل المحدد
-            form_groups = soup.find_all('div', class_='form-group')
-            for group in form_groups:
-                labels = group.find_all('label', class_='control-label')
-                for i, label in enumerate(labels):
-                    if 'الفرع:' in label.text:
-                        # العنصر التالي بعد التسمية يحتوي على اسم الفرع
-                        branch_divs = group.find_all('div', class_='col-sm-4 col-md-4 text-right')
-                        if len(branch_divs) > i:
-                            branch_name = branch_divs[i].get_text(strip=True)
-                            break
+            branch_name = qou_parsers.parse_student_branch(info_response.text)
     
             # 4. جلب صفحة المواد المسجلة
             courses_url = "https://portal.qou.edu/student/courseServices.do"
-            courses_response = self.session.get(courses_url, headers=self.headers)
+            courses_response = self._get(courses_url, headers=self.headers)
             
             if courses_response.status_code != 200:
                 return {
@@ -1129,22 +621,7 @@ class QOUScraper:
                 }
     
             # 5. استخراج أسماء المواد من HTML
-            courses_soup = BeautifulSoup(courses_response.text, 'html.parser')
-            courses_list = []
-            
-            # البحث عن جميع عناوين المواد في box-header
-            course_headers = courses_soup.find_all('div', class_='box-header')
-            
-            for header in course_headers:
-                pull_right = header.find('div', class_='pull-right')
-                if pull_right:
-                    course_text = pull_right.get_text(strip=True)
-                    # فصل الرقم عن اسم المادة (مثال: "2/0101 تعلم كيف تتعلم")
-                    if '/' in course_text and ' ' in course_text:
-                        # نأخذ الجزء بعد المسافة الأولى (اسم المادة)
-                        course_name = course_text.split(' ', 1)[1].strip()
-                        if course_name and course_name not in courses_list:
-                            courses_list.append(course_name)
+            courses_list = qou_parsers.parse_registered_course_names(courses_response.text)
     
             logger.info(f"تم سحب بيانات: الفرع={branch_name}, المواد={len(courses_list)}")
     
@@ -1437,165 +914,9 @@ class QOUScraper:
             return f"❌ حدث خطأ أثناء جلب المحاضرات القادمة: {str(e)}"
 
     def fetch_ecourse_courses(self, username: str, password: str) -> Dict[str, Any]:
-        """جلب المقررات المسجلة في النظام الإلكتروني باستخدام requests"""
-        try:
-            # إنشاء جلسة requests
-            session = requests.Session()
-            
-            # إضافة headers لمحاكاة المتصفح
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'ar,en-US;q=0.7,en;q=0.3',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            }
-            session.headers.update(headers)
-            
-            # 1. الدخول إلى صفحة التسجيل
-            login_url = "https://ecourse.qou.edu/login/index.php"
-            login_data = {
-                'username': username,
-                'password': password,
-                'anchor': ''
-            }
-            
-            response = session.post(login_url, data=login_data)
-            
-            # التحقق من نجاح التسجيل
-            if "حسابك معطل" in response.text:
-                return {"success": False, "error": "الحساب معطل أو البيانات غير صحيحة"}
-            
-            if "اسم المستخدم أو كلمة السر غير صحيحة" in response.text:
-                return {"success": False, "error": "اسم المستخدم أو كلمة السر غير صحيحة"}
-            
-            # 2. جلب صفحة المقررات
-            courses_url = "https://ecourse.qou.edu/"
-            response = session.get(courses_url)
-            
-            if response.status_code != 200:
-                return {"success": False, "error": f"خطأ في الاتصال: {response.status_code}"}
-            
-            # 3. تحليل HTML لاستخراج المقررات
-            soup = BeautifulSoup(response.content, 'html.parser')
-            courses_section = soup.find('div', {'id': 'frontpage-course-list'})
-            
-            if not courses_section:
-                return {"success": False, "error": "لم يتم العثور على المقررات المسجلة"}
-            
-            courses = []
-            course_cards = courses_section.find_all('div', {'class': 'card'})
-            
-            for card in course_cards:
-                try:
-                    # استخراج اسم المقرر
-                    title_link = card.find('h4', class_='card-title').find('a')
-                    course_name = title_link.text.strip() if title_link else "غير معروف"
-                    course_url = title_link.get('href', '') if title_link else ""
-                    
-                    # استخراج ID المقرر من data-courseid
-                    course_id = card.get('data-courseid', '')
-                    
-                    # استخراج صورة المقرر
-                    img = card.find('img')
-                    course_image = img.get('src', '') if img else ""
-                    
-                    # استخراج الفصل الدراسي
-                    category = card.find('div', {'class': 'coursecat'})
-                    category_name = category.text.strip() if category else "غير محدد"
-                    
-                    courses.append({
-                        'id': course_id,
-                        'name': course_name,
-                        'url': course_url,
-                        'image': course_image,
-                        'category': category_name
-                    })
-                except Exception as e:
-                    continue
-            
-            return {"success": True, "courses": courses}
-            
-        except requests.RequestException as e:
-            return {"success": False, "error": f"خطأ في الاتصال: {str(e)}"}
-        except Exception as e:
-            return {"success": False, "error": f"خطأ غير متوقع: {str(e)}"}
-    
+        """جلب المقررات المسجلة في النظام الإلكتروني (جلسة Moodle محفوظة لكل مستخدم)"""
+        return EcourseClient(username, password, self.priority).fetch_courses()
+
     def fetch_course_virtual_meetings(self, course_url: str, username: str, password: str) -> Dict[str, Any]:
-        """جلب اللقاءات الافتراضية - بدون 'الفصل الحالي'"""
-        try:
-            # إنشاء جلسة جديدة
-            session = requests.Session()
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            }
-            session.headers.update(headers)
-            
-            # تسجيل الدخول أولاً
-            login_url = "https://ecourse.qou.edu/login/index.php"
-            login_data = {'username': username, 'password': password, 'anchor': ''}
-            login_response = session.post(login_url, data=login_data)
-            
-            # التحقق من نجاح التسجيل
-            if "حسابك معطل" in login_response.text:
-                return {"success": False, "error": "الحساب معطل أو البيانات غير صحيحة"}
-            
-            # جلب صفحة المقرر
-            response = session.get(course_url)
-            
-            if response.status_code != 200:
-                return {"success": False, "error": f"خطأ في جلب صفحة المقرر: {response.status_code}"}
-            
-            # تحليل المحتوى
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            meetings = []
-            
-            # البحث عن جميع الروابط التي تحتوي على playback أو vc
-            all_links = soup.find_all('a', href=True)
-            
-            for link in all_links:
-                href = link.get('href', '')
-                link_text = link.get_text(strip=True)
-                
-                # إذا كان الرابط يحتوي على playback أو vc فهو لقاء افتراضي
-                if any(keyword in href for keyword in ['playback', 'vc1.qou.edu', 'vc2.qou.edu', 'vc3.qou.edu']):
-                    
-                    # ✅ البحث عن الفصل الدراسي من المحتوى المحيط فقط إذا كان موجوداً
-                    semester = "غير محدد"  # قيمة افتراضية
-                    
-                    # البحث في العنصر الأب والعناصر المجاورة
-                    parent = link.find_parent()
-                    if parent:
-                        parent_text = parent.get_text()
-                        
-                        # البحث عن معلومات الفصل في النص المحيط
-                        if 'الفصل الدراسي الأول' in parent_text or '1201' in parent_text:
-                            semester = 'الفصل الدراسي الأول'
-                        elif 'الفصل الدراسي الثاني' in parent_text or '1202' in parent_text:
-                            semester = 'الفصل الدراسي الثاني'
-                        elif 'الفصل الدراسي الصيفي' in parent_text or '1203' in parent_text:
-                            semester = 'الفصل الدراسي الصيفي'
-                        elif '1193' in parent_text:
-                            semester = 'الفصل الصيفي (1193)'
-                        elif '1192' in parent_text:
-                            semester = 'الفصل الثاني (1192)'
-                        elif '1191' in parent_text:
-                            semester = 'الفصل الأول (1191)'
-                    
-                    meetings.append({
-                        'semester': semester,
-                        'title': link_text,
-                        'url': href,
-                        'type': 'virtual_meeting'
-                    })
-            
-            if not meetings:
-                return {"success": False, "error": "لم يتم العثور على روابط لقاءات افتراضية"}
-            
-            return {"success": True, "meetings": meetings}
-            
-        except Exception as e:
-            return {"success": False, "error": f"خطأ في جلب اللقاءات: {str(e)}"}
+        """جلب اللقاءات الافتراضية لمقرر - بدون 'الفصل الحالي'"""
+        return EcourseClient(username, password, self.priority).fetch_course_meetings(course_url)
@@ -6,18 +6,26 @@ import pytz
 import time
 import threading
 import json
+import re
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 from database import (
-    get_all_users,
-    update_last_msg,
-    update_user_courses,
-    update_user_gpa,
+    iter_user_chunks,
+    iter_users,
+    credential_cache_stats,
     get_all_deadlines,
-
+    delete_user,
 )
-from qou_scraper import QOUScraper
+from qou_scraper import QOUScraper, get_calendar, CALENDAR_REFRESH
+from qou_async_scraper import crawl_users, CRAWL_ORDER, PORTAL_CONCURRENCY
+from portal_throttle import portal_governor, BACKGROUND
+from portal_breaker import portal_breaker, PortalUnavailable
+from portal_transport import transport_stats
+from db_pool import pool_stats
+from write_buffer import user_writes
+from event_writer import event_writer
+from page_cache import page_store, section_unchanged
 from bot_instance import bot
 from database import decrypt_text, encrypt_text
 from pytz import timezone  # للتوافق مع Render
@@ -115,620 +123,620 @@ def parse_exam_datetime(date_str, time_str):
     except Exception as e:
         logger.warning(f"فشل تحويل التاريخ والوقت: {date_str} {time_str} | خطأ: {e}")
         return None
-# ====================== المهام الرئيسية ======================
-def check_for_new_messages():
-    while True:
-        try:
-            users = get_all_users()
-            for user in users:
-                chat_id = user['chat_id']
-                scraper = QOUScraper(user['student_id'], user['password'])
-                if scraper.login():
-                    latest = scraper.fetch_latest_message()
-                    if latest and latest['msg_id'] != user.get('last_msg_id'):
-                        msg = (
-                            f"📥 رســـالــــة جـديــدة!\n"
-                            f"📧 {latest['subject']}\n"
-                            f"📝 {latest['sender']}\n"
-                            f"🕒 {latest['date']}\n\n"
-                            f"{latest['body']}"
-                        )
-                        send_message(bot, chat_id, msg)
-                        update_last_msg(chat_id, latest['msg_id'])
-            time.sleep(20*60)
-        except Exception as e:
-            logger.error(f"❌ خطأ في متابعة الرسائل: {e}")
-            time.sleep(60)
+# ====================== الزحف الموحد للبوابة ======================
+# كل دورة تسجل الدخول مرة واحدة لكل طالب وتجلب الأقسام المستحقة فقط،
+# ثم تمرر اللقطة إلى دوال المقارنة والإشعارات أدناه.
+
+# الفاصل الزمني لكل قسم (بالثواني)
+SECTION_INTERVALS = {
+    "messages": 20 * 60,
+    "courses": 60 * 60,
+    "gpa": 24 * 60 * 60,
+    "discussions": 24 * 60 * 60,
+}
+# أقسام تُجلب مرة يومياً بعد منتصف الليل (ساعة، دقيقة)
+DAILY_SECTIONS = {
+    "lectures": (0, 5),
+    "exams": (0, 5),
+}
+# أقسام لا داعي لتشغيل المقارنة والإشعارات لها إذا لم تتغير صفحاتها
+# (المحاضرات والامتحانات تُجدول يومياً حتى لو لم تتغير الصفحة)
+SKIP_WHEN_UNCHANGED = {"messages", "courses", "gpa", "discussions"}
+# الأقسام الدورية المستحقة خلال هذه المهلة تُضم لنفس الدورة بدل تسجيل دخول جديد
+SECTION_DUE_SLACK = 5 * 60
 
-def check_for_course_updates():
-    while True:
+_section_next_run = {}
+# حلقات النقاش المعروفة لكل مستخدم
+known_discussion_sessions = {}
+
+
+def _next_daily_run(now, hour, minute):
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    return run
+
+
+def _init_section_schedule(now):
+    """الأقسام الدورية تبدأ فوراً، واليومية تنتظر موعدها القادم"""
+    for section in SECTION_INTERVALS:
+        _section_next_run.setdefault(section, now)
+    for section, (hour, minute) in DAILY_SECTIONS.items():
+        _section_next_run.setdefault(section, _next_daily_run(now, hour, minute))
+
+
+def get_due_sections(now):
+    """إرجاع الأقسام المستحقة للجلب في هذه الدورة"""
+    horizon = now + timedelta(seconds=SECTION_DUE_SLACK)
+    due = set()
+    for section, next_run in _section_next_run.items():
+        if next_run <= now or (section in SECTION_INTERVALS and next_run <= horizon):
+            due.add(section)
+    return due
+
+
+def _mark_sections_done(sections, now):
+    for section in sections:
+        if section in SECTION_INTERVALS:
+            _section_next_run[section] = now + timedelta(seconds=SECTION_INTERVALS[section])
+        else:
+            hour, minute = DAILY_SECTIONS[section]
+            _section_next_run[section] = _next_daily_run(now, hour, minute)
+
+
+def crawl_user(user, sections):
+    """
+    تسجيل الدخول مرة واحدة للطالب وجلب الأقسام المطلوبة في لقطة واحدة.
+    ترجع None إذا فشل تسجيل الدخول، والأقسام التي فشل جلبها لا تظهر في اللقطة.
+    """
+    chat_id = user['chat_id']
+    scraper = QOUScraper(user['student_id'], user['password'], priority=BACKGROUND)
+    if not scraper.login():
+        logger.warning(f"[{chat_id}] فشل تسجيل الدخول للطالب {user['student_id']}")
+        return None
+
+    fetchers = {
+        "messages": scraper.fetch_latest_message,
+        "courses": scraper.fetch_term_summary_courses,
+        "gpa": scraper.fetch_gpa,
+        "discussions": scraper.fetch_discussion_sessions,
+        "lectures": scraper.fetch_lectures_schedule,
+        # دورة الليل تعيد جلب الجداول دائماً وتحدث الذاكرة المؤقتة للبوت
+        "exams": lambda: scraper.fetch_all_exams(use_cache=False),
+    }
+
+    snapshot = {}
+    for section in CRAWL_ORDER:
+        if section not in sections:
+            continue
         try:
-            users = get_all_users()
-            for user in users:
-                chat_id = user['chat_id']
-                try:
-                    scraper = QOUScraper(user['student_id'], user['password'])
-                    if scraper.login():
-                        courses = scraper.fetch_term_summary_courses()
-                        old_courses = json.loads(user.get('courses_data')) if user.get('courses_data') else []
-                        changes = []
-                        for c in courses:
-                            old_c = next((o for o in old_courses if o['course_code'] == c['course_code']), None)
-                            if old_c and (c['midterm_mark'] != old_c['midterm_mark'] or c['final_mark'] != old_c['final_mark']):
-                                changes.append(c)
-                        if changes:
-                            msg = "📢 تحــديـــث جـديـد فـي الـعـلامــات:\n\n"
-                            for c in changes:
-                                msg += f"📚 {c['course_name']}\nعلامـــة النـــــصــفي : {c['midterm_mark']} | العــــلامـــة النــــهائيـــة: {c['final_mark']}\n\n"
-                            send_message(bot, chat_id, msg)
-                            logger.info(f"[{chat_id}] تم إرسال رسالة تحديث العلامات للطالب: {len(changes)} مادة/مواد")
-                        else:
-                            logger.info(f"[{chat_id}] لا تغييرات في العلامات")
-                        update_user_courses(chat_id, json.dumps(courses))
-                except Exception as ex:
-                    logger.warning(f"[{chat_id}] خطأ أثناء فحص تحديث العلامات: {ex}")
-            time.sleep(60*60)
+            scraper.page_changes.clear()
+            # البصمات الجديدة تُحفظ فقط بعد نجاح إشعارات القسم وكتابتها (run_portal_sweep)
+            scraper.pending_pages = snapshot.setdefault("pages", {}).setdefault(section, [])
+            snapshot[section] = fetchers[section]()
+            if section_unchanged(scraper.page_changes):
+                snapshot.setdefault("unchanged", set()).add(section)
         except Exception as e:
-            logger.error(f"❌ خطأ عام في تحديث العلامات: {e}")
-            time.sleep(60)
+            logger.error(f"[{chat_id}] خطأ في جلب {section}: {e}")
+    return snapshot
+
+
+# ====================== دوال المقارنة والإشعارات ======================
+def notify_new_message(user, latest):
+    chat_id = user['chat_id']
+    if latest and latest['msg_id'] != user.get('last_msg_id'):
+        msg = (
+            f"📥 رســـالــــة جـديــدة!\n"
+            f"📧 {latest['subject']}\n"
+            f"📝 {latest['sender']}\n"
+            f"🕒 {latest['date']}\n\n"
+            f"{latest['body']}"
+        )
+        send_message(bot, chat_id, msg)
+        user_writes.update(chat_id, last_msg_id=latest['msg_id'])
+
+
+def notify_mark_changes(user, courses):
+    chat_id = user['chat_id']
+    old_courses = json.loads(user.get('courses_data')) if user.get('courses_data') else []
+    changes = []
+    for c in courses:
+        old_c = next((o for o in old_courses if o['course_code'] == c['course_code']), None)
+        if old_c and (c['midterm_mark'] != old_c['midterm_mark'] or c['final_mark'] != old_c['final_mark']):
+            changes.append(c)
+    if changes:
+        msg = "📢 تحــديـــث جـديـد فـي الـعـلامــات:\n\n"
+        for c in changes:
+            msg += f"📚 {c['course_name']}\nعلامـــة النـــــصــفي : {c['midterm_mark']} | العــــلامـــة النــــهائيـــة: {c['final_mark']}\n\n"
+        send_message(bot, chat_id, msg)
+        logger.info(f"[{chat_id}] تم إرسال رسالة تحديث العلامات للطالب: {len(changes)} مادة/مواد")
+    else:
+        logger.info(f"[{chat_id}] لا تغييرات في العلامات")
+    user_writes.update(chat_id, courses_data=json.dumps(courses))
 
 
-def check_for_gpa_changes():
-    while True:
+def notify_gpa_change(user, new_gpa):
+    chat_id = user['chat_id']
+    if not new_gpa:
+        logger.warning(f"[{chat_id}] لم يتم الحصول على GPA للطالب {user['student_id']}")
+        return
+
+    # جلب المعدل القديم
+    old_gpa = None
+    if user.get('last_gpa'):
         try:
-            users = get_all_users()
-            logger.info(f"جاري فحص GPA لـ {len(users)} مستخدم")
-            
-            for user in users:
-                chat_id = user['chat_id']
-                student_id = user['student_id']
-                password = user['password']
-                
-                try:
-                    if not student_id or not password:
-                        logger.warning(f"[{chat_id}] بيانات تسجيل الدخول غير كاملة")
-                        continue
-                    
-                    # ✅ تحقق من صحة البيانات
-                    if len(student_id) < 8 or len(password) < 3:
-                        logger.warning(f"[{chat_id}] بيانات تسجيل الدخول غير صالحة")
-                        continue
-                    
-                    # إنشاء السكرابر
-                    scraper = QOUScraper(student_id, password)
-                    
-                    # تسجيل الدخول أولاً
-                    if not scraper.login():
-                        logger.warning(f"[{chat_id}] فشل تسجيل الدخول للطالب {student_id}")
-                        continue
-                    
-                    # جلب المعدل القديم
-                    old_gpa = None
-                    if user.get('last_gpa'):
-                        try:
-                            old_gpa = json.loads(user['last_gpa'])
-                        except json.JSONDecodeError:
-                            old_gpa = user['last_gpa']
-                    
-                    # جلب المعدل الجديد
-                    new_gpa = scraper.fetch_gpa()
-                    
-                    if not new_gpa:
-                        logger.warning(f"[{chat_id}] لم يتم الحصول على GPA للطالب {student_id}")
-                        continue
-                    
-                    logger.info(f"[{chat_id}] المعدل القديم: {old_gpa}, المعدل الجديد: {new_gpa}")
-                    
-                    # المقارنة
-                    if old_gpa is None:
-                        update_user_gpa(chat_id, json.dumps(new_gpa))
-                        logger.info(f"[{chat_id}] تم حفظ GPA لأول مرة")
-                    elif (new_gpa.get('term_gpa') != old_gpa.get('term_gpa') or 
-                          new_gpa.get('cumulative_gpa') != old_gpa.get('cumulative_gpa')):
-                        msg = (
-                            f"🎓 تـــم تــــحديث البــــوابة الاكــــاديـــمية!\n\n"
-                            f"📘 المــعدل الـــفـصـلي : {new_gpa.get('term_gpa', '-')}\n"
-                            f"📚 المــعدل الـتـراكـمـي: {new_gpa.get('cumulative_gpa', '-')}\n\n"
-                            f"🆔 الرقم الجامعي: {student_id}"
-                        )
-                        try:
-                            bot.send_message(chat_id, msg)
-                            logger.info(f"[{chat_id}] تم إرسال رسالة تحديث GPA")
-                        except Exception as msg_error:
-                            logger.error(f"[{chat_id}] فشل إرسال الرسالة: {msg_error}")
-                        
-                        update_user_gpa(chat_id, json.dumps(new_gpa))
-                    else:
-                        logger.info(f"[{chat_id}] لا تغيير في GPA")
-                        
-                except Exception as ex:
-                    logger.error(f"[{chat_id}] خطأ أثناء متابعة GPA: {ex}")
-                    if "InvalidToken" in str(ex) or "base64" in str(ex):
-                        logger.warning(f"[{chat_id}] حذف مستخدم ببيانات تالفة")
-                        delete_user(chat_id)
-            
-            time.sleep(24 * 60 * 60)
-            
-        except Exception as e:
-            logger.error(f"❌ خطأ عام في متابعة GPA: {e}")
-            time.sleep(60 * 60)
+            old_gpa = json.loads(user['last_gpa'])
+        except json.JSONDecodeError:
+            old_gpa = user['last_gpa']
+
+    logger.info(f"[{chat_id}] المعدل القديم: {old_gpa}, المعدل الجديد: {new_gpa}")
+
+    # المقارنة
+    if old_gpa is None:
+        user_writes.update(chat_id, last_gpa=json.dumps(new_gpa))
+        logger.info(f"[{chat_id}] تم حفظ GPA لأول مرة")
+    elif (new_gpa.get('term_gpa') != old_gpa.get('term_gpa') or
+          new_gpa.get('cumulative_gpa') != old_gpa.get('cumulative_gpa')):
+        msg = (
+            f"🎓 تـــم تــــحديث البــــوابة الاكــــاديـــمية!\n\n"
+            f"📘 المــعدل الـــفـصـلي : {new_gpa.get('term_gpa', '-')}\n"
+            f"📚 المــعدل الـتـراكـمـي: {new_gpa.get('cumulative_gpa', '-')}\n\n"
+            f"🆔 الرقم الجامعي: {user['student_id']}"
+        )
+        try:
+            bot.send_message(chat_id, msg)
+            logger.info(f"[{chat_id}] تم إرسال رسالة تحديث GPA")
+        except Exception as msg_error:
+            logger.error(f"[{chat_id}] فشل إرسال الرسالة: {msg_error}")
 
+        user_writes.update(chat_id, last_gpa=json.dumps(new_gpa))
+    else:
+        logger.info(f"[{chat_id}] لا تغيير في GPA")
 
 
-def check_discussion_sessions():
-    """
-    فحص حلقات النقاش وإرسال التذكيرات المبرمجة
-    """
-    # تخزين محلي لحلقات النقاش المعروفة لكل مستخدم
-    known_sessions = {}
-    
-    while True:
+def notify_discussion_sessions(chat_id, sessions, now):
+    """إشعار بحلقات النقاش الجديدة وجدولة تذكيراتها"""
+    logger.info(f"[{chat_id}] تم جلب {len(sessions)} حلقة نقاش")
+
+    # ✅ الحصول على الحلقات المعروفة سابقاً لهذا المستخدم
+    user_known_sessions = known_discussion_sessions.get(chat_id, set())
+    current_sessions = set()
+
+    # ✅ فحص الحلقات الجديدة
+    new_sessions = []
+    for session in sessions:
+        session_key = f"{session['course_code']}_{session['date']}_{session['time']}"
+        current_sessions.add(session_key)
+
+        if session_key not in user_known_sessions:
+            new_sessions.append(session)
+            logger.info(f"[{chat_id}] اكتشفت حلقة نقاش جديدة: {session_key}")
+
+    # ✅ إرسال إشعار بالحلقات الجديدة
+    if new_sessions:
+        msg = "🆕 تمـــت إضـــافـــة حـــلـقـــات نــقــاش جــديـــدة:\n\n"
+        for session in new_sessions:
+            msg += f"📘 {session['course_name']} ({session['course_code']})\n"
+            msg += f"📅 {session['date']} - ⏰ {session['time']}\n\n"
+
+        send_message(bot, chat_id, msg)
+
+    # ✅ جدولة التذكيرات لجميع حلقات النقاش (الجديدة والقديمة)
+    for session in sessions:
         try:
-            now = datetime.now(PALESTINE_TZ)
-            today_str = now.strftime("%d/%m/%Y")
-            users = get_all_users()
-            
-            for user in users:
-                chat_id = user['chat_id']
-                student_id = user['student_id']
-                password = user['password']
-                
-                # ✅ إنشاء جلسة جديدة لكل مستخدم
-                scraper = QOUScraper(student_id, password)
-                if not scraper.login():
-                    logger.warning(f"[{chat_id}] فشل تسجيل الدخول لفحص حلقات النقاش")
-                    continue
-                
-                try:
-                    sessions = scraper.fetch_discussion_sessions()
-                    logger.info(f"[{chat_id}] تم جلب {len(sessions)} حلقة نقاش")
-                except Exception as e:
-                    logger.error(f"[{chat_id}] خطأ في جلب حلقات النقاش: {e}")
-                    continue
-                
-                # ✅ الحصول على الحلقات المعروفة سابقاً لهذا المستخدم
-                user_known_sessions = known_sessions.get(chat_id, set())
-                current_sessions = set()
-                
-                # ✅ فحص الحلقات الجديدة
-                new_sessions = []
-                for session in sessions:
-                    session_key = f"{session['course_code']}_{session['date']}_{session['time']}"
-                    current_sessions.add(session_key)
-                    
-                    if session_key not in user_known_sessions:
-                        new_sessions.append(session)
-                        logger.info(f"[{chat_id}] اكتشفت حلقة نقاش جديدة: {session_key}")
-                
-                # ✅ إرسال إشعار بالحلقات الجديدة
-                if new_sessions:
-                    msg = "🆕 تمـــت إضـــافـــة حـــلـقـــات نــقــاش جــديـــدة:\n\n"
-                    for session in new_sessions:
-                        msg += f"📘 {session['course_name']} ({session['course_code']})\n"
-                        msg += f"📅 {session['date']} - ⏰ {session['time']}\n\n"
-                    
-                    send_message(bot, chat_id, msg)
-                
-                # ✅ جدولة التذكيرات لجميع حلقات النقاش (الجديدة والقديمة)
-                for session in sessions:
+            # ✅ تحويل وقت الحلقة
+            start_raw = session['time'].split('-')[0].strip()
+            start_time = datetime.strptime(
+                f"{session['date']} {start_raw}", "%d/%m/%Y %H:%M"
+            ).replace(tzinfo=PALESTINE_TZ)
+
+            # ✅ إنشاء مفتاح فريد لهذه الحلقة
+            session_key = f"{chat_id}_{session['course_code']}_{session['date']}_{session['time']}"
+
+            # ✅ التذكيرات المطلوبة
+            reminders = [
+                (start_time - timedelta(hours=2), "2h_before",
+                 f"⏰ باقي ساعتين على حلقة النقاش: {session['course_name']}"),
+                (start_time - timedelta(hours=1), "1h_before",
+                 f"⚡ باقي ساعة على حلقة النقاش: {session['course_name']}"),
+                (start_time, "start_time",
+                 f"🚀 بدأت الآن حلقة النقاش: {session['course_name']} بالتوفيق! ❤️")
+            ]
+
+            for reminder_time, reminder_type, reminder_msg in reminders:
+                if reminder_time > now:
+                    job_id = f"disc_{session_key}_{reminder_type}"
                     try:
-                        # ✅ تحويل وقت الحلقة
-                        start_raw = session['time'].split('-')[0].strip()
-                        start_time = datetime.strptime(
-                            f"{session['date']} {start_raw}", "%d/%m/%Y %H:%M"
-                        ).replace(tzinfo=PALESTINE_TZ)
-                        
-                        # ✅ إنشاء مفتاح فريد لهذه الحلقة
-                        session_key = f"{chat_id}_{session['course_code']}_{session['date']}_{session['time']}"
-                        
-                        # ✅ التذكيرات المطلوبة
-                        reminders = [
-                            (start_time - timedelta(hours=2), "2h_before", 
-                             f"⏰ باقي ساعتين على حلقة النقاش: {session['course_name']}"),
-                            (start_time - timedelta(hours=1), "1h_before", 
-                             f"⚡ باقي ساعة على حلقة النقاش: {session['course_name']}"),
-                            (start_time, "start_time", 
-                             f"🚀 بدأت الآن حلقة النقاش: {session['course_name']} بالتوفيق! ❤️")
-                        ]
-                        
-                        for reminder_time, reminder_type, reminder_msg in reminders:
-                            if reminder_time > now:
-                                job_id = f"disc_{session_key}_{reminder_type}"
-                                try:
-                                    exam_scheduler.add_job(
-                                        send_message,
-                                        'date',
-                                        run_date=reminder_time,
-                                        args=[bot, chat_id, reminder_msg],
-                                        id=job_id,
-                                        replace_existing=True
-                                    )
-                                    logger.info(f"[{chat_id}] تم جدولة تذكير {reminder_type} لحلقة النقاش {session['course_name']}")
-                                except Exception as e:
-                                    logger.error(f"[{chat_id}] فشل جدولة التذكير: {e}")
-                    
+                        exam_scheduler.add_job(
+                            send_message,
+                            'date',
+                            run_date=reminder_time,
+                            args=[bot, chat_id, reminder_msg],
+                            id=job_id,
+                            replace_existing=True
+                        )
+                        logger.info(f"[{chat_id}] تم جدولة تذكير {reminder_type} لحلقة النقاش {session['course_name']}")
                     except Exception as e:
-                        logger.error(f"[{chat_id}] خطأ في معالجة حلقة النقاش {session['course_name']}: {e}")
-                        continue
-                
-                # ✅ تحديث الحلقات المعروفة للمستخدم
-                known_sessions[chat_id] = current_sessions
-            
-            # ✅ الانتظار ساعة قبل الفحص التالي
-            logger.info("💤 انتظار 24 ساعة للفحص التالي لحلقات النقاش")
-            time.sleep(86400)
+                        logger.error(f"[{chat_id}] فشل جدولة التذكير: {e}")
 
-            
         except Exception as e:
-            logger.error(f"❌ خطأ عام في فحص حلقات النقاش: {e}")
-            time.sleep(60 * 10)  # انتظار 10 دقائق عند الخطأ
+            logger.error(f"[{chat_id}] خطأ في معالجة حلقة النقاش {session['course_name']}: {e}")
+            continue
 
-def send_reminder_for_new_deadline():
-    while True:
+    # ✅ تحديث الحلقات المعروفة للمستخدم
+    known_discussion_sessions[chat_id] = current_sessions
+
+
+def _parse_week_info(week_info):
+    """استخراج رقم ونوع الأسبوع الحالي من نص get_current_week_type"""
+    current_week = 1
+    week_type = "فردي"
+
+    if "الأسبوع" in week_info:
         try:
-            deadlines = get_all_deadlines()
-            users = get_all_users()
-            today = datetime.now(PALESTINE_TZ).date()
-            for user in users:
-                chat_id = user['chat_id']
-                msg_lines = []
-                for d_id, d_name, d_date in deadlines:
-                    days_left = (d_date - today).days
-                    if days_left >= 0:
-                        msg_lines.append(f"⏰ باقي {days_left} يوم للموعد: {d_name} ({d_date.strftime('%d/%m/%Y')})")
-                if msg_lines:
-                    send_message(bot, chat_id, "📌 تذكير بالمواعيد القادمة:\n\n" + "\n".join(msg_lines))
-            time.sleep(12*60*60)
+            week_match = re.search(r'الأسبوع (\d+)', week_info)
+            if week_match:
+                current_week = int(week_match.group(1))
+
+            if "فردي" in week_info:
+                week_type = "فردي"
+            elif "زوجي" in week_info:
+                week_type = "زوجي"
         except Exception as e:
-            logger.error(f"❌ خطأ في تذكيرات المواعيد: {e}")
-            time.sleep(60)
+            logger.debug(f"Error parsing week info: {e}")
 
+    return current_week, week_type
 
 
-def check_today_lectures():
-    try:
-        logger.info("✅ بدء فحص محاضرات اليوم")
-        users = get_all_users()
-        now = datetime.now(PALESTINE_TZ)
-        today = now.date()
+def is_lecture_this_week(schedule_type, target_week, week_type):
+    """التحقق إذا كانت المحاضرة في هذا الأسبوع حسب جدولها"""
 
-        # ✅ الحصول على اليوم الحالي بالعربية
-        arabic_days = ["الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"]
-        today_arabic = arabic_days[today.weekday()]
-        
-        logger.info(f"📅 اليوم هو: {today_arabic} ({today.strftime('%Y-%m-%d')})")
-        logger.info(f"⏰ الوقت الحالي: {now.strftime('%H:%M:%S')}")
+    # ✅ إذا لا شيء أو أسبوعي = كل أسبوع
+    if not schedule_type or schedule_type == "أسبوعي":
+        return True
 
-        lecture_count = 0
-        reminder_count = 0
+    # ✅ ز = زوجي فقط
+    if "ز" in schedule_type:
+        return week_type == "زوجي"
 
-        for user in users:
-            user_id = user['chat_id']
-            logger.info(f"👤 فحص المستخدم: {user_id}")
-            
-            student_id = user['student_id']
-            password = user['password']
-            
-            if not student_id or not password:
-                logger.warning(f"[{user_id}] بيانات تسجيل الدخول غير كافية")
-                continue
+    # ✅ ف = فردي فقط
+    if "ف" in schedule_type:
+        return week_type == "فردي"
 
-            scraper = QOUScraper(student_id, password)
-            if not scraper.login():
-                logger.warning(f"[{user_id}] فشل تسجيل الدخول")
-                continue
+    # ✅ 3-ش = الأسبوع الثالث من كل شهر (الأسابيع 3, 7, 11, 15)
+    if "3-ش" in schedule_type:
+        return target_week in [3, 7, 11, 15]
 
-            try:
-                lectures = scraper.fetch_lectures_schedule()
-                logger.info(f"[{user_id}] تم جلب {len(lectures)} محاضرة")
-                
-            except Exception as e:
-                logger.error(f"[{user_id}] خطأ في جلب المحاضرات: {e}")
-                continue
+    # ✅ 4-ش = الأسبوع الرابع من كل شهر (الأسابيع 4, 8, 12, 16)
+    if "4-ش" in schedule_type:
+        return target_week in [4, 8, 12, 16]
 
-            # ✅ الحصول على معلومات الأسبوع الحالي
-            week_info = scraper.get_current_week_type()
-            current_week = 1
-            week_type = "فردي"
-            
-            if "الأسبوع" in week_info:
-                try:
-                    import re
-                    week_match = re.search(r'الأسبوع (\d+)', week_info)
-                    if week_match:
-                        current_week = int(week_match.group(1))
-                    
-                    if "فردي" in week_info:
-                        week_type = "فردي"
-                    elif "زوجي" in week_info:
-                        week_type = "زوجي"
-                except Exception as e:
-                    logger.debug(f"[{user_id}] Error parsing week info: {e}")
+    # ✅ إذا كان نوع غير معروف، نعتبرها أسبوعية
+    logger.warning(f"نوع جدول غير معروف: {schedule_type} - اعتبارها أسبوعية")
+    return True
 
-            logger.info(f"[{user_id}] الأسبوع الحالي: {current_week} - النوع: {week_type}")
 
-            user_lectures_today = 0
-            
-            for lecture in lectures:
-                day_str = lecture.get('day', '')
-                if not day_str:
-                    continue
-                    
-                day_name = day_str.split('/')[0].strip() if day_str and day_str.strip() else "غير محدد"
-                schedule_type = day_str.split('/')[1].strip() if '/' in day_str else "أسبوعي"
-                
-                logger.debug(f"[{user_id}] فحص المحاضرة: {lecture['course_name']} - اليوم: {day_name} - الجدول: {schedule_type}")
-                
-                # ✅ التحقق إذا كان اليوم مطابق ليوم اليوم
-                if day_name != today_arabic:
-                    continue
-                
-                logger.info(f"[{user_id}] وجد محاضرة اليوم: {lecture['course_name']}")
-                
-                def is_lecture_this_week(schedule_type, target_week, week_type):
-                    """التحقق إذا كانت المحاضرة في هذا الأسبوع حسب جدولها"""
-                    
-                    # ✅ إذا لا شيء أو أسبوعي = كل أسبوع
-                    if not schedule_type or schedule_type == "أسبوعي" or schedule_type == "":
-                        logger.debug(f"[{user_id}] محاضرة أسبوعية: {schedule_type}")
-                        return True
-                    
-                    # ✅ ز = زوجي فقط
-                    if "ز" in schedule_type:
-                        logger.debug(f"[{user_id}] محاضرة زوجية: {schedule_type}")
-                        return week_type == "زوجي"
-                    
-                    # ✅ ف = فردي فقط  
-                    if "ف" in schedule_type:
-                        logger.debug(f"[{user_id}] محاضرة فردية: {schedule_type}")
-                        return week_type == "فردي"
-                    
-                    # ✅ 3-ش = الأسبوع الثالث من كل شهر (الأسابيع 3, 7, 11, 15)
-                    if "3-ش" in schedule_type:
-                        logger.debug(f"[{user_id}] محاضرة 3-ش: {schedule_type}")
-                        return target_week in [3, 7, 11, 15]
-                    
-                    # ✅ 4-ش = الأسبوع الرابع من كل شهر (الأسابيع 4, 8, 12, 16)
-                    if "4-ش" in schedule_type:
-                        logger.debug(f"[{user_id}] محاضرة 4-ش: {schedule_type}")
-                        return target_week in [4, 8, 12, 16]
-                    
-                    # ✅ إذا كان نوع غير معروف، نعتبرها أسبوعية
-                    logger.warning(f"[{user_id}] نوع جدول غير معروف: {schedule_type} - اعتبارها أسبوعية")
-                    return True
-                
-                # ✅ التحقق إذا كانت المحاضرة لهذا الأسبوع
-                if not is_lecture_this_week(schedule_type, current_week, week_type):
-                    logger.info(f"[{user_id}] تخطي محاضرة {lecture['course_name']} - ليست هذا الأسبوع (النوع: {schedule_type}, الأسبوع: {current_week}, النوع: {week_type})")
-                    continue
-                else:
-                    logger.info(f"[{user_id}] محاضرة {lecture['course_name']} مجدولة لهذا الأسبوع (النوع: {schedule_type}, الأسبوع: {current_week}, النوع: {week_type})")
-                
-                user_lectures_today += 1
-                lecture_count += 1
+def schedule_today_lectures(user_id, lectures, current_week, week_type, now):
+    """جدولة تذكيرات محاضرات اليوم، وترجع (عدد المحاضرات، عدد التذكيرات)"""
+    today = now.date()
+    arabic_days = ["الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"]
+    today_arabic = arabic_days[today.weekday()]
 
-                # ✅ وقت بداية المحاضرة
-                try:
-                    time_str = lecture.get("time", "")
-                    if not time_str or " - " not in time_str:
-                        logger.warning(f"[{user_id}] وقت غير صحيح للمحاضرة {lecture['course_name']}: {time_str}")
-                        continue
-                    
-                    start_time_str = time_str.split(" - ")[0].strip()
-                    hour, minute = map(int, start_time_str.split(":"))
-                    
-                    lecture_start = PALESTINE_TZ.localize(
-                        datetime(today.year, today.month, today.day, hour, minute, 0)
-                    )
-                    
-                    logger.info(f"[{user_id}] محاضرة مجدولة: {lecture['course_name']} الساعة {hour:02d}:{minute:02d} (النوع: {schedule_type})")
-                    
-                    # ✅ رسائل التذكير
-                    reminders = [
-                        (lecture_start - timedelta(hours=1), "1h_before",
-                         f"⏰ بعد ساعة عندك محاضرة {lecture['course_name']} ({lecture['time']})"),
-                        (lecture_start - timedelta(minutes=15), "15m_before",
-                         f"⚡ بعد ربع ساعة محاضرة {lecture['course_name']}"),
-                        (lecture_start, "start_time",
-                         f"🚀 بدأت الآن محاضرة {lecture['course_name']} بالتوفيق ❤️"),
-                    ]
+    logger.info(f"[{user_id}] تم جلب {len(lectures)} محاضرة")
 
-                    # ✅ جدولة التذكيرات
-                    for remind_time, reminder_type, msg in reminders:
-                        if remind_time > now:
-                            try:
-                                job_id = f"lec_{user_id}_{lecture['course_code']}_{reminder_type}_{int(remind_time.timestamp())}"
-                                
-                                exam_scheduler.add_job(
-                                    send_message,
-                                    'date',
-                                    run_date=remind_time,
-                                    args=[bot, user_id, msg],
-                                    id=job_id,
-                                    replace_existing=True
-                                )
-                                reminder_count += 1
-                                logger.info(f"[{user_id}] تم جدولة تذكير: {msg} في {remind_time.strftime('%H:%M')}")
-                                
-                            except Exception as e:
-                                logger.error(f"[{user_id}] فشل جدولة التذكير: {e}")
-                        else:
-                            logger.debug(f"[{user_id}] تذكير {reminder_type} للمحاضرة {lecture['course_name']} تجاوز وقته")
-                    
-                except Exception as e:
-                    logger.error(f"[{user_id}] خطأ في تحويل وقت المحاضرة {lecture['course_name']}: {e}")
-                    continue
+    lecture_count = 0
+    reminder_count = 0
 
-            if user_lectures_today > 0:
-                logger.info(f"[{user_id}] لديه {user_lectures_today} محاضرة اليوم")
-            else:
-                logger.info(f"[{user_id}] لا يوجد لديه محاضرات اليوم أو المحاضرات ليست في هذا الأسبوع")
+    for lecture in lectures:
+        day_str = lecture.get('day', '')
+        if not day_str:
+            continue
 
-        logger.info(f"✅ انتهى فحص محاضرات اليوم: {lecture_count} محاضرة, {reminder_count} تذكير مجدول")
+        day_name = day_str.split('/')[0].strip() if day_str and day_str.strip() else "غير محدد"
+        schedule_type = day_str.split('/')[1].strip() if '/' in day_str else "أسبوعي"
 
-    except Exception as e:
-        logger.exception(f"❌ خطأ أثناء فحص المحاضرات: {e}")
+        # ✅ التحقق إذا كان اليوم مطابق ليوم اليوم
+        if day_name != today_arabic:
+            continue
 
-def daily_lecture_checker_loop():
-    """
-    حلقة لا نهائية تشغل check_today_lectures كل يوم الساعة 00:05 (بعد منتصف الليل بـ5 دقائق)
-    """
-    logger.info("🎯 بدء مراقب المحاضرات اليومية")
-    
-    # ✅ الانتظار قليلاً عند البدء
-    time.sleep(10)
-    
-    while True:
+        # ✅ التحقق إذا كانت المحاضرة لهذا الأسبوع
+        if not is_lecture_this_week(schedule_type, current_week, week_type):
+            logger.info(f"[{user_id}] تخطي محاضرة {lecture['course_name']} - ليست هذا الأسبوع (النوع: {schedule_type}, الأسبوع: {current_week}, النوع: {week_type})")
+            continue
+
+        lecture_count += 1
+
+        # ✅ وقت بداية المحاضرة
         try:
-            now = datetime.now(PALESTINE_TZ)
-            
-            # ✅ حساب وقت التشغيل التالي (00:05 من اليوم التالي)
-            if now.hour == 0 and now.minute < 5:
-                # إذا كنا بعد منتصف الليل مباشرة، انتظر حتى 00:05
-                next_run = now.replace(hour=0, minute=5, second=0, microsecond=0)
-            else:
-                # انتظر حتى 00:05 من اليوم التالي
-                next_run = (now + timedelta(days=1)).replace(hour=0, minute=5, second=0, microsecond=0)
-            
-            seconds_to_sleep = (next_run - now).total_seconds()
-            
-            logger.info(f"🕛 الانتظار حتى {next_run.strftime('%Y-%m-%d %H:%M')} لفحص المحاضرات: {int(seconds_to_sleep)} ثانية")
-            
-            time.sleep(seconds_to_sleep)
-            
-            # ✅ تنفيذ فحص المحاضرات
-            logger.info("🔍 بدء فحص محاضرات اليوم الجديد")
-            check_today_lectures()
-            
-            # ✅ انتظار دقيقة إضافية لتجنب التشغيل المتكرر
-            time.sleep(60)
-            
-        except KeyboardInterrupt:
-            logger.info("⏹️ إيقاف مراقب المحاضرات بطلب من المستخدم")
-            break
+            time_str = lecture.get("time", "")
+            if not time_str or " - " not in time_str:
+                logger.warning(f"[{user_id}] وقت غير صحيح للمحاضرة {lecture['course_name']}: {time_str}")
+                continue
+
+            start_time_str = time_str.split(" - ")[0].strip()
+            hour, minute = map(int, start_time_str.split(":"))
+
+            lecture_start = PALESTINE_TZ.localize(
+                datetime(today.year, today.month, today.day, hour, minute, 0)
+            )
+
+            logger.info(f"[{user_id}] محاضرة مجدولة: {lecture['course_name']} الساعة {hour:02d}:{minute:02d} (النوع: {schedule_type})")
+
+            # ✅ رسائل التذكير
+            reminders = [
+                (lecture_start - timedelta(hours=1), "1h_before",
+                 f"⏰ بعد ساعة عندك محاضرة {lecture['course_name']} ({lecture['time']})"),
+                (lecture_start - timedelta(minutes=15), "15m_before",
+                 f"⚡ بعد ربع ساعة محاضرة {lecture['course_name']}"),
+                (lecture_start, "start_time",
+                 f"🚀 بدأت الآن محاضرة {lecture['course_name']} بالتوفيق ❤️"),
+            ]
+
+            # ✅ جدولة التذكيرات
+            for remind_time, reminder_type, msg in reminders:
+                if remind_time > now:
+                    try:
+                        job_id = f"lec_{user_id}_{lecture['course_code']}_{reminder_type}_{int(remind_time.timestamp())}"
+
+                        exam_scheduler.add_job(
+                            send_message,
+                            'date',
+                            run_date=remind_time,
+                            args=[bot, user_id, msg],
+                            id=job_id,
+                            replace_existing=True
+                        )
+                        reminder_count += 1
+                        logger.info(f"[{user_id}] تم جدولة تذكير: {msg} في {remind_time.strftime('%H:%M')}")
+
+                    except Exception as e:
+                        logger.error(f"[{user_id}] فشل جدولة التذكير: {e}")
+
         except Exception as e:
-            logger.error(f"❌ خطأ في مراقب المحاضرات: {e}")
-            time.sleep(300)  # انتظار 5 دقائق قبل إعادة المحاولة
-def check_today_exams():
-    """
-    فحص امتحانات اليوم لكل الطلاب وإرسال الرسائل والتذكيرات.
-    """
-    try:
-        logger.info("✅ بدء فحص امتحانات اليوم لكل الطلاب")
-        users = get_all_users()
-        today = datetime.now(PALESTINE_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
-        today_exams_memory.clear()  # نظف البيانات القديمة
+            logger.error(f"[{user_id}] خطأ في تحويل وقت المحاضرة {lecture['course_name']}: {e}")
+            continue
 
-        for user in users:
-            user_id = user['chat_id']
-            student_id = user['student_id']
-            password = user['password']
+    if lecture_count > 0:
+        logger.info(f"[{user_id}] لديه {lecture_count} محاضرة اليوم")
+    else:
+        logger.info(f"[{user_id}] لا يوجد لديه محاضرات اليوم أو المحاضرات ليست في هذا الأسبوع")
 
-            logger.info(f"[{user_id}] محاولة تسجيل الدخول...")
-            user_scraper = QOUScraper(student_id, password)
-            if not user_scraper.login():
-                logger.warning(f"[{user_id}] فشل تسجيل الدخول للطالب {student_id}")
+    return lecture_count, reminder_count
+
+
+def schedule_today_exams(user_id, exams_by_type, now):
+    """إرسال رسائل امتحانات اليوم وجدولة تذكيراتها، وحفظها في الذاكرة للتذكيرات الحية"""
+    today = now.date()
+    exams_today_count = 0
+    exams_for_memory = []
+
+    for exam_code, exams in exams_by_type:
+        exam_emoji = EXAM_TYPE_MAP.get(exam_code, exam_code)
+        for e in exams:
+            exam_dt = parse_exam_datetime(e["date"], e["from_time"])
+            if not exam_dt:
+                logger.warning(f"[{user_id}] فشل تحويل التاريخ للامتحان {e['course_name']}")
                 continue
-            logger.info(f"[{user_id}] تم تسجيل الدخول بنجاح")
-            exams_today_count = 0
-            exams_for_memory = []
-
-            # جلب آخر فصلين
-            terms = user_scraper.get_last_two_terms()
-            if not terms:
-                logger.warning(f"[{user_id}] لا توجد فصول دراسية")
+            exams_for_memory.append(e)  # حفظ مؤقت للامتحان
+
+            if exam_dt.date() != today:
                 continue
 
-            exams_today_count = 0
+            exams_today_count += 1
+            # رسالة اليوم
+            msg = (
+                f"📌 عـنـــدك امـتـحــان اليــــوم:\n"
+                f"المــادة: {e['course_name']}\n"
+                f"الــنوع: {exam_emoji} ({e['exam_kind']})\n"
+                f"الســاعة: {e['from_time']} - {e['to_time']}\n"
+                f"المحــاضر: {e['lecturer']}\n"
+                f"الشــعبة: {e['section']}\n"
+                f"ملاحظــة: {e['note']}"
+            )
+            logger.info(f"[{user_id}] جاري إرسال رسالة الامتحان: {e['course_name']}")
 
-            for term in terms:
-                for exam_code, exam_emoji in EXAM_TYPE_MAP.items():
-                    try:
-                        exams = user_scraper.fetch_exam_schedule(term["value"], exam_type=exam_code)
-                        logger.info(f"[{user_id}] عدد الامتحانات المجلبه للفصل {term['value']} لنوع {exam_code}: {len(exams)}")
-                    except Exception as e:
-                        logger.exception(f"[{user_id}] خطأ أثناء جلب الامتحانات للفصل {term['value']} ونوع {exam_code}: {e}")
-                        continue
+            try:
+                bot.send_message(user_id, msg)
+                logger.info(f"[{user_id}] تم إرسال رسالة الامتحان بنجاح")
+            except Exception as ex:
+                logger.warning(f"[{user_id}] فشل إرسال رسالة الامتحان ({e['course_name']}): {ex}")
+                continue
 
-                    for e in exams:
-                        logger.info(
-                            f"[{user_id}] بيانات الامتحان الخام: date={e['date']}, from={e['from_time']}, "
-                            f"to={e['to_time']}, course={e['course_name']}"
-                        )
-                        exam_dt = parse_exam_datetime(e["date"], e["from_time"])
-                        if not exam_dt:
-                            logger.warning(f"[{user_id}] فشل تحويل التاريخ للامتحان {e['course_name']}")
-                            continue
-                        exams_today_count += 1
-                        exams_for_memory.append(e)  # حفظ مؤقت للامتحان
-
-                        if exam_dt.date() == today.date():
-                            exams_today_count += 1
-                            # رسالة اليوم
-                            msg = (
-                                f"📌 عـنـــدك امـتـحــان اليــــوم:\n"
-                                f"المــادة: {e['course_name']}\n"
-                                f"الــنوع: {exam_emoji} ({e['exam_kind']})\n"
-                                f"الســاعة: {e['from_time']} - {e['to_time']}\n"
-                                f"المحــاضر: {e['lecturer']}\n"
-                                f"الشــعبة: {e['section']}\n"
-                                f"ملاحظــة: {e['note']}"
-                            )
-                            logger.info(f"[{user_id}] جاري إرسال رسالة الامتحان: {e['course_name']}")
+            # جدولة التذكيرات
+            reminders = [
+                ("2h_before", exam_dt - timedelta(hours=2), f"⏰ امتحان {e['course_name']} بعد ساعتين"),
+                ("30m_before", exam_dt - timedelta(minutes=30), f"⚡ امتحان {e['course_name']} بعد 30 دقيقة"),
+                ("at_start", exam_dt, f"🚀 هلا بلش امتحان {e['course_name']}")
+            ]
 
-                            try:
-                                bot.send_message(user_id, msg)
-                                logger.info(f"[{user_id}] تم إرسال رسالة الامتحان بنجاح")
-                            except Exception as ex:
-                                logger.warning(f"[{user_id}] فشل إرسال رسالة الامتحان ({e['course_name']}): {ex}")
-                                continue  # نكمل باقي الطلاب بدل ما يوقف
+            for r_type, r_time, r_msg in reminders:
+                if r_time.tzinfo is None:
+                    r_time = PALESTINE_TZ.localize(r_time)
 
-                            # جدولة التذكيرات
-                            reminders = [
-                                ("2h_before", exam_dt - timedelta(hours=2), f"⏰ امتحان {e['course_name']} بعد ساعتين"),
-                                ("30m_before", exam_dt - timedelta(minutes=30), f"⚡ امتحان {e['course_name']} بعد 30 دقيقة"),
-                                ("at_start", exam_dt, f"🚀 هلا بلش امتحان {e['course_name']}")
-                            ]
+                if r_time > datetime.now(PALESTINE_TZ):
+                    try:
+                        job_func = partial(bot.send_message, user_id, r_msg)
+                        exam_scheduler.add_job(job_func, "date", run_date=r_time)
+                        logger.info(f"[{user_id}] تم جدولة تذكير: {r_type} في {r_time}")
+                    except Exception as ex:
+                        logger.warning(f"[{user_id}] فشل جدولة التذكير {r_type}: {ex}")
+
+    if exams_for_memory:
+        today_exams_memory[user_id] = exams_for_memory
+    logger.info(f"[{user_id}] عدد امتحانات اليوم: {exams_today_count}")
+    return exams_today_count
+
+
+# أعمدة users التي يحتاجها كل قسم في الإشعارات (إضافة لبيانات الدخول)
+SECTION_USER_COLUMNS = {
+    "messages": ("last_msg_id",),
+    "courses": ("courses_data",),
+    "gpa": ("last_gpa",),
+}
 
-                            for r_type, r_time, r_msg in reminders:
-                                if r_time.tzinfo is None:
-                                    r_time = PALESTINE_TZ.localize(r_time)
 
-                                if r_time > datetime.now(PALESTINE_TZ):
-                                    try:
-                                        job_func = partial(bot.send_message, user_id, r_msg)
-                                        exam_scheduler.add_job(job_func, "date", run_date=r_time)
-                                        logger.info(f"[{user_id}] تم جدولة تذكير: {r_type} في {r_time}")
-                                    except Exception as ex:
-                                        logger.warning(f"[{user_id}] فشل جدولة التذكير {r_type}: {ex}")
-            if exams_for_memory:
-                today_exams_memory[user_id] = exams_for_memory  
-            logger.info(f"[{user_id}] عدد امتحانات اليوم: {exams_today_count}")
+def _crawl_chunk(users, sections):
+    """لقطات دفعة من المستخدمين بنفس ترتيبها"""
+    if PORTAL_CONCURRENCY > 1:
+        return crawl_users(users, sections, PORTAL_CONCURRENCY)
+    snapshots = []
+    for user in users:
+        if not portal_breaker.available():
+            snapshots.append(PortalUnavailable("portal.qou.edu غير متاح حالياً"))
+            continue
+        try:
+            snapshots.append(crawl_user(user, sections))
+        except Exception as ex:
+            snapshots.append(ex)
+    return snapshots
 
-        logger.info("✅ انتهى فحص امتحانات اليوم")
 
-    except Exception as e:
-        logger.exception(f"❌ فشل أثناء فحص امتحانات اليوم: {e}")
+def run_portal_sweep(sections, now=None):
+    """دورة زحف واحدة: تسجيل دخول واحد لكل مستخدم ثم تشغيل الإشعارات على اللقطة"""
+    now = now or datetime.now(PALESTINE_TZ)
+    logger.info(f"🔄 بدء دورة البوابة ({', '.join(sorted(sections))})")
 
-def daily_exam_checker_loop():
+    if "exams" in sections:
+        today_exams_memory.clear()  # نظف البيانات القديمة
+    current_week = week_type = None
+    if "lectures" in sections:
+        current_week, week_type = _parse_week_info(QOUScraper.get_current_week_type())
+        logger.info(f"📅 الأسبوع الحالي: {current_week} - النوع: {week_type}")
+
+    # المستخدمون على دفعات وبالأعمدة المطلوبة فقط حتى تبقى الذاكرة ثابتة مع زيادة المستخدمين
+    columns = ["chat_id", "student_id", "password"]
+    for section in sorted(sections):
+        columns.extend(SECTION_USER_COLUMNS.get(section, ()))
+
+    total = 0
+    crawled = 0
+    skipped = 0
+    for users in iter_user_chunks(columns, with_credentials=True):
+        confirmed_pages = []
+        users = [user for user in users if user.get('student_id') and user.get('password')]
+        total += len(users)
+        for user, snapshot in zip(users, _crawl_chunk(users, sections)):
+            chat_id = user['chat_id']
+            if isinstance(snapshot, PortalUnavailable):
+                skipped += 1
+                continue
+            if isinstance(snapshot, Exception):
+                logger.error(f"[{chat_id}] خطأ أثناء الزحف: {snapshot}")
+                if "InvalidToken" in str(snapshot) or "base64" in str(snapshot):
+                    logger.warning(f"[{chat_id}] حذف مستخدم ببيانات تالفة")
+                    delete_user(chat_id)
+                continue
+            if snapshot is None:
+                continue
+            crawled += 1
+
+            notifiers = (
+                ("messages", lambda data: notify_new_message(user, data)),
+                ("courses", lambda data: notify_mark_changes(user, data)),
+                ("gpa", lambda data: notify_gpa_change(user, data)),
+                ("discussions", lambda data: notify_discussion_sessions(chat_id, data, now)),
+                ("lectures", lambda data: schedule_today_lectures(chat_id, data, current_week, week_type, now)),
+                ("exams", lambda data: schedule_today_exams(chat_id, data, now)),
+            )
+            unchanged = snapshot.get("unchanged", set())
+            for section, notify in notifiers:
+                if section not in snapshot:
+                    continue
+                if section in unchanged and section in SKIP_WHEN_UNCHANGED:
+                    continue
+                try:
+                    notify(snapshot[section])
+                except Exception as ex:
+                    # لا تُحفظ البصمة: الدورة القادمة تعيد معالجة نفس الصفحة
+                    logger.warning(f"[{chat_id}] خطأ أثناء معالجة {section}: {ex}")
+                    continue
+                confirmed_pages.extend(snapshot.get("pages", {}).get(section, ()))
+
+        # كتابة نتائج الدفعة قبل حفظ بصماتها، حتى لا تُتخطى صفحة لم تُحفظ نتيجتها
+        user_writes.flush()
+        if user_writes.stats()["pending"]:
+            logger.warning("⚠️ فشلت كتابة نتائج الدفعة، ستُعاد معالجة صفحاتها المتغيرة في الدورة القادمة")
+        else:
+            page_store.commit(confirmed_pages)
+
+    logger.info(f"✅ انتهت دورة البوابة: {crawled}/{total} مستخدم")
+    if skipped:
+        logger.warning(f"⚠️ تم تخطي {skipped} مستخدم لأن البوابة غير متاحة")
+    logger.info(f"📊 حالة محدد البوابة: {portal_governor.stats()}")
+    logger.info(f"📊 قياسات طلبات البوابة: {transport_stats()}")
+    logger.info(f"📊 مجمع اتصالات قاعدة البيانات: {pool_stats()}")
+    logger.info(f"📊 الكتابة المجمعة: {user_writes.stats()}")
+    logger.info(f"📊 ذاكرة فك التشفير: {credential_cache_stats()}")
+    logger.info(f"📊 طابور الأحداث: {event_writer.stats()}")
+
+
+def portal_sweep_loop():
+    """حلقة واحدة تدير جلب البوابة لكل الأقسام حسب مواعيدها"""
+    _init_section_schedule(datetime.now(PALESTINE_TZ))
     while True:
         try:
             now = datetime.now(PALESTINE_TZ)
-            # احسب متى سيحين منتصف الليل القادم
-            tomorrow_midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-            seconds_until_midnight = (tomorrow_midnight - now).total_seconds()
+            due = get_due_sections(now)
+            if due and not portal_breaker.available():
+                # البوابة معطلة: نؤجل الدورة ونعيد المحاولة لاحقاً
+                logger.warning(f"⚠️ البوابة غير متاحة، تأجيل دورة ({', '.join(sorted(due))})")
+                time.sleep(60)
+                continue
+            if due:
+                run_portal_sweep(due, now)
+                _mark_sections_done(due, now)
 
-            logger.info(f"⏳ انتظار {seconds_until_midnight/3600:.2f} ساعة حتى منتصف الليل لتشغيل فحص الامتحانات")
+            now = datetime.now(PALESTINE_TZ)
+            next_run = min(_section_next_run.values())
+            time.sleep(max(30, (next_run - now).total_seconds()))
+        except Exception as e:
+            logger.error(f"❌ خطأ في حلقة البوابة: {e}")
+            time.sleep(60)
 
-            time.sleep(seconds_until_midnight)  # انتظر حتى منتصف الليل
 
-            # نفذ الفحص
-            check_today_exams()
+def calendar_refresh_loop():
+    """إبقاء التقويم المشترك محدثاً في الذاكرة حتى تجيب أزرار التقويم فوراً"""
+    while True:
+        try:
+            if portal_breaker.available():
+                get_calendar()
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحديث التقويم: {e}")
+        time.sleep(CALENDAR_REFRESH)
 
+
+def check_today_lectures():
+    """فحص محاضرات اليوم لكل الطلاب فوراً"""
+    run_portal_sweep({"lectures"})
+
+
+def check_today_exams():
+    """فحص امتحانات اليوم لكل الطلاب فوراً"""
+    run_portal_sweep({"exams"})
+
+
+def send_reminder_for_new_deadline():
+    while True:
+        try:
+            deadlines = get_all_deadlines()
+            today = datetime.now(PALESTINE_TZ).date()
+            for user in iter_users(("chat_id",)):
+                chat_id = user['chat_id']
+                msg_lines = []
+                for d_id, d_name, d_date in deadlines:
+                    days_left = (d_date - today).days
+                    if days_left >= 0:
+                        msg_lines.append(f"⏰ باقي {days_left} يوم للموعد: {d_name} ({d_date.strftime('%d/%m/%Y')})")
+                if msg_lines:
+                    send_message(bot, chat_id, "📌 تذكير بالمواعيد القادمة:\n\n" + "\n".join(msg_lines))
+            time.sleep(12*60*60)
         except Exception as e:
-            logger.error(f"❌ خطأ في حلقة فحص الامتحانات اليومية: {e}")
+            logger.error(f"❌ خطأ في تذكيرات المواعيد: {e}")
             time.sleep(60)
 
+
+
+
 def live_exam_reminder_loop():
     global sent_reminders
     while True:
@@ -1131,7 +1139,7 @@ def run_existing_functions_for_user(chat_id):
                 for term in terms:
                     for exam_code in EXAM_TYPE_MAP.keys():
                         try:
-                            exams = scraper.fetch_exam_schedule(term["value"], exam_type=exam_code)
+                            exams = scraper.fetch_exam_schedule(term["value"], exam_type=exam_code, use_cache=False)
                             if exams:
                                 for exam in exams:
                                     try:
@@ -1182,16 +1190,12 @@ def start_scheduler():
     """
     تشغيل كل المهام الأخرى + الجدولات
     """
-    threading.Thread(target=check_for_new_messages, daemon=True).start()
-    threading.Thread(target=check_for_course_updates, daemon=True).start()
-    threading.Thread(target=check_discussion_sessions, daemon=True).start()
-    threading.Thread(target=check_for_gpa_changes, daemon=True).start()
+    # حلقة واحدة لجلب البوابة (الرسائل، العلامات، المعدل، النقاش، المحاضرات، الامتحانات)
+    threading.Thread(target=portal_sweep_loop, daemon=True).start()
     threading.Thread(target=send_reminder_for_new_deadline, daemon=True).start()
-    threading.Thread(target=run_suggestion_bot, daemon=True).start()
+    threading.Thread(target=calendar_refresh_loop, daemon=True).start()
 
-    # شغل جدولة الامتحانات والتذكيرات
+    # شغل التذكيرات الحية للامتحانات
     threading.Thread(target=live_exam_reminder_loop, daemon=True).start()
-    threading.Thread(target=daily_lecture_checker_loop, daemon=True).start()
-    threading.Thread(target=daily_exam_checker_loop, daemon=True).start()
 
 
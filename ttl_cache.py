@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    ذاكرة مؤقتة مشتركة بين الخيوط مع مدة صلاحية لكل عنصر.
+    - get_or_load: طلب واحد فقط للتحميل لكل مفتاح حتى لو طلبه عدة مستخدمين معاً
+    - refresh_after: بعد هذه المدة يُعاد التحميل في الخلفية مع إرجاع القيمة الحالية فوراً
+    - stale_on_error: عند فشل التحميل تُرجع آخر قيمة معروفة بدل رفع الخطأ
+    """
+
+    def __init__(self, ttl, max_entries=1024, refresh_after=None, stale_on_error=False, name="cache"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_after = refresh_after
+        self.stale_on_error = stale_on_error
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None or now - entry[1] >= self.ttl:
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._fresh(key, time.monotonic())
+            return default if value is _MISSING else value
+
+    def _store(self, key, value):
+        # يُستدعى مع الاحتفاظ بالقفل
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_load(self, key, loader):
+        """إرجاع القيمة من الذاكرة أو تحميلها بـ loader() مرة واحدة"""
+        now = time.monotonic()
+        with self._lock:
+            value = self._fresh(key, now)
+            if value is not _MISSING:
+                self.hits += 1
+                if self.refresh_after is not None and now - self._entries[key][1] >= self.refresh_after:
+                    self._start_refresh(key, loader)
+                return value
+            self.misses += 1
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # ربما حمّلها خيط آخر أثناء الانتظار
+            with self._lock:
+                value = self._fresh(key, time.monotonic())
+            if value is not _MISSING:
+                return value
+            try:
+                value = loader()
+            except BaseException as e:
+                with self._lock:
+                    self._loading.pop(key, None)
+                    if isinstance(e, Exception):
+                        self.errors += 1
+                    stale = self._entries.get(key)
+                if isinstance(e, Exception) and self.stale_on_error and stale is not None:
+                    logger.warning(f"⚠️ {self.name}: فشل التحديث، استخدام آخر قيمة محفوظة", exc_info=True)
+                    return stale[0]
+                raise
+            # الحفظ وإزالة قفل التحميل في خطوة واحدة، حتى لا يبدأ خيط آخر تحميلاً ثانياً بينهما
+            with self._lock:
+                self._store(key, value)
+                self._loading.pop(key, None)
+            return value
+
+    def _start_refresh(self, key, loader):
+        # يُستدعى مع الاحتفاظ بالقفل
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+
+    def _refresh(self, key, loader):
+        try:
+            self.put(key, loader())
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.warning(f"⚠️ {self.name}: فشل التحديث في الخلفية: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """حذف كل المفاتيح التي تحقق الشرط (مثلاً كل مفاتيح طالب معين)"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+            }
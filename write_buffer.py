@@ -0,0 +1,143 @@
+import atexit
+import logging
+import os
+import threading
+
+from psycopg2.extras import execute_values
+
+from database import get_conn, forget_user
+
+logger = logging.getLogger(__name__)
+
+# تُكتب التحديثات المتراكمة عند بلوغ هذا العدد أو بعد هذه المدة (بالثواني)
+WRITE_BUFFER_ROWS = int(os.getenv("WRITE_BUFFER_ROWS", "200"))
+WRITE_BUFFER_SECONDS = int(os.getenv("WRITE_BUFFER_SECONDS", "5"))
+
+# الأعمدة المسموح تحديثها عبر الذاكرة المؤقتة (أسماء الأعمدة لا تأتي من المستخدم)
+BUFFERED_COLUMNS = ("last_msg_id", "courses_data", "last_gpa")
+
+
+class UserWriteBuffer:
+    """
+    تجميع تحديثات جدول users أثناء دورة الجدولة وكتابتها دفعة واحدة.
+    - تحديثان لنفس المستخدم والعمود قبل الكتابة: يُكتب الأحدث فقط
+    - كل دفعة = معاملة واحدة و UPDATE ... FROM (VALUES ...) لكل عمود
+    """
+
+    def __init__(self, flush_rows=WRITE_BUFFER_ROWS, flush_interval=WRITE_BUFFER_SECONDS):
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self._pending = {column: {} for column in BUFFERED_COLUMNS}
+        self._size = 0
+        self._lock = threading.Lock()
+        # قفل الكتابة يضمن أن دفعتين لا تُكتبان بترتيب معكوس
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+
+    def update(self, chat_id, **columns):
+        """تسجيل تحديث لمستخدم، مثلاً update(chat_id, last_msg_id=...)"""
+        with self._lock:
+            for column, value in columns.items():
+                if column not in self._pending:
+                    raise ValueError(f"عمود غير مدعوم في الكتابة المجمعة: {column}")
+                if chat_id not in self._pending[column]:
+                    self._size += 1
+                self._pending[column][chat_id] = value
+            full = self._size >= self.flush_rows
+            self._start_flusher()
+        if full:
+            self._wakeup.set()
+
+    def _start_flusher(self):
+        # يُستدعى مع الاحتفاظ بالقفل
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في الكتابة المجمعة: {e}")
+
+    def _take_pending(self):
+        with self._lock:
+            batch = {column: values for column, values in self._pending.items() if values}
+            self._pending = {column: {} for column in BUFFERED_COLUMNS}
+            self._size = 0
+        return batch
+
+    def _restore(self, batch):
+        """إرجاع دفعة فشلت كتابتها دون الكتابة فوق قيم أحدث وصلت بعدها"""
+        with self._lock:
+            for column, values in batch.items():
+                pending = self._pending[column]
+                for chat_id, value in values.items():
+                    if chat_id not in pending:
+                        pending[chat_id] = value
+                        self._size += 1
+
+    def flush(self):
+        """كتابة كل التحديثات المعلقة في معاملة واحدة؛ يرجع عدد الصفوف المكتوبة"""
+        with self._flush_lock:
+            batch = self._take_pending()
+            if not batch:
+                return 0
+
+            rows = sum(len(values) for values in batch.values())
+            try:
+                conn = get_conn()
+                if conn is None:
+                    raise RuntimeError("لا يوجد اتصال بقاعدة البيانات")
+                with conn:
+                    with conn.cursor() as cur:
+                        for column, values in batch.items():
+                            execute_values(
+                                cur,
+                                f"UPDATE users AS u SET {column} = v.value "
+                                f"FROM (VALUES %s) AS v(chat_id, value) WHERE u.chat_id = v.chat_id",
+                                list(values.items()),
+                                template="(%s::bigint, %s::text)",
+                                page_size=self.flush_rows,
+                            )
+            except Exception as e:
+                self._restore(batch)
+                with self._lock:
+                    self.failures += 1
+                logger.error(f"❌ فشل كتابة {rows} تحديث، ستُعاد المحاولة في الدفعة القادمة: {e}")
+                return 0
+
+            # last_msg_id جزء من سجل المستخدم المحفوظ في الذاكرة
+            for chat_id in batch.get("last_msg_id", ()):
+                forget_user(chat_id)
+            with self._lock:
+                self.flushes += 1
+                self.rows_written += rows
+            logger.info(f"💾 تمت كتابة {rows} تحديث للمستخدمين في معاملة واحدة")
+            return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._size,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "failures": self.failures,
+            }
+
+
+user_writes = UserWriteBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    if user_writes.stats()["pending"]:
+        logger.info("💾 كتابة التحديثات المعلقة قبل الإغلاق")
+        user_writes.flush()